@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+# the store is in the SWMFSOLAR dir, next to the Scripts dir
+DIRSTORE = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), '.store')
+
+# the hash of the files, see get_file_hash
+_hash_cache = {}
+
+# the ioctl of Linux to clone a file (reflink), see share_file
+FICLONE = 0x40049409
+
+# the lock of the store, see lock_store
+NAMELOCK = '.lock'
+
+# the blobs changed (saved or linked) within the last seconds are not
+# removed by gc, as they may be linked by another process in the meantime
+SECONDSMINAGE = 3600
+
+# -----------------------------------------------------------------------------
+@contextlib.contextmanager
+def lock_store(dirStore=DIRSTORE, IsExclusive=False):
+    """
+    Lock the store: shared while the files are saved and linked (see
+    link_file), exclusive while the unused blobs are removed (see gc).
+    """
+
+    os.makedirs(dirStore, exist_ok=True)
+    with open(os.path.join(dirStore, NAMELOCK), 'a') as file_lock:
+        fcntl.flock(file_lock, fcntl.LOCK_EX if IsExclusive else fcntl.LOCK_SH)
+        yield
+
+# -----------------------------------------------------------------------------
+def get_file_hash(filename):
+    """
+    Return the SHA-256 of the content of filename. The hash is cached by the
+    path, modification time and size of the file.
+    """
+
+    stat_file = os.stat(filename)
+    key = (os.path.realpath(filename), stat_file.st_mtime_ns, stat_file.st_size)
+
+    if key not in _hash_cache:
+        hash_file = hashlib.sha256()
+        with open(filename, 'rb') as file_in:
+            for chunk in iter(lambda: file_in.read(1 << 20), b''):
+                hash_file.update(chunk)
+        _hash_cache[key] = hash_file.hexdigest()
+
+    return _hash_cache[key]
+
+# -----------------------------------------------------------------------------
+def get_blob_name(strHash, dirStore=DIRSTORE):
+    """
+    Return the name of the blob with the SHA-256 strHash in dirStore.
+    """
+
+    return os.path.join(dirStore, strHash[0:2], strHash)
+
+# -----------------------------------------------------------------------------
+def _add_blob(filenameTmp, strHash, dirStore=DIRSTORE):
+    """
+    Make filenameTmp (a file in dirStore) read only and save it as the blob
+    strHash unless the blob exists already. Return the name of the blob.
+    """
+
+    filenameBlob = get_blob_name(strHash, dirStore)
+
+    mode = stat.S_IMODE(os.stat(filenameTmp).st_mode)
+    os.chmod(filenameTmp, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+    os.makedirs(os.path.dirname(filenameBlob), exist_ok=True)
+    try:
+        # os.link fails if the blob is saved by another process in the
+        # meantime, unlike os.replace
+        os.link(filenameTmp, filenameBlob)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(filenameTmp)
+
+    return filenameBlob
+
+# -----------------------------------------------------------------------------
+def add_file(filename, dirStore=DIRSTORE):
+    """
+    Save a copy of filename in dirStore if it is not there yet and return
+    the name of the blob. The blobs are read only, the other permissions
+    (e.g., executable) are the same as filename.
+    """
+
+    strHash = get_file_hash(filename)
+    filenameBlob = get_blob_name(strHash, dirStore)
+
+    if os.path.isfile(filenameBlob):
+        return filenameBlob
+
+    os.makedirs(dirStore, exist_ok=True)
+    fileTmp, filenameTmp = tempfile.mkstemp(dir=dirStore, prefix='.tmp_')
+    os.close(fileTmp)
+    shutil.copy2(filename, filenameTmp)
+
+    return _add_blob(filenameTmp, strHash, dirStore)
+
+# -----------------------------------------------------------------------------
+def add_content(content, dirStore=DIRSTORE):
+    """
+    Save the string or bytes content in dirStore if it is not there yet and
+    return the name of the blob.
+    """
+
+    if isinstance(content, str):
+        content = content.encode()
+
+    strHash = hashlib.sha256(content).hexdigest()
+    filenameBlob = get_blob_name(strHash, dirStore)
+
+    if os.path.isfile(filenameBlob):
+        return filenameBlob
+
+    os.makedirs(dirStore, exist_ok=True)
+    fileTmp, filenameTmp = tempfile.mkstemp(dir=dirStore, prefix='.tmp_')
+    with os.fdopen(fileTmp, 'wb') as file_out:
+        file_out.write(content)
+    os.chmod(filenameTmp, 0o644)
+
+    return _add_blob(filenameTmp, strHash, dirStore)
+
+# -----------------------------------------------------------------------------
+def link_blob(filenameBlob, dst, DoSymlink=False):
+    """
+    Hard link the blob to dst (dst is removed first if it exists). A
+    symbolic link is used if DoSymlink or the blob cannot be hard linked,
+    e.g., dst is on another file system.
+    """
+
+    if os.path.isdir(dst) and not os.path.islink(dst):
+        dst = os.path.join(dst, os.path.basename(filenameBlob))
+
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    if not DoSymlink:
+        try:
+            os.link(filenameBlob, dst)
+            return
+        except OSError:
+            pass
+
+    os.symlink(os.path.abspath(filenameBlob), dst)
+
+# -----------------------------------------------------------------------------
+def link_file(src, dst, dirStore=DIRSTORE, DoSymlink=False):
+    """
+    Save src in the store and link dst to the blob (see link_blob). If dst
+    is a dir, the link has the same name as src in dst.
+    """
+
+    if os.path.isdir(dst) and not os.path.islink(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+
+    with lock_store(dirStore):
+        link_blob(add_file(src, dirStore), dst, DoSymlink)
+
+# -----------------------------------------------------------------------------
+def link_content(content, dst, dirStore=DIRSTORE, DoSymlink=False):
+    """
+    Save content in the store and link dst to the blob (see link_blob).
+    """
+
+    with lock_store(dirStore):
+        link_blob(add_content(content, dirStore), dst, DoSymlink)
+
+# -----------------------------------------------------------------------------
+def share_file(src, dst):
+    """
+    Make dst the same file as src without copying the data if possible:
+    a hard link, or a reflink (copy on write, e.g., on XFS or Btrfs) if src
+    and dst are on different file systems, or a copy otherwise. dst is
+    removed first if it exists. If dst is a dir, the file has the same name
+    as src in dst. Only for the files not modified later, e.g., the field
+    files of the previous run used by a restart. Return how the file is
+    shared: 'link', 'reflink' or 'copy'.
+    """
+
+    if os.path.isdir(dst) and not os.path.islink(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    try:
+        os.link(src, dst)
+        return 'link'
+    except OSError:
+        pass
+
+    try:
+        with open(src, 'rb') as file_src, open(dst, 'wb') as file_dst:
+            fcntl.ioctl(file_dst.fileno(), FICLONE, file_src.fileno())
+        shutil.copystat(src, dst)
+        return 'reflink'
+    except OSError:
+        pass
+
+    shutil.copy2(src, dst)
+    return 'copy'
+
+# -----------------------------------------------------------------------------
+def gc(dirStore=DIRSTORE, dirs=None, DoDryRun=False,
+       secondsMinAge=SECONDSMINAGE):
+    """
+    Remove the blobs in dirStore that are not used: no other hard link to
+    the blob and no symbolic link to the blob in dirs (default: the parent
+    dir of dirStore), following the symbolic links to dirs (e.g., Results
+    on another file system). The temporary files left by interrupted saves
+    are removed too. The store is locked (see lock_store) and the files
+    changed within secondsMinAge are kept. Return the number of the blobs
+    removed and the number of bytes freed.
+    """
+
+    dirStore = os.path.realpath(dirStore)
+
+    if dirs is None:
+        dirs = [os.path.dirname(dirStore)]
+
+    with lock_store(dirStore, IsExclusive=True):
+        # the blobs used by symbolic links
+        blobs_linked = set()
+        dirs_visited = set()
+        for dirRoot in dirs:
+            for dirCurrent, dirnames, filenames in os.walk(dirRoot,
+                                                           followlinks=True):
+                # the store and the dirs visited already (symbolic links
+                # to the same dir or loops)
+                dirReal = os.path.realpath(dirCurrent)
+                if dirReal == dirStore or dirReal in dirs_visited:
+                    dirnames[:] = []
+                    continue
+                dirs_visited.add(dirReal)
+                for name in dirnames + filenames:
+                    filename = os.path.join(dirCurrent, name)
+                    if os.path.islink(filename):
+                        target = os.path.realpath(filename)
+                        if target.startswith(dirStore+os.sep):
+                            blobs_linked.add(target)
+
+        tNow  = time.time()
+        nBlob = 0
+        nByte = 0
+        for dirCurrent, dirnames, filenames in os.walk(dirStore):
+            for name in filenames:
+                filename = os.path.join(dirCurrent, name)
+                stat_file = os.lstat(filename)
+                if (filename == os.path.join(dirStore, NAMELOCK)
+                    or tNow - stat_file.st_ctime < secondsMinAge):
+                    continue
+                if name.startswith('.tmp_') or (stat_file.st_nlink == 1 and
+                                                filename not in blobs_linked):
+                    nBlob += 1
+                    nByte += stat_file.st_size
+                    if not DoDryRun:
+                        os.remove(filename)
+
+    return nBlob, nByte
+
+# =============================================================================
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Script to link files from the content-addressed '
+                        + 'store (by SHA-256) or to remove the unused '
+                        + 'files in the store.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('command', choices=['link', 'gc'],
+                            help='link: save the files in the store and '
+                            + 'replace the last argument (a file or dir) '
+                            + 'with links to them; gc: remove the files in '
+                            + 'the store that are not linked.')
+    ARG_PARSER.add_argument('filenames', nargs='*',
+                            help='link: the files followed by the '
+                            + 'destination; gc: the dirs searched for '
+                            + 'symbolic links (default: the SWMFSOLAR dir).')
+    ARG_PARSER.add_argument('--store',
+                            help='(default: '+DIRSTORE+')',
+                            type=str, default=DIRSTORE)
+    ARG_PARSER.add_argument('-s', '--DoSymlink',
+                            help='(default: 0)'
+                            + 'Use if you want to use symbolic links '
+                            + 'instead of hard links.',
+                            type=int, default=0)
+    ARG_PARSER.add_argument('-n', '--DoDryRun',
+                            help='(default: 0)'
+                            + 'Use if you want to list the number of files '
+                            + 'removed by gc without removing them.',
+                            type=int, default=0)
+    ARG_PARSER.add_argument('--MinAge',
+                            help='(default: '+str(SECONDSMINAGE)+') The '
+                            + 'seconds since the files in the store are '
+                            + 'changed, within which gc does not remove them.',
+                            type=float, default=SECONDSMINAGE)
+    ARGS = ARG_PARSER.parse_args()
+
+    if ARGS.command == 'link':
+        if len(ARGS.filenames) < 2:
+            sys.exit('link needs the files and the destination.')
+        dst = ARGS.filenames[-1]
+        if len(ARGS.filenames) > 2 and not os.path.isdir(dst):
+            sys.exit(dst+' must be a dir for more than one file.')
+        for filename in ARGS.filenames[:-1]:
+            link_file(filename, dst, ARGS.store, ARGS.DoSymlink)
+    else:
+        nBlob, nByte = gc(ARGS.store, ARGS.filenames or None, ARGS.DoDryRun,
+                          ARGS.MinAge)
+        print(('Found ' if ARGS.DoDryRun else 'Removed ')+str(nBlob)
+              +' unused files ('+'{:.1f}'.format(nByte/1e6)+' MB) in '
+              +ARGS.store)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+# remap_magnetogram is copied from the SWMF by 'make install'. Use a stub so
+# that the benchmark runs offline and without the SWMF, and the time of
+# remapping the maps is not included.
+def FITS_RECOGNIZE(map):
+    return ['NSO-SIFT ADAPT', 0, 0, 0, 0, 0, '2154', 0, 0,
+            '2014-09-10T02:00:00']
+
+sys.modules['remap_magnetogram'] = types.SimpleNamespace(
+    FITS_RECOGNIZE=FITS_RECOGNIZE)
+
+import change_param
+import change_awsom_param
+
+change_awsom_param.remap_magnetogram = lambda filename_map, dirOut='.': None
+
+# the default templates and the model using them
+TEMPLATES = {'PARAM.in.awsom':  'AWSoM',
+             'PARAM.in.awsomr': 'AWSoMR',
+             'PARAM.in.sofie':  'AWSoMR_SOFIE'}
+
+BENCHMARKS = ['add_commands', 'remove_commands', 'replace_commands',
+              'change_param_value', 'change_param_local', 'change_param_sweep']
+
+# -----------------------------------------------------------------------------
+def get_variant(iVariant):
+    """
+    Return the values of the parameters for the variant iVariant. The
+    variants cover a 10x10x10x... grid so that the files are different.
+    """
+
+    return {'PoyntingFluxPerBSi': '{:.3e}'.format(3e5 + 1e4*(iVariant % 100)),
+            'StochasticExponent': '{:.3f}'.format(0.1 + 0.01*(iVariant//100 % 10)),
+            'BrFactor':           '{:.3f}'.format(1.0 + 0.01*(iVariant//1000 % 10)),
+            'FactorB0':           '{:.3f}'.format(1.0 + 0.001*(iVariant % 7)),
+            'month':              str(1 + iVariant % 12),
+            'day':                str(1 + iVariant % 28)}
+
+# -----------------------------------------------------------------------------
+def run_one(benchmark, filenameTemplate, model, iVariant, dirOut):
+    """
+    Run one variant of the benchmark and return the list of the files written.
+    """
+
+    variant = get_variant(iVariant)
+    filenameOut = os.path.join(dirOut, 'PARAM.in')
+
+    if benchmark == 'add_commands':
+        change_param.add_commands('FACTORB0', filenameIn=filenameTemplate,
+                                  filenameOut=filenameOut, DoUseMarker=1)
+    elif benchmark == 'remove_commands':
+        change_param.remove_commands('END(END_2nd_scheme)',
+                                     filenameIn=filenameTemplate,
+                                     filenameOut=filenameOut, DoUseMarker=1)
+    elif benchmark == 'replace_commands':
+        change_param.replace_commands(
+            {'STARTTIME': '2014,'+variant['month']+','+variant['day']+',0,0,0,0.0'},
+            filenameIn=filenameTemplate, filenameOut=filenameOut, DoUseMarker=1)
+    elif benchmark == 'change_param_value':
+        change_param.change_param_value(
+            {key: variant[key] for key in ['PoyntingFluxPerBSi',
+                                           'StochasticExponent', 'FactorB0']},
+            filenameIn=filenameTemplate, filenameOut=filenameOut, DoUseMarker=1)
+    elif benchmark == 'change_param_local':
+        change_awsom_param.change_param_local(
+            time='MapTime', map='ADAPT_CR2154.fits', pfss='HARMONICS',
+            new_params=get_new_params(variant), DoUseMarker=1,
+            model=model, param=os.path.basename(filenameTemplate),
+            dirOut=dirOut)
+        return [os.path.join(dirOut, filename)
+                for filename in ['PARAM.in', 'HARMONICS.in', 'FDIPS.in']]
+
+    return [filenameOut]
+
+# -----------------------------------------------------------------------------
+def get_new_params(variant):
+    """
+    Return the new_params of change_param_local for the variant.
+    """
+
+    return {'change': {key: variant[key] for key in ['PoyntingFluxPerBSi',
+                                                     'BrFactor', 'FactorB0']}}
+
+# -----------------------------------------------------------------------------
+def run_benchmark(benchmark, filenameTemplate, model, nVariant, dirTmp,
+                  nBatch=100):
+    """
+    Run the benchmark for nVariant variants of filenameTemplate. Return a
+    dict with the time of the edits (reading and writing the files
+    included), the number of bytes written and the SHA-256 of all the files
+    written. Only the edits are timed, the files are hashed and removed
+    after each batch.
+    """
+
+    hash_out = hashlib.sha256()
+    nByte    = 0
+    dtRun    = 0.0
+
+    for iStart in range(0, nVariant, nBatch):
+        iVariant_I = range(iStart, min(iStart+nBatch, nVariant))
+        dirOut_I   = [os.path.join(dirTmp, str(iVariant))
+                      for iVariant in iVariant_I]
+        for dirOut in dirOut_I:
+            os.makedirs(dirOut, exist_ok=True)
+
+        if benchmark == 'change_param_sweep':
+            list_new_params = [get_new_params(get_variant(iVariant))
+                               for iVariant in iVariant_I]
+            tStart = time.perf_counter()
+            change_awsom_param.change_param_sweep(
+                list_new_params, dirOut_I, 'MapTime', 'ADAPT_CR2154.fits',
+                'HARMONICS', model, param=os.path.basename(filenameTemplate),
+                DoUseMarker=1)
+            dtRun += time.perf_counter() - tStart
+            filenames_I = [[os.path.join(dirOut, filename)
+                            for filename in ['PARAM.in', 'HARMONICS.in', 'FDIPS.in']]
+                           for dirOut in dirOut_I]
+        else:
+            filenames_I = []
+            for iVariant, dirOut in zip(iVariant_I, dirOut_I):
+                tStart = time.perf_counter()
+                filenames_I.append(run_one(benchmark, filenameTemplate, model,
+                                           iVariant, dirOut))
+                dtRun += time.perf_counter() - tStart
+
+        for filenames in filenames_I:
+            for filename in filenames:
+                with open(filename, 'rb') as file_in:
+                    content = file_in.read()
+                nByte += len(content)
+                hash_out.update(content)
+
+        for dirOut in dirOut_I:
+            shutil.rmtree(dirOut)
+
+    return {'time': dtRun, 'bytes': nByte, 'sha256': hash_out.hexdigest()}
+
+# -----------------------------------------------------------------------------
+def get_peak_memory(benchmark, filenameTemplate, model, nVariant, dirTmp):
+    """
+    Return the peak memory (in bytes) allocated by Python when running the
+    benchmark, measured by tracemalloc in a separate (slower) run.
+    """
+
+    tracemalloc.start()
+    run_benchmark(benchmark, filenameTemplate, model, nVariant, dirTmp)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return peak
+
+# =============================================================================
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Script to benchmark the change_param editing engine '
+                        + 'with the templates in Param. It needs to be '
+                        + 'run in the SWMFSOLAR dir.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('-n', '--nVariants',
+                            help='A string for the numbers of variants, '
+                            + 'separated by \',\'. (default: 1000,10000)',
+                            type=str, default='1000,10000')
+    ARG_PARSER.add_argument('-t', '--templates',
+                            help='A string for the templates in Param, '
+                            + 'separated by \',\'. '
+                            + '(default: '+','.join(TEMPLATES.keys())+')',
+                            type=str, default=','.join(TEMPLATES.keys()))
+    ARG_PARSER.add_argument('-b', '--benchmarks',
+                            help='A string for the benchmarks, separated by '
+                            + '\',\'. (default: '+','.join(BENCHMARKS)+')',
+                            type=str, default=','.join(BENCHMARKS))
+    ARG_PARSER.add_argument('-g', '--golden',
+                            help='The JSON file with the SHA-256 of the '
+                            + 'output of each benchmark to compare with. '
+                            + '(default: none)',
+                            type=str, default='')
+    ARG_PARSER.add_argument('-u', '--DoUpdateGolden',
+                            help='(default: 0)'
+                            + 'Use if you want to save the SHA-256 of the '
+                            + 'output into the golden file instead of '
+                            + 'comparing.',
+                            type=int, default=0)
+    ARG_PARSER.add_argument('-m', '--DoMemory',
+                            help='(default: 1)'
+                            + 'Use if you want to measure the peak memory '
+                            + 'in a separate run.',
+                            type=int, default=1)
+    ARGS = ARG_PARSER.parse_args()
+
+    nVariant_I = [int(nVariant) for nVariant in ARGS.nVariants.split(',')]
+
+    golden = {}
+    if ARGS.golden and not ARGS.DoUpdateGolden:
+        with open(ARGS.golden, 'r') as file_golden:
+            golden = json.load(file_golden)
+
+    IsFailed = False
+    results  = {}
+
+    print('{:<16} {:<20} {:>7} {:>10} {:>12} {:>12} {:>8}'.format(
+        'template', 'benchmark', 'n', 'variants/s', 'MB written',
+        'peak MB', 'golden'))
+
+    dirTmp = tempfile.mkdtemp(prefix='bench_change_param_')
+    try:
+        for template in ARGS.templates.split(','):
+            filenameTemplate = os.path.join('Param', template)
+            model = TEMPLATES.get(template, 'AWSoM')
+            for benchmark in ARGS.benchmarks.split(','):
+                for nVariant in nVariant_I:
+                    result = run_benchmark(benchmark, filenameTemplate, model,
+                                           nVariant, dirTmp)
+                    if ARGS.DoMemory:
+                        result['peak'] = get_peak_memory(
+                            benchmark, filenameTemplate, model, nVariant, dirTmp)
+                    key = template+':'+benchmark+':'+str(nVariant)
+                    results[key] = result['sha256']
+
+                    if key not in golden:
+                        strGolden = '-'
+                    elif golden[key] == result['sha256']:
+                        strGolden = 'same'
+                    else:
+                        strGolden = 'DIFFERS'
+                        IsFailed = True
+
+                    print('{:<16} {:<20} {:>7} {:>10.1f} {:>12.3f} {:>12} {:>8}'.format(
+                        template, benchmark, nVariant,
+                        nVariant/max(result['time'], 1e-9),
+                        result['bytes']/1e6,
+                        '{:.3f}'.format(result['peak']/1e6)
+                        if 'peak' in result else '-',
+                        strGolden))
+                    sys.stdout.flush()
+    finally:
+        shutil.rmtree(dirTmp)
+
+    if ARGS.golden and ARGS.DoUpdateGolden:
+        golden_all = {}
+        if os.path.isfile(ARGS.golden):
+            with open(ARGS.golden, 'r') as file_golden:
+                golden_all = json.load(file_golden)
+        golden_all.update(results)
+        with open(ARGS.golden, 'w') as file_golden:
+            json.dump(golden_all, file_golden, indent=1, sort_keys=True)
+        print('Saved the golden SHA-256 into '+ARGS.golden)
+
+    if IsFailed:
+        sys.exit('The output of some benchmarks differs from '+ARGS.golden)
@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 
 import argparse
+import concurrent.futures
+import copy
 import datetime as dt
+import itertools
+import os
 import sys
 import subprocess
 import warnings
@@ -10,11 +14,123 @@ from remap_magnetogram import FITS_RECOGNIZE
 import download_ADAPT
 
 # -----------------------------------------------------------------------------
-def change_param_local(time, map, pfss, scheme=2, poynting_flux=-1.0, new_params={},
-                       DoUseMarker=0,DoRestart=0):
+def get_template_filenames(model, param='Default', dirParam='Param'):
+    """
+    Return a dict with the template filenames for PARAM.in, HARMONICS.in and
+    FDIPS.in, the same files copied by 'make copy_param'.
+
+    Arguments:
+      model:    a string for the model: AWSoM, AWSoM2T, AWSoMR or
+                AWSoMR_SOFIE.
+      param:    an optional string for the PARAM.in file in dirParam used
+                instead of the default one of the model. Default is
+                'Default'.
+      dirParam: an optional string for the dir of the templates.
+                Default is Param.
+    """
+
+    if model == 'AWSoMR':
+        filenameParam = 'PARAM.in.awsomr'
+    elif model in ['AWSoM', 'AWSoM2T']:
+        filenameParam = 'PARAM.in.awsom'
+    elif model == 'AWSoMR_SOFIE':
+        filenameParam = 'PARAM.in.sofie'
+    else:
+        raise ValueError(model + ' must be either AWSoM, AWSoM2T, AWSoMR '
+                         + 'or AWSoMR_SOFIE.')
+
+    if param != 'Default':
+        filenameParam = param
+
+    return {'PARAM.in':     os.path.join(dirParam, filenameParam),
+            'HARMONICS.in': os.path.join(dirParam, 'HARMONICS.in'),
+            'FDIPS.in':     os.path.join(dirParam, 'FDIPS.in')}
+
+# -----------------------------------------------------------------------------
+def apply_new_params(param, new_params, DoUseMarker=0):
+    """
+    Apply the add, rm, replace and change entries of new_params (in this
+    order) to param, a change_param.ParamFile, and the stop entry (the
+    number of steps of a short run, e.g., a benchmark) to all the #STOP
+    commands with or without the marker. Nothing is written.
+    """
+
+    if 'add' in new_params.keys():
+        param.add_commands(new_params['add'], DoUseMarker=DoUseMarker)
+
+    if 'rm' in new_params.keys():
+        param.remove_commands(new_params['rm'], DoUseMarker=DoUseMarker)
+
+    if 'replace' in new_params.keys():
+        param.replace_commands(new_params['replace'], DoUseMarker=DoUseMarker)
+
+    if 'change' in new_params.keys():
+        param.change_param_value(new_params['change'], DoUseMarker=DoUseMarker)
+
+    if 'stop' in new_params.keys():
+        param.replace_commands({'STOP': str(new_params['stop'])+',-1.0'},
+                               DoUseMarker=0)
+
+# -----------------------------------------------------------------------------
+def get_map_time(time, map):
+    """
+    Return the filename of the map and the start time of the simulation
+    as a string for the #STARTTIME command (without the fraction of
+    second). The ADAPT map is downloaded if map is 'NoMap', and the start
+    time is the time of the map if time is 'MapTime'.
+    """
+
+    if time != 'MapTime':
+        # TIME is given with the correct format
+        time_input = dt.datetime.strptime(time, "%Y-%m-%dT%H:%M:%S")
+        time_param = time.replace('-',',').replace('T',',').replace(':',',')
+
+    if (map == 'NoMap'):
+        if time != 'MapTime':
+            # Download the ADAPT magnetogram if no map is pvoided
+            # default 'fixed', note that the time_input is correctly set.
+            filename_map = download_ADAPT.download_ADAPT_magnetogram(time_input)[0]
+            print("download the map as: ", filename_map)
+        else:
+            raise ValueError('No map is provided. Please provide the time '
+                             + 'by -t/--time to download the ADAPT map.')
+    else:
+        # The ADAPT map is provied
+        filename_map = map
+        
+        map_local  = FITS_RECOGNIZE(map)
+        time_map   = dt.datetime.strptime(map_local[9], "%Y-%m-%dT%H:%M:%S")
+
+        # Very weird GONG Synoptic map, the map time is a few days after the end of the CR.
+        # Use an approximation to get the time corresponding to the central meridian
+        if (map_local[0] == 'NSO-GONG Synoptic'):
+            CR_number = float(map_local[6])
+            time_map = dt.datetime(1853, 11, 9) + dt.timedelta(days=27.2753*(CR_number-0.5))
+
+        if time == 'MapTime':
+            # if the user does not provide the time, then set the time based
+            # on the time info from the ADAPT map.
+            time_param = (str(time_map.year)   + ',' + str(time_map.month) + ',' +
+                          str(time_map.day)    + ',' + str(time_map.hour)  + ',' +
+                          str(time_map.minute) + ',' + str(time_map.second))
+
+    return filename_map, time_param
+
+# -----------------------------------------------------------------------------
+def set_new_params(new_params, pfss, time_param, scheme=2, poynting_flux=-1.0,
+                   DoRestart=0):
+    """
+    Return new_params (for PARAM.in) and new_params_pfss (for
+    HARMONICS.in/FDIPS.in) with all the changes needed for the PFSS
+    solver, the scheme, the start time time_param (see get_map_time) and
+    the Poynting flux. The new_params of the caller is not changed.
+    """
 
     params_pfss = ['CHANGEWEAKFIELD', 'BrFactor', 'BrMin', 'nHarmonics']
 
+    # new_params is modified below, do not change the dict of the caller
+    new_params = copy.deepcopy(new_params)
+
     if 'change' in new_params.keys():
         # need to turn on CHANGEWEAKFIELD if BrFactor and/or BrMin are changed
         if 'BrFactor' in new_params['change'].keys() or 'BrMin' in new_params['change'].keys():
@@ -94,40 +210,6 @@ def change_param_local(time, map, pfss, scheme=2, poynting_flux=-1.0, new_params
             if len(commands_list_pfss) > 0:
                 new_params_pfss[key1] = ','.join(commands_list_pfss)
 
-    if time != 'MapTime':
-        # TIME is given with the correct format
-        time_input = dt.datetime.strptime(time, "%Y-%m-%dT%H:%M:%S")
-        time_param = time.replace('-',',').replace('T',',').replace(':',',')
-
-    if (map == 'NoMap'):
-        if time != 'MapTime':
-            # Download the ADAPT magnetogram if no map is pvoided
-            # default 'fixed', note that the time_input is correctly set.
-            filename_map = download_ADAPT.download_ADAPT_magnetogram(time_input)[0]
-            print("download the map as: ", filename_map)
-        else:
-            raise ValueError('No map is provided. Please provide the time '
-                             + 'by -t/--time to download the ADAPT map.')
-    else:
-        # The ADAPT map is provied
-        filename_map = map
-        
-        map_local  = FITS_RECOGNIZE(map)
-        time_map   = dt.datetime.strptime(map_local[9], "%Y-%m-%dT%H:%M:%S")
-
-        # Very weird GONG Synoptic map, the map time is a few days after the end of the CR.
-        # Use an approximation to get the time corresponding to the central meridian
-        if (map_local[0] == 'NSO-GONG Synoptic'):
-            CR_number = float(map_local[6])
-            time_map = dt.datetime(1853, 11, 9) + dt.timedelta(days=27.2753*(CR_number-0.5))
-
-        if time == 'MapTime':
-            # if the user does not provide the time, then set the time based
-            # on the time info from the ADAPT map.
-            time_param = (str(time_map.year)   + ',' + str(time_map.month) + ',' +
-                          str(time_map.day)    + ',' + str(time_map.hour)  + ',' +
-                          str(time_map.minute) + ',' + str(time_map.second))
-
     # Need to add the msc
     time_param = time_param+',0.0'
 
@@ -149,42 +231,215 @@ def change_param_local(time, map, pfss, scheme=2, poynting_flux=-1.0, new_params
         else:
             new_params['replace']={'POYNTINGFLUX':'{:<10.3e}'.format(poynting_flux)}
 
-    if 'add' in new_params.keys():
-        commands_add=new_params['add']
-        change_param.add_commands(commands_add, DoUseMarker=DoUseMarker)
+    return new_params, new_params_pfss
 
-    if 'add' in new_params_pfss.keys():
-        commands_add=new_params_pfss['add']
-        change_param.add_commands(commands_add, DoUseMarker=DoUseMarker, filenameIn=pfss+'.in', filenameOut=pfss+'.in')
+# -----------------------------------------------------------------------------
+def load_templates(model, param='Default'):
+    """
+    Return a dict with the (cached) ParamFile of the PARAM.in, HARMONICS.in
+    and FDIPS.in templates of the model, see get_template_filenames.
+    """
 
-    if 'rm' in new_params.keys():
-        commands_rm=new_params['rm']
-        change_param.remove_commands(commands_rm, DoUseMarker=DoUseMarker)
+    filenames = get_template_filenames(model, param)
 
-    if 'rm' in new_params_pfss.keys():
-        commands_rm=new_params_pfss['rm']
-        change_param.remove_commands(commands_rm, DoUseMarker=DoUseMarker, filenameIn=pfss+'.in', filenameOut=pfss+'.in')
+    return {filename: change_param.load_template(filenames[filename])
+            for filename in filenames}
 
-    if 'replace' in new_params.keys():
-        DictReplace = new_params['replace']
-        change_param.replace_commands(DictReplace, DoUseMarker=DoUseMarker)
+# -----------------------------------------------------------------------------
+def render_param_files(new_params, new_params_pfss, pfss, DoUseMarker=0,
+                       templates=None):
+    """
+    Return a dict with the changed ParamFile of PARAM.in and
+    HARMONICS.in/FDIPS.in. Nothing is written.
+
+    Arguments:
+      new_params:      a dict for the changes of PARAM.in, see set_new_params.
+      new_params_pfss: a dict for the changes of pfss+'.in'.
+      pfss:            a string for the PFSS solver, HARMONICS or FDIPS.
+      DoUseMarker:     an optional integer indicating whether to use ^ as a
+                       marker.
+      templates:       an optional dict with the ParamFile of the templates,
+                       see load_templates. Copies of the templates are
+                       changed, and all of them are returned. If it is None,
+                       the PARAM.in file (and pfss+'.in' if it needs to be
+                       changed) in the current dir is read.
+    """
+
+    if templates is None:
+        param_files = {'PARAM.in': change_param.ParamFile('PARAM.in')}
+        if new_params_pfss:
+            param_files[pfss+'.in'] = change_param.ParamFile(pfss+'.in')
+    else:
+        param_files = {filename: templates[filename].copy()
+                       for filename in templates}
 
-    if 'replace' in new_params_pfss.keys():
-        DictReplace = new_params_pfss['replace']
-        change_param.replace_commands(DictReplace, DoUseMarker=DoUseMarker, filenameIn=pfss+'.in', filenameOut=pfss+'.in')
+    # load PARAM.in once, apply all the changes in memory and write it once
+    apply_new_params(param_files['PARAM.in'], new_params,
+                     DoUseMarker=DoUseMarker)
 
-    if 'change' in new_params.keys():
-        DictChange  = new_params['change']
-        change_param.change_param_value(DictChange, DoUseMarker=DoUseMarker)
+    # same for HARMONICS.in/FDIPS.in if any of their params is changed
+    if new_params_pfss:
+        apply_new_params(param_files[pfss+'.in'], new_params_pfss,
+                         DoUseMarker=DoUseMarker)
+
+    return param_files
+
+# -----------------------------------------------------------------------------
+def write_param_files(param_files, dirOut='.'):
+    """
+    Write the dict of ParamFile (see render_param_files) into dirOut.
+    """
+
+    for filename in param_files:
+        param_files[filename].write(os.path.join(dirOut, filename))
 
-    if 'change' in new_params_pfss.keys():
-        DictChange  = new_params_pfss['change']
-        change_param.change_param_value(DictChange, DoUseMarker=DoUseMarker, filenameIn=pfss+'.in', filenameOut=pfss+'.in')
+# -----------------------------------------------------------------------------
+def get_param_files(time, map, pfss, scheme=2, poynting_flux=-1.0, new_params={},
+                    DoUseMarker=0, DoRestart=0, model=None, param='Default'):
+    """
+    Return a dict with the changed ParamFile of PARAM.in and
+    HARMONICS.in/FDIPS.in (see render_param_files) and the filename of the
+    map. The arguments are the same as change_param_local. Nothing is
+    written, but the ADAPT map is downloaded if map is 'NoMap'.
+    """
+
+    filename_map, time_param = get_map_time(time, map)
+
+    new_params, new_params_pfss = set_new_params(new_params, pfss, time_param,
+                                                 scheme=scheme,
+                                                 poynting_flux=poynting_flux,
+                                                 DoRestart=DoRestart)
+
+    if model is None:
+        templates = None
+    else:
+        templates = load_templates(model, param)
+
+    param_files = render_param_files(new_params, new_params_pfss, pfss,
+                                     DoUseMarker=DoUseMarker,
+                                     templates=templates)
+
+    return param_files, filename_map
+
+# -----------------------------------------------------------------------------
+def remap_magnetogram(filename_map, dirOut='.'):
+    """
+    Prepare the map_*.out files of each realization for filename_map in
+    dirOut. It needs to be called from the SWMFSOLAR dir.
+    """
+
+    str_exe = str(os.path.abspath('Scripts/remap_magnetogram.py') + ' '
+                  + os.path.abspath(filename_map))
+
+    subprocess.call(str_exe, shell=True, cwd=dirOut)
+
+# -----------------------------------------------------------------------------
+def change_param_local(time, map, pfss, scheme=2, poynting_flux=-1.0, new_params={},
+                       DoUseMarker=0,DoRestart=0, model=None, param='Default',
+                       dirOut='.'):
+    """
+    Change PARAM.in and HARMONICS.in/FDIPS.in based on new_params and
+    prepare the maps for all the realizations.
+
+    If model is None, the PARAM.in, HARMONICS.in and FDIPS.in files
+    (copied by 'make copy_param') in the current dir are changed.
+    Otherwise the files are created from the (cached) templates of the
+    model and param, see get_template_filenames. The files and the maps
+    are written into dirOut.
+    """
+
+    param_files, filename_map = get_param_files(time, map, pfss, scheme=scheme,
+                                                poynting_flux=poynting_flux,
+                                                new_params=new_params,
+                                                DoUseMarker=DoUseMarker,
+                                                DoRestart=DoRestart,
+                                                model=model, param=param)
+    write_param_files(param_files, dirOut)
 
     # prepare each realization map.
-    str_exe = str('Scripts/remap_magnetogram.py ' + filename_map)
+    remap_magnetogram(filename_map, dirOut)
 
-    subprocess.call(str_exe, shell=True)
+# -----------------------------------------------------------------------------
+def change_param_sweep(list_new_params, list_dirOut, time, map, pfss, model,
+                       scheme=2, poynting_flux=-1.0, param='Default',
+                       DoUseMarker=0, DoRestart=0, nJobs=8):
+    """
+    Create the PARAM.in, HARMONICS.in and FDIPS.in files for many variants
+    in one call. The map and the templates are read only once, and the
+    variants are rendered and written in parallel.
+
+    Arguments:
+      list_new_params: a list of new_params dicts, one for each variant,
+                       e.g., created by expand_param_grid.
+      list_dirOut:     a list of strings for the output dirs, one for each
+                       variant. The dirs are created if needed.
+      nJobs:           an optional integer for the number of threads writing
+                       the files. Default is 8.
+      The other arguments are the same as change_param_local.
+
+    Note: the maps are NOT remapped, run Scripts/remap_magnetogram.py once
+          for the map if the map_*.out files are needed.
+
+    Example:
+         list_new_params = expand_param_grid({'PoyntingFluxPerBSi':[3e5,6e5],
+                                              'BrFactor':[1.0,1.2]})
+         list_dirOut = ['sweep/run'+str(i).zfill(3)
+                        for i in range(len(list_new_params))]
+         change_param_sweep(list_new_params, list_dirOut, 'MapTime',
+                            'ADAPT_CR2154.fits', 'HARMONICS', 'AWSoM')
+    """
+
+    if len(list_new_params) != len(list_dirOut):
+        raise ValueError('list_new_params and list_dirOut must have the same '
+                         + 'length.')
+
+    filename_map, time_param = get_map_time(time, map)
+
+    templates = load_templates(model, param)
+
+    def render_one(new_params, dirOut):
+        new_params, new_params_pfss = set_new_params(new_params, pfss, time_param,
+                                                     scheme=scheme,
+                                                     poynting_flux=poynting_flux,
+                                                     DoRestart=DoRestart)
+        param_files = render_param_files(new_params, new_params_pfss, pfss,
+                                         DoUseMarker=DoUseMarker,
+                                         templates=templates)
+        os.makedirs(dirOut, exist_ok=True)
+        write_param_files(param_files, dirOut)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=nJobs) as executor:
+        # list() is needed to raise the errors of the variants
+        list(executor.map(render_one, list_new_params, list_dirOut))
+
+# -----------------------------------------------------------------------------
+def expand_param_grid(DictGrid, new_params={}):
+    """
+    Return a list of new_params dicts for all the combinations of the
+    values in DictGrid, which is a dict with the name of the parameter (see
+    change_param_value) and a list of its values. The changes in new_params
+    are the same for all the variants.
+
+    Example:
+         expand_param_grid({'PoyntingFluxPerBSi':[3e5,6e5], 'BrFactor':[1.0,1.2]})
+         returns
+         [{'change':{'PoyntingFluxPerBSi':3e5, 'BrFactor':1.0}},
+          {'change':{'PoyntingFluxPerBSi':3e5, 'BrFactor':1.2}},
+          {'change':{'PoyntingFluxPerBSi':6e5, 'BrFactor':1.0}},
+          {'change':{'PoyntingFluxPerBSi':6e5, 'BrFactor':1.2}}]
+    """
+
+    names = list(DictGrid.keys())
+
+    list_new_params = []
+    for values in itertools.product(*[DictGrid[name] for name in names]):
+        new_params_local = copy.deepcopy(new_params)
+        if 'change' not in new_params_local.keys():
+            new_params_local['change'] = {}
+        new_params_local['change'].update(zip(names, values))
+        list_new_params.append(new_params_local)
+
+    return list_new_params
 
 # =============================================================================
 if __name__ == '__main__':
@@ -220,5 +475,9 @@ if __name__ == '__main__':
                             type=int)
     ARGS = ARG_PARSER.parse_args()
 
-    change_param_local(time=ARGS.time, map=ARGS.map, pfss=ARGS.pfss,
-                       poynting_flux=ARGS.poynting_flux, DoUseMarker=0, DoRestart=ARGS.DoRestart)
+    try:
+        change_param_local(time=ARGS.time, map=ARGS.map, pfss=ARGS.pfss,
+                           poynting_flux=ARGS.poynting_flux, DoUseMarker=0,
+                           DoRestart=ARGS.DoRestart)
+    except ValueError as error:
+        sys.exit(str(error))
@@ -1,7 +1,601 @@
 #!/usr/bin/env python3
 
+import bisect
+import functools
+import os
 import re
-import sys
+
+# the parsed templates, see load_template
+_template_cache = {}
+
+# -----------------------------------------------------------------------------
+def split_command(command):
+    """
+    Split a command string into the command name and the optional ExtraStr
+    provided inside '()', e.g., BODY(test) returns ('BODY', 'test') and
+    BODY returns ('BODY', None).
+    """
+
+    if '(' in command and ')' in command:
+        commandLocal = command.split('(')[0]
+        ExtraStr     = command.split('(')[1].split(')')[0]
+    else:
+        commandLocal = command
+        ExtraStr     = None
+
+    return commandLocal, ExtraStr
+
+# -----------------------------------------------------------------------------
+def is_selected_command(line, ExtraStr, DoUseMarker):
+    """
+    Check whether the command line (the line containing the command name) is
+    selected by ExtraStr and/or the marker '^'. The command is selected if:
+      1. the line contains ExtraStr if ExtraStr is provided and not DoUseMarker
+      2. '^' follows by ExtraStr if ExtraStr is provided and DoUseMarker=1
+      3. always if ExtraStr is not provided and not DoUseMarker
+      4. the line contains '^' if ExtraStr is not provided and DoUseMarker=1
+    """
+
+    if ExtraStr != None:
+        if DoUseMarker:
+            return bool(re.search(rf'\b{ExtraStr}\^(?=\W)', line, re.IGNORECASE))
+        else:
+            return bool(re.search(rf'\b{ExtraStr}\b', line))
+    elif not DoUseMarker:
+        return True
+    else:
+        return '^' in line
+
+# -----------------------------------------------------------------------------
+def is_empty_commands(StrCommands):
+    """
+    Return True if StrCommands is an empty string. Raise TypeError if it is
+    not a string.
+    """
+
+    # report error if StrCommands is not a string
+    if not isinstance(StrCommands,str):
+        raise TypeError('StrCommands is not a string, StrCommands=',
+                        StrCommands)
+
+    return len(StrCommands) == 0
+
+# -----------------------------------------------------------------------------
+def is_empty_dict(DictParam):
+    """
+    Return True if DictParam is an empty dict. Raise TypeError if it is
+    not a dict.
+    """
+
+    # report error if DictParam is not a dict
+    if not isinstance(DictParam,dict):
+        raise TypeError('DictParam is not a dict, DictParam=', DictParam)
+
+    return not DictParam
+
+# -----------------------------------------------------------------------------
+class ParamFile(object):
+    """
+    A PARAM.in/FDIPS.in/HARMONICS.in file loaded into memory.
+
+    The file is read once, any number of add/rm/replace/change operations are
+    applied to the lines in memory and the result is written once with
+    write(). The ^ marker and (ExtraStr) rules are the same as the
+    add_commands, remove_commands, replace_commands and change_param_value
+    functions, which are wrappers around this class.
+
+    Example:
+         param = ParamFile('PARAM.in')
+         param.add_commands('FACTORB0', DoUseMarker=1)
+         param.replace_commands({'POYNTINGFLUX':'3e5'})
+         param.change_param_value({'BrFactor':1.2}, DoUseMarker=1)
+         param.write('PARAM.in')
+    """
+
+    def __init__(self, filenameIn='PARAM.in', lines=None):
+        """
+        Arguments:
+          filenameIn: an optional string for the input filename.
+                      Defualt is PARAM.in.
+          lines:      an optional list of lines (with '\\n') used instead of
+                      reading filenameIn.
+        """
+
+        self.filename = filenameIn
+
+        if lines is None:
+            with open(filenameIn, 'rt') as params:
+                lines = list(params)
+
+        self.lines = lines
+
+        # index of the lines for each command, built when it is needed
+        self._iLine_D = None
+
+        # (NameCommand, old length, new length) of the commands whose number
+        # of parameters is changed by replace_commands
+        self.blocks_resized = []
+
+    # -------------------------------------------------------------------------
+    def copy(self):
+        """
+        Return a copy that can be changed without changing this one. Only
+        the list of lines and the index are copied, not the lines.
+        """
+
+        param = ParamFile(self.filename, lines=list(self.lines))
+
+        if self._iLine_D is not None:
+            param._iLine_D = {name: list(iLine_I)
+                              for name, iLine_I in self._iLine_D.items()}
+
+        return param
+
+    # -------------------------------------------------------------------------
+    def add_commands(self, StrCommands, DoUseMarker=0):
+        """
+        Add (turn on) commands. See add_commands for the arguments.
+        """
+
+        if is_empty_commands(StrCommands):
+            return
+
+        # get all the commands in an array
+        command_I=StrCommands.split(',')
+
+        IsChanged_I = [False for i in range(len(command_I))]
+
+        # find all the lines first so that every command is checked against
+        # the original lines, then change them
+        iLineChange_I = set()
+        for icom, command in enumerate(command_I):
+            commandLocal, ExtraStr = split_command(command)
+            for iLine in self.get_command_lines(commandLocal):
+                if is_selected_command(self.lines[iLine], ExtraStr, DoUseMarker):
+                    iLineChange_I.add(iLine)
+                    IsChanged_I[icom] = True
+
+        for iLine in iLineChange_I:
+            self._set_line(iLine, '#'+self.lines[iLine])
+
+        if False in IsChanged_I:
+            raise ValueError('Some commands are not added: '
+                             + ', '.join(name for name, IsChanged in
+                                         zip(command_I, IsChanged_I)
+                                         if not IsChanged))
+
+    # -------------------------------------------------------------------------
+    def remove_commands(self, StrCommands, DoUseMarker=0):
+        """
+        Remove (turn off) commands. See remove_commands for the arguments.
+        """
+
+        if is_empty_commands(StrCommands):
+            return
+
+        # get all the commands in an array
+        command_I=StrCommands.split(',')
+
+        IsChanged_I = [False for i in range(len(command_I))]
+
+        # find all the lines first so that every command is checked against
+        # the original lines, then change them
+        iLineChange_I = set()
+        for icom, command in enumerate(command_I):
+            commandLocal, ExtraStr = split_command(command)
+            for iLine in self.get_command_lines('#'+commandLocal):
+                if is_selected_command(self.lines[iLine], ExtraStr, DoUseMarker):
+                    iLineChange_I.add(iLine)
+                    IsChanged_I[icom] = True
+
+        for iLine in iLineChange_I:
+            self._set_line(iLine, self.lines[iLine][1:])
+
+        if False in IsChanged_I:
+            raise ValueError('Some commands are not removed: '
+                             + ', '.join(name for name, IsChanged in
+                                         zip(command_I, IsChanged_I)
+                                         if not IsChanged))
+
+    # -------------------------------------------------------------------------
+    def replace_commands(self, DictParam, DoUseMarker=0):
+        """
+        Replace the parameters of commands. See replace_commands for the
+        arguments.
+        """
+
+        if is_empty_dict(DictParam):
+            return
+
+        IsChanged_I = [False for i in range(len(DictParam.keys()))]
+
+        # loop through all the keys
+        for icom, NameCommand in enumerate(DictParam.keys()):
+            commandLocal, ExtraStr = split_command(NameCommand)
+
+            # obtain the parameter list for the command to be replaced
+            strParam_I = DictParam[NameCommand].split(',')
+
+            # the list is updated in place if the number of lines changes
+            iLine_I = self.get_command_lines('#'+commandLocal)
+            i = 0
+            while i < len(iLine_I):
+                iLine = iLine_I[i]
+                if is_selected_command(self.lines[iLine], ExtraStr, DoUseMarker):
+                    len_comm_orig = self.get_block_length(iLine)
+                    if len(strParam_I) != len_comm_orig:
+                        self.blocks_resized.append(
+                            (commandLocal, len_comm_orig, len(strParam_I)))
+                    self._set_lines(iLine+1, iLine+1+len_comm_orig,
+                                    self._get_block_new(iLine, len_comm_orig,
+                                                        strParam_I))
+                    IsChanged_I[icom] = True
+                i += 1
+
+        if False in IsChanged_I:
+            raise ValueError('Some commands are not replaced: '
+                             + ', '.join(name for name, IsChanged in
+                                         zip(DictParam.keys(), IsChanged_I)
+                                         if not IsChanged))
+
+    # -------------------------------------------------------------------------
+    def change_param_value(self, DictParam, DoUseMarker=0):
+        """
+        Change the value of parameters. See change_param_value for the
+        arguments.
+        """
+
+        if is_empty_dict(DictParam):
+            return
+
+        IsChanged_I = [False for i in range(len(DictParam.keys()))]
+
+        key_I = list(DictParam.keys())
+
+        # all the keys are searched with one pattern in one sweep of the
+        # file, only the lines found are checked key by key
+        pattern, pattern_I = get_param_patterns(tuple(key_I), bool(DoUseMarker))
+
+        for iLine in self.get_lines_matched(pattern):
+            line = self.lines[iLine]
+            for ikey, key in enumerate(key_I):
+                if pattern_I[ikey].search(line):
+                    self._set_line(iLine, get_param_line(DictParam[key], key))
+                    IsChanged_I[ikey] = True
+
+        if False in IsChanged_I:
+            raise ValueError('Some params are not changed: '
+                             + ', '.join(name for name, IsChanged in
+                                         zip(DictParam.keys(), IsChanged_I)
+                                         if not IsChanged))
+
+    # -------------------------------------------------------------------------
+    def write(self, filenameOut=None):
+        """
+        Write the lines to filenameOut. Default is the input filename.
+        """
+
+        if filenameOut is None:
+            filenameOut = self.filename
+
+        with open(filenameOut, 'w') as file_output:
+            file_output.write(''.join(self.lines))
+
+    # -------------------------------------------------------------------------
+    def get_effective_param(self, dirRun='.'):
+        """
+        Return an EffectiveParam with the commands actually used by the SWMF:
+        only the active commands (starting with '#'), split into sessions
+        by #RUN and into components by #BEGIN_COMP/#END_COMP, and ignoring
+        everything after #END. The #INCLUDE commands are expanded with the
+        files relative to dirRun (the run dir), which are read only when
+        the #INCLUDE command is active and then cached like the templates,
+        see load_template.
+        """
+
+        effective = EffectiveParam()
+        self._add_effective_param(effective, dirRun, 'CON', [])
+
+        return effective
+
+    # -------------------------------------------------------------------------
+    def _add_effective_param(self, effective, dirRun, comp, filenames_used):
+        """
+        Add the active commands to effective. Return the current component
+        and whether #END is reached.
+        """
+
+        lines = self.lines
+
+        for iLine in range(len(lines)):
+            NameCommand = get_first_word(lines[iLine])
+
+            if len(NameCommand) < 2 or NameCommand[0] != '#':
+                continue
+
+            NameCommand = NameCommand[1:]
+
+            # the parameter values are the strings before a TAB or 3 spaces
+            nParam = self.get_block_length(iLine) if iLine+1 < len(lines) else 0
+            values = [get_param_value(line)
+                      for line in lines[iLine+1:iLine+1+nParam]]
+
+            if NameCommand == 'END':
+                return comp, True
+            elif NameCommand == 'RUN':
+                effective.sessions.append({})
+            elif NameCommand == 'BEGIN_COMP':
+                comp = lines[iLine].split()[1]
+            elif NameCommand == 'END_COMP':
+                comp = 'CON'
+            elif NameCommand == 'INCLUDE' and len(values) > 0:
+                filename = os.path.join(dirRun, values[0])
+                if not os.path.isfile(filename):
+                    effective.filenames_missing.append(filename)
+                    continue
+                path = os.path.realpath(filename)
+                if path in filenames_used:
+                    raise ValueError(filename + ' includes itself.')
+                comp, IsEnd = load_template(filename)._add_effective_param(
+                    effective, dirRun, comp, filenames_used+[path])
+                if IsEnd:
+                    return comp, True
+            else:
+                effective.sessions[-1].setdefault(comp, []).append(
+                    (NameCommand, values))
+
+        return comp, False
+
+    # -------------------------------------------------------------------------
+    def get_command_lines(self, name):
+        """
+        Return the (sorted) indexes of the lines starting with name, e.g.,
+        '#POYNTINGFLUX' for the active and 'POYNTINGFLUX' for the inactive
+        POYNTINGFLUX commands. The index is built once for the whole file
+        and kept up to date by the edits, so the returned list should not
+        be modified.
+        """
+
+        if self._iLine_D is None:
+            self._iLine_D = {}
+            for iLine, line in enumerate(self.lines):
+                name_line = get_first_word(line)
+                if name_line:
+                    self._iLine_D.setdefault(name_line, []).append(iLine)
+
+        return self._iLine_D.get(name, [])
+
+    # -------------------------------------------------------------------------
+    def get_lines_matched(self, pattern):
+        """
+        Return the indexes of the lines matched by the compiled pattern. The
+        whole file is searched at once and the search restarts at the next
+        line after each match, so every matched line is found.
+        """
+
+        text = ''.join(self.lines)
+
+        # the position of the beginning of each line in text
+        iPos_I = [0]
+        for line in self.lines:
+            iPos_I.append(iPos_I[-1] + len(line))
+
+        iLine_I = []
+        match = pattern.search(text)
+        while match:
+            iLine = bisect.bisect_right(iPos_I, match.start()) - 1
+            iLine_I.append(iLine)
+            match = pattern.search(text, iPos_I[iLine+1])
+
+        return iLine_I
+
+    # -------------------------------------------------------------------------
+    def get_block_length(self, iLine):
+        """
+        Return the number of parameter lines of the command at iLine, i.e.,
+        the number of non-empty lines following the command line.
+        """
+
+        lines = self.lines
+
+        # determine the length of the block of the command
+        len_comm_orig = 0
+        # the parameter starts at iLine+1
+        while lines[iLine+1+len_comm_orig].strip() != '':
+            len_comm_orig = len_comm_orig+1
+            if iLine+1+len_comm_orig == len(lines):
+                break
+
+        return len_comm_orig
+
+    # -------------------------------------------------------------------------
+    def _set_line(self, iLine, line):
+        """
+        Set the line at iLine and update the index of the commands.
+        """
+
+        self._set_lines(iLine, iLine+1, [line])
+
+    # -------------------------------------------------------------------------
+    def _set_lines(self, iStart, iEnd, lines_new):
+        """
+        Replace the lines from iStart to iEnd (excluded) with lines_new and
+        update the index of the commands.
+        """
+
+        if self._iLine_D is not None:
+            nShift = len(lines_new) - (iEnd - iStart)
+
+            # remove the old lines from the index
+            for iLine, line in enumerate(self.lines[iStart:iEnd], iStart):
+                name_line = get_first_word(line)
+                if name_line:
+                    self._iLine_D[name_line].remove(iLine)
+
+            # shift the lines after the block if the number of lines changes
+            if nShift != 0:
+                for iLine_I in self._iLine_D.values():
+                    for i in range(len(iLine_I)-1, -1, -1):
+                        if iLine_I[i] < iEnd:
+                            break
+                        iLine_I[i] += nShift
+
+            # add the new lines to the index
+            for iLine, line in enumerate(lines_new, iStart):
+                name_line = get_first_word(line)
+                if name_line:
+                    bisect.insort(self._iLine_D.setdefault(name_line, []),
+                                  iLine)
+
+        self.lines[iStart:iEnd] = lines_new
+
+    # -------------------------------------------------------------------------
+    def _get_block_new(self, iLine, len_comm_orig, strParam_I):
+        """
+        Return the new parameter lines of the command at iLine.
+        """
+
+        # create the new list of the command needs to be replaced
+        lines_command = []
+        for iParam,param_local in enumerate(strParam_I):
+            if len(strParam_I) == len_comm_orig:
+                # use the same comment if the size of the command does not change
+                # split the original line parame, the parameter starts at iLine+1
+                line_split = self.lines[iLine+1+iParam].split()
+                line_new   = param_local +'\t\t\t' \
+                    + ' '.join(line_split[len(param_local.split()):])+'\n'
+            else:
+                # if the size changes, then no comment for the parameters...
+                line_new   = param_local + '\n'
+            lines_command.append(line_new)
+
+        return lines_command
+
+# -----------------------------------------------------------------------------
+class EffectiveParam(object):
+    """
+    The commands that are actually used by the SWMF, see
+    ParamFile.get_effective_param.
+
+    Attributes:
+      sessions:          a list with a dict for each session. The dict has the
+                         component ('CON' for the commands outside of
+                         #BEGIN_COMP/#END_COMP, 'SC', 'IH' ...) as the key and
+                         a list of (NameCommand, list of parameter values) as
+                         the value, in the order used by the SWMF. NameCommand
+                         does not contain '#', e.g., 'POYNTINGFLUX'.
+      filenames_missing: a list of the included files not found, e.g.,
+                         RESTART.in for a run that is not a restart run.
+    """
+
+    def __init__(self):
+        self.sessions          = [{}]
+        self.filenames_missing = []
+
+    # -------------------------------------------------------------------------
+    def get_commands(self, NameCommand, comp=None, iSession=None):
+        """
+        Return a list of (iSession, comp, list of parameter values) for all
+        the active NameCommand commands, optionally only in the component comp
+        and/or the session iSession (starting from 0).
+        """
+
+        commands = []
+        for iSessionLocal, session in enumerate(self.sessions):
+            if iSession is not None and iSessionLocal != iSession:
+                continue
+            for compLocal, commands_comp in session.items():
+                if comp is not None and compLocal != comp:
+                    continue
+                for name, values in commands_comp:
+                    if name == NameCommand:
+                        commands.append((iSessionLocal, compLocal, values))
+
+        return commands
+
+# -----------------------------------------------------------------------------
+def load_template(filename):
+    """
+    Return a copy of the ParamFile of filename, e.g., Param/PARAM.in.awsom.
+
+    The file is read and indexed only once per process and kept in a cache
+    keyed by the path, modification time and size of the file, so a changed
+    template is read again. The returned copy can be changed and written
+    to any file without changing the cached template.
+    """
+
+    path = os.path.realpath(filename)
+    stat = os.stat(path)
+    key  = (path, stat.st_mtime_ns, stat.st_size)
+
+    if key not in _template_cache:
+        param = ParamFile(filename)
+        # build the index once so that all the copies share the work
+        param.get_command_lines('')
+        _template_cache[key] = param
+
+    return _template_cache[key].copy()
+
+# -----------------------------------------------------------------------------
+def get_first_word(line):
+    """
+    Return the first word of the line, or '' for an empty line.
+    """
+
+    words = line.split(None, 1)
+
+    if len(words) == 0:
+        return ''
+
+    return words[0]
+
+# -----------------------------------------------------------------------------
+@functools.lru_cache(maxsize=64)
+def get_param_patterns(key_I, DoUseMarker):
+    """
+    Return the compiled patterns to find the parameters named key_I (a
+    tuple) in change_param_value: one pattern matching any of the keys
+    and a list of patterns for each key. The name of the parameter needs
+    to be in the line if not DoUseMarker, or '^' needs to follow the name
+    of the parameter if DoUseMarker. The patterns are cached, so the same
+    keys are compiled only once.
+    """
+
+    if DoUseMarker:
+        strPattern_I = [rf'\b{key}\^(?=\W)' for key in key_I]
+        flags = re.IGNORECASE
+    else:
+        strPattern_I = [rf'\b{key}\b' for key in key_I]
+        flags = 0
+
+    pattern = re.compile('|'.join('(?:'+strPattern+')'
+                                  for strPattern in strPattern_I), flags)
+    pattern_I = [re.compile(strPattern, flags) for strPattern in strPattern_I]
+
+    return pattern, pattern_I
+
+# -----------------------------------------------------------------------------
+def get_param_value(line):
+    """
+    Return the value of the parameter in the line, i.e., the string before
+    the first TAB or 3 spaces as the SWMF reads it.
+    """
+
+    return re.split(r'\t|   ', line.strip(), 1)[0]
+
+# -----------------------------------------------------------------------------
+def get_param_line(value, key):
+    """
+    Return the line setting the parameter named key to value.
+    """
+
+    if isinstance(value, str):
+        return value+'\t\t\t'+key+'\n'
+
+    try:
+        return str(value)+'\t\t\t'+key+'\n'
+    except Exception as error:
+        raise TypeError(error, "Value cannot convert to a string.")
 
 # -----------------------------------------------------------------------------
 def add_commands(StrCommands, filenameIn='PARAM.in',
@@ -60,71 +654,13 @@ def add_commands(StrCommands, filenameIn='PARAM.in',
          add_commands('BODY,TIMEACCURATE',DoUseMarker=1)
     """
 
-    # report error if StrCommands is not a string
-    if not isinstance(StrCommands,str):
-        raise TypeError('StrCommands is not a string, StrCommands=', 
-                        StrCommands)
-
-    # return if is an empty string
-    if len(StrCommands) == 0:
+    # return if there is nothing to do
+    if is_empty_commands(StrCommands):
         return
 
-    # get all the commands in an array
-    command_I=StrCommands.split(',')
-
-    IsChanged_I = [False for i in range(len(command_I))]
-
-    with open(filenameIn, 'rt') as params:
-        lines = list(params)
-
-    # loop through all the lines
-    for iLine, line in enumerate(lines):
-        # loop through all the commands
-        for icom, command in enumerate(command_I):
-            # well the line may contain the command name + ExtraStr
-            commands_line = line.split()
-
-            # check whether extra string is provided with ()
-            if '(' and ')' in command:
-                commandLocal = command.split('(')[0]
-                ExtraStr     = command.split('(')[1].split(')')[0]
-            else:
-                commandLocal = command
-                ExtraStr     = None
-
-            if len(commands_line) == 0:
-                continue
-
-            if commandLocal == commands_line[0]:
-                # extra string is provided...
-                if ExtraStr != None:
-                    # if ExtraStr is provided, add the command if the 
-                    # line contains:
-                    # 1. the ExtraStr if not DoUseMarker
-                    # 2. '^' follows by ExtraStr if DoUseMarker=1
-                    if ((re.search(rf'\b{ExtraStr}\b', line) and not DoUseMarker) or
-                        (re.search(rf'\b{ExtraStr}\^(?=\W)', line, re.IGNORECASE) and DoUseMarker)):
-                        lines[iLine] = '#'+line
-                        IsChanged_I[icom] = True
-                elif not DoUseMarker:
-                    # DoUseMarker = 0 and ExtraStr = None
-                    lines[iLine] = '#'+line
-                    IsChanged_I[icom] = True
-                else:
-                    # DoUseMarker = 1 and ExtraStr = None
-                    if '^' in line:
-                        lines[iLine] = '#'+line
-                        IsChanged_I[icom] = True
-
-    if False in IsChanged_I:
-        print('--------------------------------------------------------')
-        print("command_I   =", command_I)
-        print("IsChanged_I =", IsChanged_I)
-        sys.exit("Some commands are not added!!!")
-
-    with open(filenameOut, 'w') as file_output:
-        for line in lines:
-            file_output.write(line)
+    param = ParamFile(filenameIn)
+    param.add_commands(StrCommands, DoUseMarker=DoUseMarker)
+    param.write(filenameOut)
 
 # -----------------------------------------------------------------------------
 def remove_commands(StrCommands, filenameIn='PARAM.in',
@@ -148,70 +684,13 @@ def remove_commands(StrCommands, filenameIn='PARAM.in',
     Example is similar to add_commands.
     """
 
-    # report error if StrCommands is not a string
-    if not isinstance(StrCommands,str):
-        raise TypeError('StrCommands is not a string, StrCommands=',
-                        StrCommands)
-
-    # return if is an empty string
-    if len(StrCommands)== 0:
+    # return if there is nothing to do
+    if is_empty_commands(StrCommands):
         return
 
-    # get all the commands in an array
-    command_I=StrCommands.split(',')
-
-    IsChanged_I = [False for i in range(len(command_I))]
-
-    with open(filenameIn, 'rt') as params:
-        lines = list(params)
-
-    # loop through all the lines
-    for iLine, line in enumerate(lines):
-        # loop through all the commands
-        for icom, command in enumerate(command_I):
-            # well the line may contain the command name + ExtraStr
-            commands_line = line.split()
-
-            # check whether extra string is provided with ()
-            if '(' and ')' in command:
-                commandLocal = command.split('(')[0]
-                ExtraStr     = command.split('(')[1].split(')')[0]
-            else:
-                commandLocal = command
-                ExtraStr     = None
-
-            if len(commands_line) == 0:
-                continue
-
-            if commandLocal == commands_line[0][1:] and commands_line[0][0] == '#':
-                if ExtraStr != None:
-                    # if ExtraStr is provided, remove the command if the
-                    # line contains:
-                    # 1. the ExtraStr if not DoUseMarker
-                    # 2. '^' follows by ExtraStr if DoUseMarker=1
-                    if ((re.search(rf'\b{ExtraStr}\b', line) and not DoUseMarker) or
-                        (re.search(rf'\b{ExtraStr}\^(?=\W)', line, re.IGNORECASE) and DoUseMarker)):
-                        lines[iLine] = line[1:]
-                        IsChanged_I[icom] = True
-                elif not DoUseMarker:
-                    # DoUseMarker = 0 and ExtraStr = None
-                    lines[iLine] = line[1:]
-                    IsChanged_I[icom] = True
-                else:
-                    # DoUseMarker = 1 and ExtraStr = None
-                    if '^' in line:
-                        lines[iLine] = line[1:]
-                        IsChanged_I[icom] = True
-    
-    if False in IsChanged_I:
-        print('--------------------------------------------------------')
-        print("command_I   =", command_I)
-        print("IsChanged_I =", IsChanged_I)
-        sys.exit("Some commands are not removed!!!")
-
-    with open(filenameOut, 'w') as file_output:
-        for line in lines:
-            file_output.write(line)
+    param = ParamFile(filenameIn)
+    param.remove_commands(StrCommands, DoUseMarker=DoUseMarker)
+    param.write(filenameOut)
 
 # -----------------------------------------------------------------------------
 def replace_commands(DictParam, filenameIn='PARAM.in',
@@ -315,92 +794,13 @@ def replace_commands(DictParam, filenameIn='PARAM.in',
          which will add one criteria.
     """
 
-    # report error if DictParam is not a dict
-    if not isinstance(DictParam,dict):
-        raise TypeError('DictParam is not a dict, DictParam=', DictParam)
-
-    # return if is an empty dict
-    if not DictParam:
+    # return if there is nothing to do
+    if is_empty_dict(DictParam):
         return
 
-    IsChanged_I = [False for i in range(len(DictParam.keys()))]
-
-    with open(filenameIn, 'rt') as params:
-        lines = list(params)
-
-    # loop through all the keys
-    for icom, NameCommand in enumerate(DictParam.keys()):
-        # check whether extra string is provided with () for the command to be replaced
-        if '(' and ')' in NameCommand:
-            commandLocal = NameCommand.split('(')[0]
-            ExtraStr     = NameCommand.split('(')[1].split(')')[0]
-        else:
-            commandLocal = NameCommand
-            ExtraStr     = None
-
-        # loop through all lines
-        for iLine, line in enumerate(lines):
-            # well the line may contain the command name + ExtraStr
-            commands_line = line.split()
-
-            # skip empty line
-            if len(commands_line) == 0:
-                continue
-
-            # obtain the parameter list for the command to be replaced
-            strParam_I = DictParam[NameCommand].split(',')
-
-            if commandLocal == commands_line[0][1:] and commands_line[0][0] == '#':
-                # determine the length of the block of the command
-                len_comm_orig = 0
-                # the parameter starts at iLine+1
-                while lines[iLine+1+len_comm_orig].strip() != '':
-                    len_comm_orig = len_comm_orig+1
-                    if iLine+1+len_comm_orig == len(lines):
-                        break
-
-                # create the new list of the command needs to be replaced
-                lines_command = []
-                for iParam,param_local in enumerate(strParam_I):
-                    if len(strParam_I) == len_comm_orig:
-                        # use the same comment if the size of the command does not change
-                        # split the original line parame, the parameter starts at iLine+1
-                        line_split = lines[iLine+1+iParam].split()
-                        line_new   = param_local +'\t\t\t' \
-                            + ' '.join(line_split[len(param_local.split()):])+'\n'
-                    else:
-                        # if the size changes, then no comment for the parameters...
-                        line_new   = param_local + '\n'
-                    lines_command.append(line_new)
-
-                if ExtraStr != None:
-                    # if ExtraStr is provided, replace the command if the
-                    # line contains:
-                    # 1. the ExtraStr if not DoUseMarker
-                    # 2. '^' follows by ExtraStr if DoUseMarker=1
-                    if ((re.search(rf'\b{ExtraStr}\b', line) and not DoUseMarker) or
-                        (re.search(rf'\b{ExtraStr}\^(?=\W)', line, re.IGNORECASE) and DoUseMarker)):
-                        lines[iLine+1:iLine+1+len_comm_orig] = lines_command
-                        IsChanged_I[icom] = True
-                elif not DoUseMarker:
-                    # DoUseMarker = 0 and ExtraStr = None
-                    lines[iLine+1:iLine+1+len_comm_orig] = lines_command
-                    IsChanged_I[icom] = True
-                else:
-                    # DoUseMarker = 1 and ExtraStr = None
-                    if '^' in line:
-                        lines[iLine+1:iLine+1+len_comm_orig] = lines_command
-                        IsChanged_I[icom] = True
-
-    if False in IsChanged_I:
-        print('--------------------------------------------------------')
-        print("DictParam.keys =", DictParam.keys())
-        print("IsChanged_I    =", IsChanged_I)
-        sys.exit("Some commands are not replaced!!!")
-
-    with open(filenameOut, 'w') as file_output:
-        for line in lines:
-            file_output.write(line)
+    param = ParamFile(filenameIn)
+    param.replace_commands(DictParam, DoUseMarker=DoUseMarker)
+    param.write(filenameOut)
 
 # -----------------------------------------------------------------------------
 def change_param_value(DictParam, filenameIn='PARAM.in',
@@ -462,47 +862,10 @@ def change_param_value(DictParam, filenameIn='PARAM.in',
          change_param_value(DictChange, DoUseMarker=1)
     """
 
-    # report error if DictParam is not a dict
-    if not isinstance(DictParam,dict):
-        raise TypeError('DictParam is not a dict, DictParam=', DictParam)
-
-    # return if is an empty dict
-    if not DictParam:
+    # return if there is nothing to do
+    if is_empty_dict(DictParam):
         return
 
-    IsChanged_I = [False for i in range(len(DictParam.keys()))]
-
-    with open(filenameIn, 'rt') as params:
-        lines = list(params)
-
-    # loop through all lines
-    for iLine, line in enumerate(lines):
-        # loop through all keys
-        for ikey, key in enumerate(DictParam.keys()):
-            # change the value if:
-            # 1. the name of the parameter is in the line if 
-            #    DoUseMarker = 0
-            # 2. '^' follows by the name of the parameter if 
-            #    DoUseMarker = 1
-            if ((re.search(rf'\b{key}\b', line) and not DoUseMarker) or 
-                (re.search(rf'\b{key}\^(?=\W)', line, re.IGNORECASE) and DoUseMarker)):
-                value = DictParam[key]
-                if isinstance(value, str):
-                    lines[iLine] = value+'\t\t\t'+key+'\n'
-                    IsChanged_I[ikey] = True
-                else:
-                    try:
-                        lines[iLine] = str(value)+'\t\t\t'+key+'\n'
-                        IsChanged_I[ikey] = True
-                    except Exception as error:
-                        raise TypeError(error, "Value cannot convert to a string.")
-
-    if False in IsChanged_I:
-        print('--------------------------------------------------------')
-        print("DictParam.keys =", DictParam.keys())
-        print("IsChanged_I    =", IsChanged_I)
-        sys.exit("Some params are not changed!!!")
-
-    with open(filenameOut, 'w') as file_output:
-        for line in lines:
-            file_output.write(line)
+    param = ParamFile(filenameIn)
+    param.change_param_value(DictParam, DoUseMarker=DoUseMarker)
+    param.write(filenameOut)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+import argparse
+import functools
+import glob
+import os
+import re
+import sys
+import change_param
+
+# -----------------------------------------------------------------------------
+def get_value_type(value):
+    """
+    Return the type of the parameter value: 'logical', 'number' or 'string'.
+    """
+
+    if value.lower() in ['t', 'f', '.true.', '.false.']:
+        return 'logical'
+
+    try:
+        float(value.lower().replace('d','e'))
+        return 'number'
+    except ValueError:
+        return 'string'
+
+# -----------------------------------------------------------------------------
+def is_command_line(lines, iLine):
+    """
+    Return the name of the command (without '#') if the line at iLine is an
+    active (#NAME) or inactive (NAME) command in a template, otherwise ''.
+    An inactive command is an upper case word starting a block.
+    """
+
+    word = change_param.get_first_word(lines[iLine])
+
+    if len(word) > 1 and word[0] == '#':
+        return word[1:]
+
+    if (re.match(r'[A-Z][A-Z0-9_]{2,}$', word) and
+        (iLine == 0 or lines[iLine-1].strip() == '')):
+        return word
+
+    return ''
+
+# -----------------------------------------------------------------------------
+def get_command_table(filenames):
+    """
+    Return a dict with the name of the command (without '#') as the key
+    and a dict describing the command in the templates filenames as the
+    value:
+      'lengths':  the set of the numbers of parameters
+      'comps':    the set of the components ('CON' for the commands outside
+                  of #BEGIN_COMP/#END_COMP)
+      'types':    a dict with the number of parameters as the key and a list
+                  of the type of each parameter ('logical', 'number' or None
+                  if it varies) as the value
+      'variable': True if the number of parameters is set by the first
+                  parameter, e.g., nRefineCrit in #AMRCRITERIARESOLUTION
+    Both the active and inactive commands in the templates are used. The
+    table is cached by the path, modification time and size of the
+    templates.
+    """
+
+    key = []
+    for filename in sorted(filenames):
+        stat = os.stat(filename)
+        key.append((os.path.realpath(filename), stat.st_mtime_ns, stat.st_size))
+
+    return _get_command_table(tuple(key))
+
+# -----------------------------------------------------------------------------
+@functools.lru_cache(maxsize=16)
+def _get_command_table(key):
+    """
+    Return the table of get_command_table for the templates in key.
+    """
+
+    table = {}
+
+    for filename, _, _ in key:
+        param = change_param.load_template(filename)
+        lines = param.lines
+        comp  = 'CON'
+
+        for iLine in range(len(lines)-1):
+            NameCommand = is_command_line(lines, iLine)
+            if not NameCommand:
+                continue
+
+            if NameCommand == 'BEGIN_COMP':
+                comp = lines[iLine].split()[1]
+                continue
+            if NameCommand == 'END_COMP':
+                comp = 'CON'
+                continue
+
+            nParam = param.get_block_length(iLine)
+            lines_param = lines[iLine+1:iLine+1+nParam]
+            types = [get_value_type(change_param.get_param_value(line))
+                     for line in lines_param]
+
+            entry = table.setdefault(NameCommand, {'lengths': set(),
+                                                   'comps': set(),
+                                                   'types': {},
+                                                   'variable': False})
+            entry['lengths'].add(nParam)
+            entry['comps'].add(comp)
+
+            # e.g., 3    nRefineCrit
+            if (nParam > 0 and types[0] == 'number' and
+                re.match(r'n[A-Z]', ' '.join(lines_param[0].split()[1:2]))):
+                entry['variable'] = True
+
+            if nParam not in entry['types']:
+                entry['types'][nParam] = types
+            else:
+                entry['types'][nParam] = [
+                    typeOld if typeOld == typeNew else None
+                    for typeOld, typeNew in zip(entry['types'][nParam], types)]
+
+    # only the logicals and numbers are checked
+    for entry in table.values():
+        for nParam, types in entry['types'].items():
+            entry['types'][nParam] = [typeParam if typeParam != 'string' else None
+                                      for typeParam in types]
+
+    return table
+
+# -----------------------------------------------------------------------------
+def check_param(param, table):
+    """
+    Check the structure of param, a change_param.ParamFile, against the
+    table of the commands in the templates (see get_command_table). Only the
+    active commands before #END are checked. Return a list of errors and a
+    list of warnings (strings).
+
+    It is an error if:
+      1. #BEGIN_COMP/#END_COMP do not match or #RUN is inside a component
+      2. a command is in a component where it is not found in the templates
+      3. the number of parameters of a command is not found in the templates,
+         unless the number is set by the first parameter (a warning then)
+      4. a logical or a number is expected but not found
+    It is a warning if the command is not found in the templates, or if
+    replace_commands changed the number of parameters of a command.
+    """
+
+    errors   = []
+    warnings = []
+
+    lines = param.lines
+    comp  = 'CON'
+
+    for iLine, line in enumerate(lines):
+        word = change_param.get_first_word(line)
+        if len(word) < 2 or word[0] != '#':
+            continue
+
+        NameCommand = word[1:]
+        strLine = param.filename+':'+str(iLine+1)+': #'+NameCommand
+
+        if NameCommand == 'END':
+            break
+        elif NameCommand == 'BEGIN_COMP':
+            if comp != 'CON':
+                errors.append(strLine+' inside component '+comp)
+            comp = line.split()[1] if len(line.split()) > 1 else ''
+            continue
+        elif NameCommand == 'END_COMP':
+            compEnd = line.split()[1] if len(line.split()) > 1 else ''
+            if compEnd != comp:
+                errors.append(strLine+' '+compEnd+' does not match #BEGIN_COMP '
+                              +comp)
+            comp = 'CON'
+            continue
+        elif NameCommand == 'RUN' and comp != 'CON':
+            errors.append(strLine+' inside component '+comp)
+            continue
+
+        if NameCommand not in table:
+            warnings.append(strLine+' is not found in the templates')
+            continue
+
+        entry  = table[NameCommand]
+        nParam = param.get_block_length(iLine) if iLine+1 < len(lines) else 0
+
+        if comp not in entry['comps']:
+            errors.append(strLine+' is in '+comp+' but only in '
+                          +','.join(sorted(entry['comps']))+' in the templates')
+
+        if nParam not in entry['lengths']:
+            strError = (strLine+' has '+str(nParam)+' parameters instead of '
+                        +','.join(str(n) for n in sorted(entry['lengths'])))
+            if entry['variable']:
+                warnings.append(strError)
+            else:
+                errors.append(strError)
+            continue
+
+        for iParam, typeParam in enumerate(entry['types'][nParam]):
+            value = change_param.get_param_value(lines[iLine+1+iParam])
+            if typeParam is not None and get_value_type(value) != typeParam:
+                errors.append(strLine+' parameter '+str(iParam+1)+' = '+value
+                              +' is not a '+typeParam)
+
+    if comp != 'CON':
+        errors.append(param.filename+': #END_COMP '+comp+' is missing')
+
+    for NameCommand, nOld, nNew in param.blocks_resized:
+        warnings.append(param.filename+': replace_commands changed the number '
+                        +'of parameters of #'+NameCommand+' from '+str(nOld)
+                        +' to '+str(nNew))
+
+    return errors, warnings
+
+# -----------------------------------------------------------------------------
+def check_param_files(param_files, pfss, dirParam='Param'):
+    """
+    Check PARAM.in and HARMONICS.in/FDIPS.in in the dict param_files (see
+    change_awsom_param.render_param_files) against the templates in
+    dirParam. Print the errors and warnings and return True if there is
+    no error.
+    """
+
+    filenames_template = {'PARAM.in': glob.glob(os.path.join(dirParam, 'PARAM.in*')),
+                          pfss+'.in': [os.path.join(dirParam, pfss+'.in')]}
+
+    errors_all = []
+    for filename in filenames_template:
+        if filename not in param_files:
+            continue
+        table = get_command_table(filenames_template[filename])
+        errors, warnings = check_param(param_files[filename], table)
+        for warning in warnings:
+            print('WARNING: '+warning)
+        for error in errors:
+            print('ERROR: '+error)
+        errors_all.extend(errors)
+
+    return len(errors_all) == 0
+
+# =============================================================================
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Script to check the structure of PARAM.in, '
+                        + 'HARMONICS.in or FDIPS.in files against the '
+                        + 'templates.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('filenames', nargs='+',
+                            help='The files to be checked.')
+    ARG_PARSER.add_argument('-t', '--templates',
+                            help='A string for the pattern of the templates, '
+                            + '(default: Param/PARAM.in*)',
+                            type=str, default='Param/PARAM.in*')
+    ARGS = ARG_PARSER.parse_args()
+
+    table = get_command_table(glob.glob(ARGS.templates))
+
+    nError = 0
+    for filename in ARGS.filenames:
+        errors, warnings = check_param(change_param.ParamFile(filename), table)
+        for warning in warnings:
+            print('WARNING: '+warning)
+        for error in errors:
+            print('ERROR: '+error)
+        nError += len(errors)
+
+    if nError > 0:
+        sys.exit(str(nError)+' errors are found.')
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+import artifact_store
+
+# the executables saved for each configuration, SWMF.exe is bin/MODEL.exe
+NAMES_EXE = ['SWMF.exe', 'PostIDL.exe', 'HARMONICS.exe', 'FDIPS.exe']
+
+# the options of Config.pl used since the SWMF is installed, one line for
+# each 'make compile', written by the compile target in the Makefile
+NAMEFILE_OPTIONS = '.config_options'
+
+# -----------------------------------------------------------------------------
+def get_options(MODEL):
+    """
+    Return the list of the options of Config.pl used by 'make compile' to
+    configure the SWMF for MODEL after it is installed.
+    """
+
+    strOptions = subprocess.check_output(
+        'make -s config_options MODEL='+MODEL, shell=True, text=True)
+
+    return strOptions.split()
+
+# -----------------------------------------------------------------------------
+def get_config(options):
+    """
+    Return the configuration set by the options of Config.pl, in the order
+    they are used, as a tuple that does not depend on how the options are
+    split or ordered: the version of each component (-v=) and the value of
+    each option of each component (-o=).
+    """
+
+    versions = {}
+    settings = {}
+
+    for option in options:
+        if option.startswith('-v='):
+            for version in option[3:].split(','):
+                if version == 'Empty':
+                    versions = {'*': 'Empty'}
+                else:
+                    comp = version.split('/')[0]
+                    versions[comp] = version
+        elif option.startswith('-o='):
+            comp, strSettings = option[3:].split(':', 1)
+            # e.g., u=Awsom,e=AwsomAnisoPi,nG=3,g=6,8,8
+            for name, value in re.findall(r'(\w+)=(.*?)(?=,\w+=|$)', strSettings):
+                settings[(comp, name)] = value
+        else:
+            settings[('', option)] = ''
+
+    return (tuple(sorted(versions.items())), tuple(sorted(settings.items())))
+
+# -----------------------------------------------------------------------------
+def get_revision(dirSWMF='SWMF'):
+    """
+    Return a list with the revision (HEAD) and the SHA-256 of the
+    uncommitted changes of each git repository in dirSWMF (up to 3 levels
+    deep, e.g., GM/BATSRUS). Return None if there is no git repository.
+    """
+
+    dirSWMF  = os.path.realpath(dirSWMF)
+    revision = []
+
+    for dirCurrent, dirnames, filenames in os.walk(dirSWMF):
+        dirRelative = os.path.relpath(dirCurrent, dirSWMF)
+        IsRepository = '.git' in dirnames + filenames
+        if dirRelative.count(os.sep) >= 2 and dirRelative != '.':
+            dirnames[:] = []
+        else:
+            dirnames[:] = [name for name in dirnames if name != '.git']
+        if not IsRepository:
+            continue
+
+        try:
+            strHead = subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], cwd=dirCurrent, text=True,
+                stderr=subprocess.DEVNULL).strip()
+            strDiff = subprocess.check_output(
+                ['git', 'diff', 'HEAD'], cwd=dirCurrent,
+                stderr=subprocess.DEVNULL)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+        revision.append((dirRelative, strHead,
+                         hashlib.sha256(strDiff).hexdigest()))
+
+    if not revision:
+        return None
+
+    return sorted(revision)
+
+# -----------------------------------------------------------------------------
+def get_fingerprint(options, dirSWMF='SWMF'):
+    """
+    Return the fingerprint (SHA-256) of the executables compiled with the
+    options of Config.pl (see get_config), the revision of the SWMF (see
+    get_revision) and its Makefile.def. Return None if the revision is not
+    known, in which case the executables are not cached.
+    """
+
+    revision = get_revision(dirSWMF)
+    if revision is None:
+        return None
+
+    filenameDef = os.path.join(dirSWMF, 'Makefile.def')
+    hashDef = (artifact_store.get_file_hash(filenameDef)
+               if os.path.isfile(filenameDef) else '')
+
+    return hashlib.sha256(repr(
+        (get_config(options), revision, hashDef)).encode()).hexdigest()
+
+# -----------------------------------------------------------------------------
+def get_dir_cache(fingerprint, dirStore=artifact_store.DIRSTORE):
+    """
+    Return the dir with the executables of fingerprint in the store. The
+    executables are hard links to the blobs, so that they are not removed
+    by artifact_store.gc.
+    """
+
+    return os.path.join(dirStore, 'compile', fingerprint)
+
+# -----------------------------------------------------------------------------
+def restore(MODEL, dirSWMF='SWMF', dirStore=artifact_store.DIRSTORE):
+    """
+    Copy the executables compiled for MODEL with the current SWMF source
+    from the cache to dirSWMF/bin (SWMF.exe is copied to MODEL.exe). Return
+    True if they are found in the cache.
+    """
+
+    fingerprint = get_fingerprint(get_options(MODEL), dirSWMF)
+    if fingerprint is None:
+        return False
+
+    dirCache = get_dir_cache(fingerprint, dirStore)
+    if not os.path.isfile(os.path.join(dirCache, 'SWMF.exe')):
+        return False
+
+    for nameExe in NAMES_EXE:
+        filenameCache = os.path.join(dirCache, nameExe)
+        if not os.path.isfile(filenameCache):
+            continue
+        filenameOut = os.path.join(dirSWMF, 'bin',
+                                   MODEL+'.exe' if nameExe == 'SWMF.exe' else nameExe)
+        # the executable in bin is a copy, the compilation may change it
+        if os.path.lexists(filenameOut):
+            os.remove(filenameOut)
+        shutil.copy(filenameCache, filenameOut)
+        os.chmod(filenameOut, 0o755)
+
+    return True
+
+# -----------------------------------------------------------------------------
+def save(MODEL, dirSWMF='SWMF', dirStore=artifact_store.DIRSTORE):
+    """
+    Save the executables in dirSWMF/bin compiled for MODEL into the cache
+    with the fingerprint of the options of Config.pl used since the SWMF
+    is installed. Return the fingerprint or None if it is not saved.
+    """
+
+    filenameOptions = os.path.join(dirSWMF, NAMEFILE_OPTIONS)
+    if not os.path.isfile(filenameOptions):
+        return None
+
+    with open(filenameOptions, 'r') as file_options:
+        options = file_options.read().split()
+
+    fingerprint = get_fingerprint(options, dirSWMF)
+    if fingerprint is None:
+        return None
+
+    dirCache = get_dir_cache(fingerprint, dirStore)
+    os.makedirs(dirCache, exist_ok=True)
+
+    for nameExe in NAMES_EXE:
+        filenameIn = os.path.join(dirSWMF, 'bin',
+                                  MODEL+'.exe' if nameExe == 'SWMF.exe' else nameExe)
+        if os.path.isfile(filenameIn):
+            artifact_store.link_file(filenameIn, os.path.join(dirCache, nameExe),
+                                     dirStore)
+
+    return fingerprint
+
+# =============================================================================
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Script to save the executables compiled for a model '
+                        + 'into the cache or copy them from the cache. It '
+                        + 'needs to be run in the SWMFSOLAR dir.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('command', choices=['restore', 'save', 'fingerprint'],
+                            help='restore: copy the executables from the cache '
+                            + '(exit with 1 if not found); save: save the '
+                            + 'executables into the cache; fingerprint: print '
+                            + 'the fingerprint of the model.')
+    ARG_PARSER.add_argument('model',
+                            help='The model, e.g., AWSoM.')
+    ARG_PARSER.add_argument('--swmf',
+                            help='(default: SWMF) The SWMF dir.',
+                            type=str, default='SWMF')
+    ARGS = ARG_PARSER.parse_args()
+
+    if ARGS.command == 'restore':
+        if not restore(ARGS.model, ARGS.swmf):
+            sys.exit(1)
+    elif ARGS.command == 'save':
+        fingerprint = save(ARGS.model, ARGS.swmf)
+        if fingerprint is None:
+            print('The executables of '+ARGS.model+' are not saved into '
+                  + 'the cache: the SWMF revision or the options of '
+                  + 'Config.pl are not known.')
+        else:
+            print('Saved the executables of '+ARGS.model+' into the cache '
+                  + fingerprint)
+    else:
+        print(get_fingerprint(get_options(ARGS.model), ARGS.swmf))
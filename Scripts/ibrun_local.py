@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime as dt
+import fcntl
+import os
+import subprocess
+import sys
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Local stand-in for ibrun to test the job scripts '
+                        + 'and pilot_dispatcher.py without a cluster: the '
+                        + 'command is run once in a local process with '
+                        + 'IBRUN_OFFSET and IBRUN_NTASKS set. The offset, '
+                        + 'the number of tasks and the start and end time '
+                        + 'are appended to the file IBRUN_LOCAL_LOG if set.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('-o', '--offset',
+                            help='(default: 0) The first task.',
+                            type=int, default=0)
+    ARG_PARSER.add_argument('-n', '--ntasks',
+                            help='(default: 1) The number of tasks.',
+                            type=int, default=1)
+    ARG_PARSER.add_argument('command', nargs=argparse.REMAINDER,
+                            help='The command and its arguments.')
+    ARGS = ARG_PARSER.parse_args()
+
+    if not ARGS.command:
+        sys.exit('No command is given.')
+
+    # ibrun runs the executable in the current dir, e.g., SWMF.exe
+    command = ARGS.command
+    if os.sep not in command[0] and os.path.isfile(command[0]):
+        command = ['./'+command[0]] + command[1:]
+
+    env = dict(os.environ, IBRUN_OFFSET=str(ARGS.offset),
+               IBRUN_NTASKS=str(ARGS.ntasks))
+
+    tStart = dt.datetime.now().isoformat(timespec='milliseconds')
+    status = subprocess.call(command, env=env)
+    tEnd   = dt.datetime.now().isoformat(timespec='milliseconds')
+
+    if os.environ.get('IBRUN_LOCAL_LOG'):
+        with open(os.environ['IBRUN_LOCAL_LOG'], 'a') as file_log:
+            fcntl.flock(file_log, fcntl.LOCK_EX)
+            file_log.write(' '.join([str(ARGS.offset), str(ARGS.ntasks), tStart,
+                                     tEnd, os.getcwd(), str(status)])+'\n')
+
+    sys.exit(status)
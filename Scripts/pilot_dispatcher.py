@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime as dt
+import fcntl
+import os
+import subprocess
+import sys
+import time
+
+# the number of tasks per node
+NTASKPERNODE = 56
+
+# the command to run in each run dir: PostProc.pl on the first node and
+# SWMF.exe on the other nodes of the slice, as in the static bundle jobs
+STRCOMMAND = ('echo {nodes} > nodes.txt; '
+              + '{launcher} -o {offset} -n 1 ./PostProc.pl -r=180 -n=1 >& PostProc.log & '
+              + '{launcher} -o {offsetSWMF} -n {nTask} SWMF.exe > runlog_`date +%y%m%d%H%M`; '
+              + 'status=$?; touch PostProc.STOP; wait; exit $status')
+
+# the hours between the start of the job and the start of the dispatcher,
+# within which a run as long as the job is still launched
+GRACEHOURS = 0.25
+
+# -----------------------------------------------------------------------------
+def write_queue(filenameQueue, runs):
+    """
+    Append the runs (dicts with the dir, the number of nodes and the
+    expected wall time in hours) to the queue, one run per line:
+    'dir nodes hours'.
+    """
+
+    with open(filenameQueue, 'a') as file_queue:
+        fcntl.flock(file_queue, fcntl.LOCK_EX)
+        for run in runs:
+            file_queue.write(run['dir']+' '+str(run['nodes'])+' '
+                             +'{:.4f}'.format(run['hours'])+'\n')
+
+# -----------------------------------------------------------------------------
+def claim_run(filenameQueue, nodesFree, hoursLeft):
+    """
+    Remove the first run in the queue with at most nodesFree nodes and at
+    most hoursLeft hours from the queue and return it (a dict with the dir,
+    the number of nodes and the hours), or None if there is no such run.
+    The queue is locked, so that it can be shared by several dispatchers
+    (e.g., in different jobs).
+    """
+
+    if not os.path.isfile(filenameQueue):
+        return None
+
+    with open(filenameQueue, 'r+') as file_queue:
+        fcntl.flock(file_queue, fcntl.LOCK_EX)
+        lines = file_queue.readlines()
+
+        for iLine, line in enumerate(lines):
+            values = line.split()
+            if len(values) < 3:
+                continue
+            run = {'dir': values[0], 'nodes': int(values[1]),
+                   'hours': float(values[2])}
+            if run['nodes'] <= nodesFree and run['hours'] <= hoursLeft:
+                file_queue.seek(0)
+                file_queue.writelines(lines[:iLine] + lines[iLine+1:])
+                file_queue.truncate()
+                return run
+
+    return None
+
+# -----------------------------------------------------------------------------
+def get_queue_size(filenameQueue):
+    """
+    Return the number of the runs in the queue.
+    """
+
+    if not os.path.isfile(filenameQueue):
+        return 0
+
+    with open(filenameQueue, 'r') as file_queue:
+        fcntl.flock(file_queue, fcntl.LOCK_SH)
+        return sum(1 for line in file_queue if len(line.split()) >= 3)
+
+# -----------------------------------------------------------------------------
+def get_job_end(hours):
+    """
+    Return the end time (seconds since the epoch) of the job: the end of
+    the allocation given by SLURM (SLURM_JOB_END_TIME) if set, or hours
+    after the start time of the job (SLURM_JOB_START_TIME) or of the
+    dispatcher.
+    """
+
+    if os.environ.get('SLURM_JOB_END_TIME'):
+        return float(os.environ['SLURM_JOB_END_TIME'])
+
+    return float(os.environ.get('SLURM_JOB_START_TIME', time.time())) + hours*3600
+
+# -----------------------------------------------------------------------------
+def write_log(filenameQueue, *values):
+    """
+    Append a line with the time and the values to the log of the queue
+    (filenameQueue.log).
+    """
+
+    with open(filenameQueue+'.log', 'a') as file_log:
+        file_log.write(' '.join([dt.datetime.now().isoformat(timespec='seconds')]
+                                + [str(value) for value in values])+'\n')
+
+# -----------------------------------------------------------------------------
+def find_free_nodes(nodes_busy, nNode):
+    """
+    Return the first node of nNode contiguous free nodes in nodes_busy (a
+    list of bool), or None if not found.
+    """
+
+    nFree = 0
+    for iNode, IsBusy in enumerate(nodes_busy):
+        nFree = 0 if IsBusy else nFree + 1
+        if nFree == nNode:
+            return iNode - nNode + 1
+
+    return None
+
+# -----------------------------------------------------------------------------
+def get_max_free_nodes(nodes_busy):
+    """
+    Return the largest number of contiguous free nodes in nodes_busy.
+    """
+
+    nFree    = 0
+    nFreeMax = 0
+    for IsBusy in nodes_busy:
+        nFree    = 0 if IsBusy else nFree + 1
+        nFreeMax = max(nFreeMax, nFree)
+
+    return nFreeMax
+
+# -----------------------------------------------------------------------------
+def run_dispatcher(filenameQueue, nNode, hours=48.0, launcher='ibrun',
+                   secondsPoll=10.0, hoursGrace=GRACEHOURS):
+    """
+    Run the runs in the queue (see write_queue) on the nNode nodes of the
+    job until the queue is empty: a run is launched with launcher (ibrun or
+    a stand-in, see ibrun_local.py) on a free slice of nodes as soon as
+    the slice is freed by the runs done before. Only the runs expected to
+    finish before the end of the job (see get_job_end) are launched, with a
+    tolerance of hoursGrace for the start of the job, so that a run as long
+    as the job is launched. The start and the end of each run are written
+    into the log of the queue (see write_log). Return the number of the
+    runs failed and the number of the runs left in the queue.
+
+    Arguments:
+      filenameQueue: the queue, which can be shared by several dispatchers
+      nNode:         the number of nodes of the job
+      hours:         the wall time of the job in hours
+      launcher:      the command to launch a program on a slice of nodes,
+                     with the options -o offset -n tasks as ibrun
+      secondsPoll:   the time between two checks of the runs
+      hoursGrace:    the tolerance of the wall time of the runs in hours
+    """
+
+    tEnd       = get_job_end(hours)
+    nodes_busy = [False]*nNode
+    processes  = []
+    nFailed    = 0
+
+    while True:
+        # launch the runs fitting into the free nodes
+        while True:
+            hoursLeft = (tEnd - time.time())/3600 + hoursGrace
+            run = claim_run(filenameQueue, get_max_free_nodes(nodes_busy),
+                            hoursLeft)
+            if run is None:
+                break
+            iNode = find_free_nodes(nodes_busy, run['nodes'])
+            nodes_busy[iNode:iNode+run['nodes']] = [True]*run['nodes']
+            strCommand = STRCOMMAND.format(
+                nodes=run['nodes'], launcher=launcher, offset=iNode*NTASKPERNODE,
+                offsetSWMF=(iNode+1)*NTASKPERNODE,
+                nTask=(run['nodes']-1)*NTASKPERNODE)
+            print('launching '+run['dir']+' on nodes '+str(iNode)+'-'
+                  +str(iNode+run['nodes']-1))
+            write_log(filenameQueue, 'start', run['dir'], run['nodes'],
+                      iNode)
+            process = subprocess.Popen(strCommand, shell=True, cwd=run['dir'],
+                                       executable='/bin/bash')
+            processes.append((process, run, iNode, time.time()))
+
+        if not processes:
+            break
+
+        time.sleep(secondsPoll)
+
+        # free the nodes of the runs done
+        for process, run, iNode, tRun in list(processes):
+            status = process.poll()
+            if status is None:
+                continue
+            processes.remove((process, run, iNode, tRun))
+            nodes_busy[iNode:iNode+run['nodes']] = [False]*run['nodes']
+            if status != 0:
+                nFailed += 1
+            print(run['dir']+(' is done' if status == 0 else ' failed'))
+            write_log(filenameQueue, 'done' if status == 0 else 'failed',
+                      run['dir'], run['nodes'], iNode,
+                      '{:.1f}'.format(time.time()-tRun))
+
+    return nFailed, get_queue_size(filenameQueue)
+
+# -----------------------------------------------------------------------------
+def requeue(filenameQueue):
+    """
+    Put the runs started but not finished (e.g., the job is killed) in the
+    log of the queue back into the queue. Return the number of the runs.
+    """
+
+    runs = {}
+    if os.path.isfile(filenameQueue+'.log'):
+        with open(filenameQueue+'.log', 'r') as file_log:
+            for line in file_log:
+                values = line.split()
+                if len(values) < 3:
+                    continue
+                if values[1] == 'start':
+                    runs[values[2]] = int(values[3])
+                else:
+                    runs.pop(values[2], None)
+
+    # the expected wall time is not known any more
+    write_queue(filenameQueue, [{'dir': dirRun, 'nodes': nNode, 'hours': 0.0}
+                                for dirRun, nNode in runs.items()])
+    for dirRun in runs:
+        write_log(filenameQueue, 'requeue', dirRun)
+
+    return len(runs)
+
+# =============================================================================
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Script to run the run dirs in a queue file on the '
+                        + 'nodes of a job (pilot job): each run is launched '
+                        + 'as soon as enough nodes are free. It needs to be '
+                        + 'run in the SWMFSOLAR dir.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('command', choices=['run', 'requeue'],
+                            help='run: run the queue on the nodes; requeue: '
+                            + 'put the runs started but not finished back '
+                            + 'into the queue.')
+    ARG_PARSER.add_argument('queue',
+                            help='The queue file with \'dir nodes hours\' '
+                            + 'in each line, e.g., queue.bundle')
+    ARG_PARSER.add_argument('-N', '--nodes',
+                            help='(default: SLURM_NNODES) The number of '
+                            + 'nodes of the job.',
+                            type=int, default=int(os.environ.get('SLURM_NNODES', 1)))
+    ARG_PARSER.add_argument('-t', '--hours',
+                            help='(default: 48) The wall time of the job in '
+                            + 'hours, not used if SLURM_JOB_END_TIME is set.',
+                            type=float, default=48.0)
+    ARG_PARSER.add_argument('--grace',
+                            help='(default: '+str(GRACEHOURS)+') The hours '
+                            + 'added to the time left of the job for the '
+                            + 'runs to launch.',
+                            type=float, default=GRACEHOURS)
+    ARG_PARSER.add_argument('--launcher',
+                            help='(default: ibrun) The command to launch a '
+                            + 'program on a slice of nodes, e.g., '
+                            + '"python3 $PWD/Scripts/ibrun_local.py" for testing.',
+                            type=str, default='ibrun')
+    ARG_PARSER.add_argument('--poll',
+                            help='(default: 10) The seconds between two '
+                            + 'checks of the runs.',
+                            type=float, default=10.0)
+    ARGS = ARG_PARSER.parse_args()
+
+    if ARGS.command == 'requeue':
+        print('Put '+str(requeue(ARGS.queue))+' runs back into '+ARGS.queue)
+        sys.exit(0)
+
+    nFailed, nLeft = run_dispatcher(ARGS.queue, ARGS.nodes, ARGS.hours,
+                                    ARGS.launcher, ARGS.poll, ARGS.grace)
+    if nLeft:
+        print(str(nLeft)+' runs are left in '+ARGS.queue)
+    if nFailed or nLeft:
+        sys.exit(1)
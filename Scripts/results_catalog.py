@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime as dt
+import glob
+import os
+import re
+import sqlite3
+import sys
+import results_index
+
+# the catalog is in the SWMFSOLAR dir, as a file in Results would change the
+# time of Results used by results_index
+FILENAMEDB = 'results_catalog.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    name TEXT PRIMARY KEY, signature TEXT, model TEXT, map TEXT, cr INTEGER,
+    pfss TEXT, time TEXT, param TEXT, restartdir TEXT, realizations TEXT,
+    fingerprint TEXT, nrealization INTEGER, nsuccess INTEGER,
+    nfailed INTEGER, status TEXT, seconds REAL);
+CREATE TABLE IF NOT EXISTS params (
+    name TEXT, key TEXT, value TEXT, number REAL);
+CREATE TABLE IF NOT EXISTS realizations (
+    name TEXT, realization INTEGER, status TEXT, seconds REAL, nstep INTEGER,
+    message TEXT, nodes INTEGER, PRIMARY KEY (name, realization));
+CREATE INDEX IF NOT EXISTS params_key_number ON params (key, number);
+CREATE INDEX IF NOT EXISTS params_key_value ON params (key, value);
+CREATE INDEX IF NOT EXISTS params_name ON params (name);
+CREATE INDEX IF NOT EXISTS results_model_cr ON results (model, cr);
+'''
+
+# the version of the catalog (PRAGMA user_version), increased when the
+# values are computed differently, e.g., 1: the Carrington rotation of the
+# runs without CR in the map name is fixed, 2: the params of the restart
+# runs are merged along the restart chain, so that the dirs of the older
+# catalogs are all updated
+VERSION = 2
+
+# the operators of the conditions on the params, see get_condition
+OPERATORS = ['<=', '>=', '!=', '<', '>', '=']
+
+# the number of tasks per node, to get the nodes of the runs from the
+# number of processors in the runlogs, and the file with the number of
+# nodes written in the run dirs by the bundle jobs
+NTASKPERNODE  = 56
+FILENAMENODES = 'nodes.txt'
+
+# -----------------------------------------------------------------------------
+def get_number(value):
+    """
+    Return the value as a float (e.g., 6e5, 6.0d5) or None if it is not a
+    number.
+    """
+
+    try:
+        return float(value.lower().replace('d', 'e'))
+    except ValueError:
+        return None
+
+# -----------------------------------------------------------------------------
+def get_carrington_rotation(MAP, TIME='MapTime'):
+    """
+    Return the Carrington rotation of the run from the name of the map
+    (e.g., GONG_CR2154.fits), the start time TIME (e.g.,
+    2018-10-01T00:00:00) or the date of the map (the ADAPT maps, e.g.,
+    adapt41311_03k012_201810010000_i00005600n1.fts), or None if it is not
+    known.
+    """
+
+    match = re.search(r'CR(\d+)', os.path.basename(MAP), re.IGNORECASE)
+    if match:
+        return int(match.group(1))
+
+    time_run = None
+    if TIME != 'MapTime':
+        try:
+            time_run = dt.datetime.strptime(TIME, '%Y-%m-%dT%H:%M:%S')
+        except ValueError:
+            pass
+    if time_run is None:
+        match = re.search(r'_(\d{12})_', os.path.basename(MAP))
+        if match:
+            time_run = dt.datetime.strptime(match.group(1), '%Y%m%d%H%M')
+    if time_run is None:
+        return None
+
+    # the same approximation as change_awsom_param.get_map_time, where the
+    # middle of CR N is at 27.2753*(N-0.5) days after 1853-11-09
+    return int((time_run - dt.datetime(1853, 11, 9)).total_seconds()
+               / 86400 / 27.2753) + 1
+
+# -----------------------------------------------------------------------------
+def get_runlog_info(filenameRunlog):
+    """
+    Return a dict with the wall time in seconds (from the timing report of
+    the SWMF at the end of the run, or from the start time in the name
+    runlog_YYMMDDHHMM to the modification time of the file), the number
+    of steps done and the number of processors (None if not found) of the
+    runlog.
+    """
+
+    info = {'seconds': None, 'nstep': None, 'nproc': None}
+
+    with open(filenameRunlog, 'r', errors='replace') as file_runlog:
+        for line in file_runlog:
+            # e.g., nProc = 2184 or running on 2184 processors
+            if info['nproc'] is None:
+                match = re.search(r'\bnProc\s*=\s*(\d+)|(\d+)\s+(?:processors|PEs)\b',
+                                  line, re.IGNORECASE)
+                if match:
+                    info['nproc'] = int(match.group(1) or match.group(2))
+            # TIMING TREE of depth 2 from step       0 to   80000 SWMF on PE    0
+            match = re.match(r'\s*TIMING TREE.*from step\s+(\d+)\s+to\s+(\d+)', line)
+            if match:
+                info['nstep'] = int(match.group(2)) - int(match.group(1))
+            # SWMF                      1       1  32103.52 32103.523  100.00
+            match = re.match(r'\s*SWMF\s+\d+\s+\d+\s+([\d.]+)\s', line)
+            if match:
+                info['seconds'] = float(match.group(1))
+
+    if info['seconds'] is None:
+        match = re.search(r'runlog_(\d{10})$', filenameRunlog)
+        if match:
+            time_start = dt.datetime.strptime(match.group(1), '%y%m%d%H%M')
+            time_end   = dt.datetime.fromtimestamp(os.path.getmtime(filenameRunlog))
+            info['seconds'] = max((time_end - time_start).total_seconds(), 0.0)
+
+    return info
+
+# -----------------------------------------------------------------------------
+def get_failed_runs(filenameLog='error_postproc.log'):
+    """
+    Return a dict with (SIMDIR, realization) as the key and the message as
+    the value for the run dirs found crashed in the log written by the
+    check_postproc target in the Makefile.
+    """
+
+    failed = {}
+
+    if not os.path.isfile(filenameLog):
+        return failed
+
+    with open(filenameLog, 'r') as file_log:
+        for line in file_log:
+            match = re.match(r'\s*(\S+?)/?\s+(.*)$', line)
+            if not match:
+                continue
+            dirRun = os.path.normpath(match.group(1))
+            strRealization = os.path.basename(dirRun)
+            if re.match(r'run\d+$', strRealization):
+                failed[(os.path.basename(os.path.dirname(dirRun)),
+                        int(strRealization[3:]))] = match.group(2)
+
+    return failed
+
+# -----------------------------------------------------------------------------
+def get_signature(name, dirResults='Results'):
+    """
+    Return a string changed when the results of name are changed: the
+    modification time of the dir in Results and its run dirs, and of the
+    run dirs of the simulation dir with the same name (not post processed
+    yet).
+    """
+
+    mtimes = []
+    for dirRoot in [os.path.join(dirResults, name), name]:
+        if not os.path.isdir(dirRoot):
+            continue
+        mtimes.append(os.stat(dirRoot).st_mtime_ns)
+        with os.scandir(dirRoot) as dir_entries:
+            for dir_entry in dir_entries:
+                if re.match(r'run\d+$', dir_entry.name) and dir_entry.is_dir():
+                    mtimes.append(dir_entry.stat().st_mtime_ns)
+
+    return ','.join(str(mtime) for mtime in mtimes)
+
+# -----------------------------------------------------------------------------
+def get_realization_status(name, iRealization, failed, dirResults='Results'):
+    """
+    Return a dict with the status ('success', 'failed' or 'unknown'), the
+    wall time, the number of steps, the message and the number of nodes of
+    the realization of name. The realizations post processed into Results
+    succeeded, the realizations not post processed succeeded if
+    SWMF.SUCCESS is found in the simulation dir with the same name. The
+    number of nodes is read from nodes.txt written by the bundle jobs, or
+    from the number of processors in the runlog (SWMF.exe runs on all the
+    nodes but the one of PostProc.pl).
+    """
+
+    strRun     = 'run'+str(iRealization).zfill(2)
+    dirResult  = os.path.join(dirResults, name, strRun)
+    dirSim     = os.path.join(name, strRun)
+
+    status = {'status': 'unknown', 'seconds': None, 'nstep': None,
+              'message': failed.get((name, iRealization)), 'nodes': None}
+
+    if os.path.isdir(dirResult):
+        status['status'] = 'success'
+    elif os.path.isfile(os.path.join(dirSim, 'SWMF.SUCCESS')):
+        status['status'] = 'success'
+    elif (name, iRealization) in failed or os.path.isdir(os.path.join(dirResults, name)):
+        # check_postproc only moves the run dirs with SWMF.SUCCESS
+        status['status'] = 'failed'
+
+    filenames = (sorted(glob.glob(dirResult+'/runlog*'))
+                 or sorted(glob.glob(dirSim+'/runlog*')))
+    if filenames:
+        status.update(get_runlog_info(filenames[-1]))
+        if status['nproc']:
+            status['nodes'] = -(-status['nproc']//NTASKPERNODE) + 1
+
+    for dirRun in [dirResult, dirSim]:
+        filenameNodes = os.path.join(dirRun, FILENAMENODES)
+        if os.path.isfile(filenameNodes):
+            with open(filenameNodes, 'r') as file_nodes:
+                status['nodes'] = int(file_nodes.read().split()[0])
+            break
+
+    return status
+
+# -----------------------------------------------------------------------------
+def update_catalog(filenameDB=FILENAMEDB, dirResults='Results', DoUpdateAll=False):
+    """
+    Add the dirs in dirResults (see results_index) into the catalog
+    filenameDB, and update the dirs with a new signature (see get_signature)
+    or all the dirs if DoUpdateAll. The params of a restart run are merged
+    along its restart chain (see results_index.get_restart_params). The dirs
+    removed from dirResults are removed from the catalog. Return the number
+    of the dirs updated.
+    """
+
+    entries = results_index.get_index(dirResults)
+    failed  = get_failed_runs()
+
+    with sqlite3.connect(filenameDB) as connection:
+        connection.executescript(SCHEMA)
+        # the catalogs written before the nodes are recorded
+        columns = [row[1] for row in
+                   connection.execute('PRAGMA table_info(realizations)')]
+        if not 'nodes' in columns:
+            connection.execute('ALTER TABLE realizations ADD COLUMN nodes INTEGER')
+            DoUpdateAll = True
+        if connection.execute('PRAGMA user_version').fetchone()[0] < VERSION:
+            connection.execute('PRAGMA user_version = '+str(VERSION))
+            DoUpdateAll = True
+        signatures = dict(connection.execute('SELECT name, signature FROM results'))
+
+        for name in signatures:
+            if not name in entries or entries[name]['keyparams'] is None:
+                connection.execute('DELETE FROM results WHERE name = ?', (name,))
+                connection.execute('DELETE FROM params WHERE name = ?', (name,))
+                connection.execute('DELETE FROM realizations WHERE name = ?', (name,))
+
+        nUpdate = 0
+        for name in sorted(entries):
+            entry = entries[name]
+            if entry['keyparams'] is None:
+                continue
+            signature = get_signature(name, dirResults)
+            if not DoUpdateAll and signatures.get(name) == signature:
+                continue
+
+            # the params not in key_params.txt of a restart run (e.g., the
+            # map) are the ones of the runs it restarts from, the run is
+            # catalogued with its own params if the chain is not found
+            params = {}
+            if entry['restartdir']:
+                try:
+                    params = results_index.get_restart_params(
+                        entry['restartdir'], dirResults)
+                except ValueError:
+                    pass
+            for line in entry['keyparams']:
+                key, IsFound, value = line.partition('=')
+                if IsFound:
+                    params[key] = value
+
+            realizations = [int(strRealization) for strRealization in
+                            entry['realizations'].split(',') if strRealization.strip()]
+            status_I = [get_realization_status(name, iRealization, failed, dirResults)
+                        for iRealization in realizations]
+            nSuccess = sum(status['status'] == 'success' for status in status_I)
+            nFailed  = sum(status['status'] == 'failed' for status in status_I)
+            if realizations and nSuccess == len(realizations):
+                strStatus = 'success'
+            elif nSuccess:
+                strStatus = 'partial'
+            elif nFailed:
+                strStatus = 'failed'
+            else:
+                strStatus = 'unknown'
+            seconds_I = [status['seconds'] for status in status_I
+                         if status['seconds'] is not None]
+
+            MAP  = params.get('map', 'NoMap')
+            TIME = params.get('time', 'MapTime')
+            connection.execute('DELETE FROM params WHERE name = ?', (name,))
+            connection.execute('DELETE FROM realizations WHERE name = ?', (name,))
+            connection.execute(
+                'INSERT OR REPLACE INTO results VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (name, signature, params.get('model', 'AWSoM'), MAP,
+                 get_carrington_rotation(MAP, TIME), params.get('pfss', 'HARMONICS'),
+                 TIME, params.get('param', 'Default'), entry['restartdir'],
+                 entry['realizations'], entry['fingerprint'], len(realizations),
+                 nSuccess, nFailed, strStatus,
+                 max(seconds_I) if seconds_I else None))
+            connection.executemany(
+                'INSERT INTO params VALUES (?, ?, ?, ?)',
+                [(name, key, value, get_number(value))
+                 for key, value in params.items()])
+            connection.executemany(
+                'INSERT INTO realizations VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(name, iRealization, status['status'], status['seconds'],
+                  status['nstep'], status['message'], status['nodes'])
+                 for iRealization, status in zip(realizations, status_I)])
+            nUpdate += 1
+
+    connection.close()
+
+    return nUpdate
+
+# -----------------------------------------------------------------------------
+def get_condition(strCondition):
+    """
+    Return the SQL condition and the arguments for the condition on a
+    param of key_params.txt, e.g., 'PoyntingFluxPerBSi<6e5' or
+    'pfss=FDIPS'. The value is compared as a number if it is a number.
+    """
+
+    match = re.match(r'\s*([^<>=!\s]+)\s*(<=|>=|!=|<|>|=)\s*(.*?)\s*$', strCondition)
+    if not match:
+        raise ValueError(strCondition+': wrong format, should be NAME OP VALUE '
+                         + 'with OP in '+', '.join(OPERATORS)+'.')
+
+    key, strOperator, value = match.groups()
+    number = get_number(value)
+
+    if number is None:
+        return ('name IN (SELECT name FROM params WHERE key = ? AND value '
+                + strOperator + ' ?)', [key, value])
+
+    return ('name IN (SELECT name FROM params WHERE key = ? AND number '
+            + strOperator + ' ?)', [key, number])
+
+# -----------------------------------------------------------------------------
+def query(filenameDB=FILENAMEDB, MODEL=None, CR=None, status=None, conditions=()):
+    """
+    Return the list of the rows (dicts) of the results in the catalog with
+    MODEL, the Carrington rotation CR and the status (if not None), and
+    the conditions on the params (see get_condition), e.g., all the AWSoMR
+    runs with PoyntingFluxPerBSi < 6e5 for CR2154 that succeeded:
+
+      query(MODEL='AWSoMR', CR=2154, status='success',
+            conditions=['PoyntingFluxPerBSi<6e5'])
+    """
+
+    strWhere = []
+    args     = []
+    for name, value in [('model', MODEL), ('cr', CR), ('status', status)]:
+        if value is not None:
+            strWhere.append(name+' = ?')
+            args.append(value)
+    for strCondition in conditions:
+        strSQL, argsCondition = get_condition(strCondition)
+        strWhere.append(strSQL)
+        args.extend(argsCondition)
+
+    connection = sqlite3.connect(filenameDB)
+    connection.row_factory = sqlite3.Row
+    rows = connection.execute(
+        'SELECT * FROM results'
+        + (' WHERE '+' AND '.join(strWhere) if strWhere else '')
+        + ' ORDER BY name', args).fetchall()
+    connection.close()
+
+    return [dict(row) for row in rows]
+
+# =============================================================================
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Script to build a catalog (SQLite) of the runs in '
+                        + 'Results from key_params.txt and the status of '
+                        + 'the realizations, and query it. It needs to be '
+                        + 'run in the SWMFSOLAR dir.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('command', choices=['update', 'query'],
+                            help='update: add the new or changed dirs in '
+                            + 'Results into the catalog; query: update the '
+                            + 'catalog and list the runs selected.')
+    ARG_PARSER.add_argument('conditions', nargs='*',
+                            help='query: the conditions on the params, e.g., '
+                            + "'PoyntingFluxPerBSi<6e5' 'pfss=FDIPS'.")
+    ARG_PARSER.add_argument('--db',
+                            help='(default: '+FILENAMEDB+') The catalog.',
+                            type=str, default=FILENAMEDB)
+    ARG_PARSER.add_argument('--results',
+                            help='(default: Results) The dir of results.',
+                            type=str, default='Results')
+    ARG_PARSER.add_argument('-a', '--DoUpdateAll',
+                            help='(default: 0)'
+                            + 'Use if you want to update all the dirs '
+                            + 'instead of the new or changed ones.',
+                            type=int, default=0)
+    ARG_PARSER.add_argument('-m', '--model',
+                            help='(default: all) e.g., AWSoMR',
+                            type=str, default=None)
+    ARG_PARSER.add_argument('--cr',
+                            help='(default: all) The Carrington rotation.',
+                            type=int, default=None)
+    ARG_PARSER.add_argument('-s', '--status',
+                            help='(default: all) success, partial, failed '
+                            + 'or unknown.',
+                            type=str, default=None)
+    ARG_PARSER.add_argument('-k', '--keys',
+                            help='(default: none) The params printed for '
+                            + 'each run, separated by \',\'.',
+                            type=str, default='')
+    # the conditions may be given after the options
+    ARGS = ARG_PARSER.parse_intermixed_args()
+
+    nUpdate = update_catalog(ARGS.db, ARGS.results, ARGS.DoUpdateAll)
+
+    if ARGS.command == 'update':
+        print('Updated '+str(nUpdate)+' dirs of '+ARGS.results+' in '+ARGS.db)
+        sys.exit(0)
+
+    try:
+        rows = query(ARGS.db, ARGS.model, ARGS.cr, ARGS.status, ARGS.conditions)
+    except ValueError as error:
+        sys.exit(str(error))
+
+    keys = [key for key in ARGS.keys.split(',') if key.strip()]
+    # the params in the conditions are printed too
+    for strCondition in ARGS.conditions:
+        key = re.split(r'[<>=!]', strCondition, 1)[0].strip()
+        if not key in keys:
+            keys.append(key)
+
+    connection = sqlite3.connect(ARGS.db)
+    print('{:<40}{:>8}{:>6}{:>9}{:>10}'.format('name', 'model', 'CR',
+                                               'status', 'hours')
+          + ''.join('{:>20}'.format(key) for key in keys))
+    for row in rows:
+        values = dict(connection.execute(
+            'SELECT key, value FROM params WHERE name = ?', (row['name'],)))
+        print('{:<40}{:>8}{:>6}{:>9}{:>10}'.format(
+            row['name'], row['model'], str(row['cr']), row['status'],
+            '-' if row['seconds'] is None else '{:.2f}'.format(row['seconds']/3600))
+              + ''.join('{:>20}'.format(values.get(key, '-')) for key in keys))
+    connection.close()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+
+# the index of the dirs in Results saved between the runs of the scripts, in
+# the SWMFSOLAR dir as a file in Results would change the time of Results
+FILENAMECACHE = '.results_index.json'
+
+# whether the index is saved into FILENAMECACHE, e.g., sub_runs.py --plan
+# does not write any file
+DoSaveCache = True
+
+# the index of each dir of results in this process, see get_index
+_index_cache = {}
+
+# the dirs of results checked in this process, see get_index
+_dirs_checked = set()
+
+# -----------------------------------------------------------------------------
+def get_signature(dirResult):
+    """
+    Return the signature of the dir of results dirResult (a list, saved in
+    the index as JSON): the modification time of dirResult, the
+    modification time and the size of key_params.txt and the modification
+    time of each runNN dir, so that rewriting key_params.txt or moving a
+    RESTART dir into a runNN dir changes it.
+    """
+
+    signature = [os.stat(dirResult).st_mtime_ns, None]
+
+    filenameKeyparams = os.path.join(dirResult, 'key_params.txt')
+    if os.path.isfile(filenameKeyparams):
+        stat_keyparams = os.stat(filenameKeyparams)
+        signature[1] = [stat_keyparams.st_mtime_ns, stat_keyparams.st_size]
+
+    with os.scandir(dirResult) as dir_entries:
+        for dir_entry in sorted(dir_entries, key=lambda dir_entry: dir_entry.name):
+            if re.match(r'run(\d+)$', dir_entry.name) and dir_entry.is_dir():
+                signature.append([dir_entry.name, dir_entry.stat().st_mtime_ns])
+
+    return signature
+
+# -----------------------------------------------------------------------------
+def read_entry(dirResult, signature):
+    """
+    Return a dict with the info of the dir of results dirResult saved in
+    the index: the lines of key_params.txt (None if not found), the restart
+    dir, the realizations, the fingerprint and the realizations (e.g., '01')
+    with a RESTART dir. signature is the signature of dirResult (see
+    get_signature).
+    """
+
+    entry = {'signature': signature, 'keyparams': None, 'restartdir': '',
+             'realizations': '', 'fingerprint': '', 'restarts': []}
+
+    filenameKeyparams = os.path.join(dirResult, 'key_params.txt')
+    if os.path.isfile(filenameKeyparams):
+        with open(filenameKeyparams, 'r') as file_keyparams:
+            entry['keyparams'] = [line.strip() for line in file_keyparams]
+        for line in entry['keyparams']:
+            name, _, value = line.partition('=')
+            if name.lower() in ['restartdir', 'realizations', 'fingerprint']:
+                entry[name.lower()] = value
+
+    for name in sorted(os.listdir(dirResult)):
+        match = re.match(r'run(\d+)$', name)
+        if match and os.path.isdir(os.path.join(dirResult, name, 'RESTART')):
+            entry['restarts'].append(match.group(1))
+
+    return entry
+
+# -----------------------------------------------------------------------------
+def get_index(dirResults='Results', DoCheck=False):
+    """
+    Return the index of dirResults: a dict with the name of each dir in
+    dirResults as the key and the info (see read_entry) as the value.
+
+    The index is kept in this process and saved into FILENAMECACHE. The
+    dirs are checked (listed, and only the dirs with a new signature, see
+    get_signature, are read again) once in this process, then only if the
+    modification time of dirResults is changed (a dir is added, removed or
+    renamed) or DoCheck (e.g., a dir is not found in the index). The index
+    (and the restart chains, see get_restart_chain) is replaced only if a
+    dir is changed.
+    """
+
+    dirResults = os.path.abspath(dirResults)
+    if not os.path.isdir(dirResults):
+        return {}
+
+    mtime_ns = os.stat(dirResults).st_mtime_ns
+
+    index = _index_cache.get(dirResults)
+    if (index is not None and not DoCheck and dirResults in _dirs_checked
+        and index.get('mtime_ns') == mtime_ns):
+        return index['entries']
+
+    if index is None and os.path.isfile(FILENAMECACHE):
+        try:
+            with open(FILENAMECACHE, 'r') as file_cache:
+                index = json.load(file_cache).get(dirResults)
+        except ValueError:
+            index = None
+
+    entries_old = index['entries'] if index is not None else {}
+    entries = {}
+    IsChanged = index is None
+    with os.scandir(dirResults) as dir_entries:
+        for dir_entry in dir_entries:
+            if dir_entry.name.startswith('.') or not dir_entry.is_dir():
+                continue
+            signature = get_signature(dir_entry.path)
+            entry = entries_old.get(dir_entry.name)
+            if entry is None or entry.get('signature') != signature:
+                entry = read_entry(dir_entry.path, signature)
+                IsChanged = True
+            entries[dir_entry.name] = entry
+    if set(entries) != set(entries_old):
+        IsChanged = True
+
+    _dirs_checked.add(dirResults)
+
+    if not IsChanged:
+        index['mtime_ns'] = mtime_ns
+        _index_cache[dirResults] = index
+        return index['entries']
+
+    index = {'mtime_ns': mtime_ns, 'entries': entries}
+    _index_cache[dirResults] = index
+
+    if DoSaveCache:
+        save_cache()
+
+    return entries
+
+# -----------------------------------------------------------------------------
+def save_cache():
+    """
+    Save the index of all the dirs of results in this process into
+    FILENAMECACHE. The file is replaced at once, so that it is not read
+    while it is written by another process.
+    """
+
+    dirCache = os.path.dirname(os.path.abspath(FILENAMECACHE))
+    fileTmp, filenameTmp = tempfile.mkstemp(dir=dirCache, prefix='.tmp_')
+    with os.fdopen(fileTmp, 'w') as file_out:
+        json.dump(_index_cache, file_out)
+    os.chmod(filenameTmp, 0o644)
+    os.replace(filenameTmp, FILENAMECACHE)
+
+# -----------------------------------------------------------------------------
+def find_result(RestartDir, dirResults='Results'):
+    """
+    Return the name of the dir in dirResults with key_params.txt matching
+    RestartDir (RestartDir does not need to be the full name, the first
+    name starting with RestartDir is used), or None if it is not found.
+    """
+
+    name = _find_result(RestartDir, get_index(dirResults))
+    if name is None:
+        name = _find_result(RestartDir, get_index(dirResults, DoCheck=True))
+
+    return name
+
+# -----------------------------------------------------------------------------
+def _find_result(RestartDir, entries):
+    """
+    Return the name in entries (see get_index) matching RestartDir, see
+    find_result.
+    """
+
+    for name in sorted(entries):
+        if name.startswith(RestartDir) and entries[name]['keyparams'] is not None:
+            return name
+
+    return None
+
+# -----------------------------------------------------------------------------
+def get_restart_chain(RestartDir, dirResults='Results'):
+    """
+    Return the list of the names of the dirs in dirResults of the restart
+    chain starting from RestartDir, following the restartdir= lines in
+    key_params.txt (the first is RestartDir and the last one is not a
+    restart). The chains are kept until the index is changed. A ValueError
+    is raised if a restart dir is not found (after checking the dirs again,
+    see get_index) or the chain is a loop.
+    """
+
+    try:
+        return _get_restart_chain(RestartDir, dirResults, get_index(dirResults))
+    except ValueError:
+        return _get_restart_chain(RestartDir, dirResults,
+                                  get_index(dirResults, DoCheck=True))
+
+# -----------------------------------------------------------------------------
+def _get_restart_chain(RestartDir, dirResults, entries):
+    """
+    Return the restart chain of RestartDir in entries (see get_index), see
+    get_restart_chain.
+    """
+
+    chains  = _index_cache.get(os.path.abspath(dirResults), {}).setdefault(
+        'chains', {})
+
+    if RestartDir in chains:
+        return chains[RestartDir]
+
+    chain = []
+    RestartDirNow = RestartDir
+    while RestartDirNow:
+        if RestartDirNow in chains:
+            chain.extend(chains[RestartDirNow])
+            break
+        name = _find_result(RestartDirNow, entries)
+        if name is None:
+            raise ValueError(RestartDirNow+' is not found in '+dirResults
+                             + (' (restart chain: '+' -> '.join(chain)+')'
+                                if chain else '')+'.')
+        if name in chain:
+            raise ValueError('the restart chain is a loop: '
+                             + ' -> '.join(chain+[name])+'.')
+        chain.append(name)
+        RestartDirNow = entries[name]['restartdir']
+
+    chains[RestartDir] = chain
+
+    return chain
+
+# -----------------------------------------------------------------------------
+def get_restart_params(RestartDir, dirResults='Results'):
+    """
+    Return the params (a dict) of key_params.txt merged along the restart
+    chain of RestartDir (see get_restart_chain), from the first run of the
+    chain to RestartDir, so that a param of a restart run overrides the
+    one of the run it restarts from, as in sub_runs.set_restart_params. A
+    ValueError is raised if the chain is not found.
+    """
+
+    chain   = get_restart_chain(RestartDir, dirResults)
+    entries = get_index(dirResults)
+
+    params = {}
+    for name in reversed(chain):
+        for line in entries[name]['keyparams'] or []:
+            key, IsFound, value = line.partition('=')
+            if IsFound:
+                params[key] = value
+
+    return params
+
+# -----------------------------------------------------------------------------
+def get_restart_dir(RestartDir, strRealization, dirResults='Results'):
+    """
+    Return the RESTART dir of the realization strRealization (e.g., '01')
+    in the dir of dirResults matching RestartDir, or None if it is not
+    found. The first dir starting with RestartDir and having the RESTART
+    dir is used. The dirs are checked again if it is not found (see
+    get_index).
+    """
+
+    for DoCheck in [False, True]:
+        entries = get_index(dirResults, DoCheck)
+        for name in sorted(entries):
+            if name.startswith(RestartDir) and strRealization in entries[name]['restarts']:
+                return os.path.join(os.path.abspath(dirResults), name,
+                                    'run'+strRealization, 'RESTART')
+
+    return None
+
+# -----------------------------------------------------------------------------
+def get_fingerprints(dirResults='Results'):
+    """
+    Return a dict with the fingerprint (the fingerprint= line in
+    key_params.txt) as the key and the dir as the value for all the dirs in
+    dirResults.
+    """
+
+    entries = get_index(dirResults)
+
+    return {entries[name]['fingerprint']: os.path.join(dirResults, name)
+            for name in sorted(entries)
+            if entries[name]['fingerprint']}
+
+# =============================================================================
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Script to list the dirs in Results with the restart '
+                        + 'chain and the realizations of each dir. It needs '
+                        + 'to be run in the SWMFSOLAR dir.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('names', nargs='*',
+                            help='(default: all) The dirs (or the beginning '
+                            + 'of the names) in Results.')
+    ARG_PARSER.add_argument('--results',
+                            help='(default: Results) The dir of results.',
+                            type=str, default='Results')
+    ARGS = ARG_PARSER.parse_args()
+
+    entries = get_index(ARGS.results)
+
+    names = ARGS.names or sorted(name for name in entries
+                                 if entries[name]['keyparams'] is not None)
+
+    IsOk = True
+    for name in names:
+        try:
+            chain = get_restart_chain(name, ARGS.results)
+        except ValueError as error:
+            print(name+': '+str(error))
+            IsOk = False
+            continue
+        print(chain[0]+': realizations='+entries[chain[0]]['realizations']
+              + ' restart='+','.join(entries[chain[0]]['restarts'])
+              + ('' if len(chain) == 1 else
+                 ' restart chain: '+' -> '.join(chain[1:])))
+
+    if not IsOk:
+        sys.exit(1)
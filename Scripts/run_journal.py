@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import datetime as dt
+import json
+import os
+import time
+
+# the stages of a run in the order they are done by sub_runs.py
+STAGES = ['compile', 'backup', 'rundir', 'restart', 'submit']
+
+# -----------------------------------------------------------------------------
+def write_entry(filenameJournal, **entry):
+    """
+    Append an entry (a JSON line with the time) to the journal. Each entry is
+    written with a single write to the file opened in the append mode, so
+    that several processes can write to the same journal.
+    """
+
+    entry = dict(time=dt.datetime.now().isoformat(timespec='seconds'), **entry)
+
+    with open(filenameJournal, 'a') as file_journal:
+        file_journal.write(json.dumps(entry, sort_keys=True)+'\n')
+
+# -----------------------------------------------------------------------------
+def read_journal(filenameJournal):
+    """
+    Return the list of the entries in the journal. An incomplete last line
+    (e.g., the process is killed while writing it) is ignored.
+    """
+
+    entries = []
+
+    if not os.path.isfile(filenameJournal):
+        return entries
+
+    with open(filenameJournal, 'r') as file_journal:
+        for line in file_journal:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+
+    return entries
+
+# -----------------------------------------------------------------------------
+def get_stages_done(entries):
+    """
+    Return a dict with (SIMDIR, fingerprint) of the runs (or ('compile',
+    MODEL) for the compilation) as the key and the set of the stages done
+    as the value.
+    """
+
+    stages_done = {}
+
+    for entry in entries:
+        if entry.get('status') != 'done':
+            continue
+        if entry['stage'] == 'compile':
+            key = ('compile', entry['model'])
+        else:
+            key = (entry['simdir'], entry['fingerprint'])
+        stages_done.setdefault(key, set()).add(entry['stage'])
+
+    return stages_done
+
+# -----------------------------------------------------------------------------
+def get_realizations_submitted(entries):
+    """
+    Return a dict with (SIMDIR, fingerprint) of the runs as the key and the
+    set of the realizations submitted (the 'submitted' entries of the
+    'submit' stage, written even if the stage fails) as the value.
+    """
+
+    realizations_submitted = {}
+
+    for entry in entries:
+        if entry.get('stage') == 'submit' and entry.get('status') == 'submitted':
+            realizations_submitted.setdefault(
+                (entry['simdir'], entry['fingerprint']), set()).add(
+                    entry['realization'])
+
+    return realizations_submitted
+
+# -----------------------------------------------------------------------------
+def get_stage_seconds(entries):
+    """
+    Return a dict with the median time (in seconds) of each stage done in
+    the journal entries. The keys are (stage, MODEL) and (stage, None) for
+    all the models. The time of the 'rundir', 'restart' and 'submit'
+    stages is per realization if the number of realizations is recorded.
+    """
+
+    seconds_D = {}
+
+    for entry in entries:
+        if entry.get('status') != 'done' or 'seconds' not in entry:
+            continue
+        seconds = entry['seconds']
+        if entry['stage'] in ['rundir', 'restart', 'submit']:
+            seconds /= max(entry.get('nrealizations', 1), 1)
+        for key in {(entry['stage'], entry.get('model')), (entry['stage'], None)}:
+            seconds_D.setdefault(key, []).append(seconds)
+
+    for key, seconds_I in seconds_D.items():
+        seconds_I.sort()
+        nSecond = len(seconds_I)
+        seconds_D[key] = (seconds_I[nSecond//2] if nSecond % 2 else
+                          0.5*(seconds_I[nSecond//2-1] + seconds_I[nSecond//2]))
+
+    return seconds_D
+
+# -----------------------------------------------------------------------------
+def get_stage_estimate(seconds_D, stage, MODEL=None, nRealization=1):
+    """
+    Return the estimated time (in seconds) of the stage for MODEL with
+    nRealization realizations from seconds_D (see get_stage_seconds), or
+    None if the stage is not found in the journal.
+    """
+
+    seconds = seconds_D.get((stage, MODEL), seconds_D.get((stage, None)))
+    if seconds is None:
+        return None
+
+    if stage in ['rundir', 'restart', 'submit']:
+        seconds *= nRealization
+
+    return round(seconds, 3)
+
+# -----------------------------------------------------------------------------
+@contextlib.contextmanager
+def journal_stage(filenameJournal, stage, **entry):
+    """
+    Context manager to record the start and the end ('done' with the time
+    used in seconds, or 'failed') of a stage in the journal. Nothing is
+    recorded if filenameJournal is empty.
+
+    Arguments:
+      filenameJournal: the journal
+      stage:           the name of the stage, see STAGES
+      entry:           other info of the entry, e.g., simdir, fingerprint
+    """
+
+    if not filenameJournal:
+        yield
+        return
+
+    write_entry(filenameJournal, stage=stage, status='start', **entry)
+    tStart = time.time()
+    try:
+        yield
+    except BaseException:
+        write_entry(filenameJournal, stage=stage, status='failed',
+                    seconds=round(time.time()-tStart, 3), **entry)
+        raise
+    write_entry(filenameJournal, stage=stage, status='done',
+                seconds=round(time.time()-tStart, 3), **entry)
+
+# =============================================================================
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Script to show the stages of the runs in the '
+                        + 'journal written by sub_runs.py.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('filename',
+                            help='The journal, e.g., param_list.txt.journal')
+    ARGS = ARG_PARSER.parse_args()
+
+    entries = read_journal(ARGS.filename)
+
+    # the last status of each stage of each run
+    status_D = {}
+    for entry in entries:
+        name = entry['model'] if entry['stage'] == 'compile' else entry['simdir']
+        status_D.setdefault(name, {})[entry['stage']] = entry['status']
+
+    print('{:<40}'.format('run')
+          + ''.join('{:>10}'.format(stage) for stage in STAGES))
+    for name, status in status_D.items():
+        print('{:<40}'.format(name)
+              + ''.join('{:>10}'.format(status.get(stage, '-'))
+                        for stage in STAGES))
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+import argparse
+import concurrent.futures
+import os
+import shutil
+import subprocess
+import sys
+import artifact_store
+
+# -----------------------------------------------------------------------------
+def clone_rundir(dirSrc, dirDst, filenames_skip=()):
+    """
+    Create dirDst with the same tree as dirSrc: the dirs are created, the
+    symbolic links are re-created with the same target and the files are
+    linked from the store (see artifact_store.link_file), except the files
+    in filenames_skip (relative to dirSrc). dirSrc and dirDst should be at the same depth
+    so that the relative symbolic links are still valid.
+    """
+
+    for dirCurrent, dirnames, filenames in os.walk(dirSrc):
+        dirRelative = os.path.relpath(dirCurrent, dirSrc)
+        dirOut = os.path.normpath(os.path.join(dirDst, dirRelative))
+        os.makedirs(dirOut, exist_ok=True)
+
+        # os.walk does not follow the links to dirs, which are in dirnames
+        for name in dirnames + filenames:
+            src = os.path.join(dirCurrent, name)
+            dst = os.path.join(dirOut, name)
+            if os.path.normpath(os.path.join(dirRelative, name)) in filenames_skip:
+                continue
+            if os.path.islink(src):
+                if os.path.lexists(dst):
+                    os.remove(dst)
+                os.symlink(os.readlink(src), dst)
+            elif not os.path.isdir(src):
+                artifact_store.link_file(src, dst)
+
+# -----------------------------------------------------------------------------
+def make_rundir_realization(strRealization, dirTemplate, dirSim, filenameExe,
+                            filenameJob, PFSS, content_D, dirStage='.'):
+    """
+    Create the run dir dirSim/runNN of the realization strRealization (NN)
+    from the run dir dirTemplate created by the SWMF. The executable
+    filenameExe is linked to SWMF.exe, the PARAM.in, HARMONICS.in and
+    FDIPS.in files (with content in the dict content_D) are written with
+    map_1 replaced by map_NN in the input file of PFSS, the job script
+    filenameJob (if not None) is copied to job.long and map_NN.out is moved
+    from dirStage. All the files except PARAM.in and job.long are linked
+    from the store (see artifact_store). Return the run dir.
+    """
+
+    dirRun = os.path.join(dirSim, 'run'+strRealization)
+
+    clone_rundir(dirTemplate, dirRun, filenames_skip=('SWMF.exe',))
+
+    artifact_store.link_file(filenameExe, os.path.join(dirRun, 'SWMF.exe'))
+    if filenameJob is not None:
+        shutil.copy(filenameJob, os.path.join(dirRun, 'job.long'))
+
+    for filename, content in content_D.items():
+        if filename == PFSS+'.in':
+            content = content.replace('map_1', 'map_'+strRealization)
+        if filename == 'PARAM.in':
+            # PARAM.in is often edited in the run dir, so it is not shared
+            filenameOut = os.path.join(dirRun, filename)
+            if os.path.lexists(filenameOut):
+                os.remove(filenameOut)
+            with open(filenameOut, 'w') as file_out:
+                file_out.write(content)
+        else:
+            artifact_store.link_content(content,
+                                        os.path.join(dirRun, 'SC', filename))
+
+    filenameMap = os.path.join(dirStage, 'map_'+strRealization+'.out')
+    artifact_store.link_file(filenameMap, os.path.join(dirRun, 'SC'))
+    os.remove(filenameMap)
+
+    return dirRun
+
+# -----------------------------------------------------------------------------
+def make_rundir_realizations(SIMDIR, strRealizations, MODEL='AWSoM',
+                             PFSS='HARMONICS', dirSWMF='SWMF', MACHINE='',
+                             dirStage='.', nJobs=4):
+    """
+    Create the run dirs SIMDIR/runNN for the realizations in
+    strRealizations (e.g., '1,2,3') as the rundir_realizations target in
+    the Makefile used to do, but only one run dir is created by the SWMF
+    ('make rundir') and the files in it are linked from the store (see
+    artifact_store) into the run dirs. The run dirs are created and
+    HARMONICS.exe is run for each realization in a pool of nJobs threads.
+    The job script is not copied if it is not found. The script exits with
+    an error if make rundir or HARMONICS.exe fails.
+
+    Arguments:
+      SIMDIR:          the simulation dir
+      strRealizations: a string for the realizations, separated by ','
+      MODEL:           the model, SWMF/bin/MODEL.exe is used as SWMF.exe
+      PFSS:            HARMONICS or FDIPS
+      dirSWMF:         the SWMF dir
+      MACHINE:         the machine, JobScripts/job.PFSS.MACHINE is used if
+                       it is found
+      dirStage:        the dir with PARAM.in, HARMONICS.in, FDIPS.in and the
+                       map_NN.out files
+      nJobs:           the number of threads
+    """
+
+    dirSim   = os.path.abspath(SIMDIR)
+    dirStage = os.path.abspath(dirStage)
+    dirSWMF  = os.path.abspath(dirSWMF)
+
+    filenameExe = os.path.join(dirSWMF, 'bin', MODEL+'.exe')
+    filenameJob = os.path.abspath(os.path.join('JobScripts',
+                                               'job.'+PFSS+'.'+MACHINE))
+    if not MACHINE or not os.path.isfile(filenameJob):
+        print('WARNING: '+filenameJob+' is not found, job.long is not '
+              + 'copied into the run dirs.')
+        filenameJob = None
+
+    strRealization_I = [str(int(strRealization)).zfill(2)
+                        for strRealization in strRealizations.split(',')
+                        if strRealization.strip()]
+
+    content_D = {}
+    for filename in ['PARAM.in', 'HARMONICS.in', 'FDIPS.in']:
+        with open(os.path.join(dirStage, filename), 'r') as file_in:
+            content_D[filename] = file_in.read()
+
+    # the run dir created by the SWMF, at the same depth as the run dirs
+    dirTemplate = os.path.join(dirSim, '.rundir')
+    if os.path.isdir(dirTemplate):
+        shutil.rmtree(dirTemplate)
+    os.makedirs(dirSim, exist_ok=True)
+
+    subprocess.call('make rundir MACHINE='+MACHINE+' RUNDIR='+dirTemplate,
+                    shell=True, cwd=dirSWMF)
+    if not os.path.isdir(dirTemplate):
+        sys.exit('make rundir failed in '+dirSWMF)
+
+    dirRun_failed = []
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=nJobs) as executor:
+            dirRun_I = list(executor.map(
+                lambda strRealization: make_rundir_realization(
+                    strRealization, dirTemplate, dirSim, filenameExe,
+                    filenameJob, PFSS, content_D, dirStage),
+                strRealization_I))
+
+            if PFSS == 'HARMONICS':
+                for dirRun, status in zip(dirRun_I, executor.map(
+                        lambda dirRun: subprocess.call(
+                            './HARMONICS.exe', shell=True,
+                            cwd=os.path.join(dirRun, 'SC')),
+                        dirRun_I)):
+                    if status != 0:
+                        dirRun_failed.append(dirRun)
+    finally:
+        shutil.rmtree(dirTemplate)
+
+    if dirRun_failed:
+        sys.exit('HARMONICS.exe failed in '+', '.join(dirRun_failed))
+
+# =============================================================================
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Script to create the run dirs of the realizations. '
+                        + 'It needs to be run in the SWMFSOLAR dir.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('-s', '--simdir',
+                            help='(default: Runs)',
+                            type=str, default='Runs')
+    ARG_PARSER.add_argument('-r', '--realizations',
+                            help='(default: 1,2,3,4,5,6,7,8,9,10,11,12)',
+                            type=str, default='1,2,3,4,5,6,7,8,9,10,11,12')
+    ARG_PARSER.add_argument('--model',
+                            help='(default: AWSoM)',
+                            type=str, default='AWSoM')
+    ARG_PARSER.add_argument('-B0', '--pfss',
+                            help='(default: HARMONICS)',
+                            type=str, default='HARMONICS')
+    ARG_PARSER.add_argument('--swmf',
+                            help='(default: SWMF) The SWMF dir.',
+                            type=str, default='SWMF')
+    ARG_PARSER.add_argument('--machine',
+                            help='(default: none) The machine of the job '
+                            + 'script in JobScripts.',
+                            type=str, default='')
+    ARG_PARSER.add_argument('--stagedir',
+                            help='(default: .) The dir of PARAM.in, '
+                            + 'HARMONICS.in, FDIPS.in and map_*.out files.',
+                            type=str, default='.')
+    ARG_PARSER.add_argument('-j', '--jobs',
+                            help='(default: 4) The number of threads.',
+                            type=int, default=4)
+    ARGS = ARG_PARSER.parse_args()
+
+    make_rundir_realizations(ARGS.simdir, ARGS.realizations, ARGS.model,
+                             ARGS.pfss, ARGS.swmf, ARGS.machine,
+                             ARGS.stagedir, ARGS.jobs)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import math
+import os
+import re
+import sqlite3
+import sys
+import results_catalog
+import results_index
+
+# the params of key_params.txt changing the grid, e.g., MaxBlock,
+# nRootBlock1, AMRREGION(InnerShell), RefineTo, GRIDLEVEL
+AMRKEYS = r'amr|grid|refine|coarsen|block|level'
+
+# the features used to select the runs similar to a run, from the most
+# specific one, see get_features
+LEVELS = [('model/template/amr/restart', (0, 1, 2, 3)),
+          ('model/template/restart',     (0, 1, 3)),
+          ('model/template',             (0, 1)),
+          ('model',                      (0,))]
+
+# the max wall time in hours of a run
+MAXHOURS = 48
+
+# -----------------------------------------------------------------------------
+def get_keyparams(SIMDir, dirResults='Results'):
+    """
+    Return the params (a dict) of key_params.txt in the simulation dir of
+    the run dir SIMDir (e.g., run005_AWSoMR/run01), or an empty dict if it
+    is not found. The params of a restart run are merged with the ones of
+    its restart chain in dirResults (see results_index.get_restart_params).
+    """
+
+    filenameKeyparams = os.path.join(os.path.dirname(os.path.normpath(SIMDir)),
+                                     'key_params.txt')
+    params = {}
+    if not os.path.isfile(filenameKeyparams):
+        return params
+
+    with open(filenameKeyparams, 'r') as file_keyparams:
+        for line in file_keyparams:
+            key, IsFound, value = line.strip().partition('=')
+            if IsFound:
+                params[key] = value
+
+    if params.get('restartdir'):
+        try:
+            params_chain = results_index.get_restart_params(
+                params['restartdir'], dirResults)
+        except ValueError:
+            return params
+        params_chain.update(params)
+        params = params_chain
+
+    return params
+
+# -----------------------------------------------------------------------------
+def get_features(params):
+    """
+    Return the features of a run from the params of its key_params.txt (a
+    dict): the model, the PARAM template, the AMR settings (the params
+    matching AMRKEYS) and whether it is a restart run.
+    """
+
+    strAMR = ','.join(sorted(key+'='+value for key, value in params.items()
+                             if re.search(AMRKEYS, key, re.IGNORECASE)))
+
+    return (params.get('model', 'AWSoM'), params.get('param', 'Default'),
+            strAMR, 'restart' if params.get('restartdir') else 'start')
+
+# -----------------------------------------------------------------------------
+def get_history(filenameDB=results_catalog.FILENAMEDB, dirResults='Results'):
+    """
+    Return the list of the realizations done (dicts with the features, the
+    number of nodes, the wall time in hours and the node-hours of SWMF.exe)
+    in the catalog, which is updated first (see results_catalog). The short
+    runs with a fixed number of steps (stop in key_params.txt, e.g., the
+    benchmarks of scaling_benchmark.py) are not used.
+    """
+
+    results_catalog.update_catalog(filenameDB, dirResults)
+
+    connection = sqlite3.connect(filenameDB)
+    params_name = {}
+    for name, key, value in connection.execute('SELECT name, key, value FROM params'):
+        params_name.setdefault(name, {})[key] = value
+
+    samples = []
+    for name, nodes, seconds in connection.execute(
+            'SELECT name, nodes, seconds FROM realizations WHERE '
+            + "status = 'success' AND nodes > 1 AND seconds > 0"):
+        if 'stop' in params_name.get(name, {}):
+            continue
+        hours = seconds/3600
+        samples.append({'name': name,
+                        'features': get_features(params_name.get(name, {})),
+                        'nodes': nodes, 'hours': hours,
+                        'nodehours': hours*(nodes-1)})
+    connection.close()
+
+    return samples
+
+# -----------------------------------------------------------------------------
+def get_quantile(values, q):
+    """
+    Return the quantile q (0 to 1) of values, linearly interpolated.
+    """
+
+    values = sorted(values)
+    x = q*(len(values)-1)
+    i = int(x)
+
+    if i == len(values)-1:
+        return values[i]
+
+    return values[i] + (x-i)*(values[i+1]-values[i])
+
+# -----------------------------------------------------------------------------
+def predict(samples, features, nodes=None, TargetHours=None, MaxNodes=512,
+            MaxHours=MAXHOURS, quantile=0.9, margin=1.2, MinHours=0.5):
+    """
+    Return the recommended number of nodes and wall time in hours for a run
+    with the features (see get_features), from the runs done with the same
+    features (or the most specific subset of them, see LEVELS), as a dict
+    with the nodes, the hours, the level and the number of the runs used,
+    or None if no similar run is done. The node-hours of the run is the
+    quantile of the node-hours of the similar runs, which are assumed to
+    scale perfectly with the nodes.
+
+    Arguments:
+      samples:     the runs done, see get_history
+      features:    the features of the run
+      nodes:       the number of nodes if it is given, or the number of
+                   nodes to run within TargetHours if TargetHours is given,
+                   or the median of the similar runs
+      TargetHours: the wall time in hours wanted
+      MaxNodes:    the max number of nodes of a run
+      MaxHours:    the max wall time in hours of a run
+      quantile:    the quantile of the node-hours of the similar runs
+      margin:      the factor applied to the wall time
+      MinHours:    the min wall time in hours
+    """
+
+    for strLevel, indices in LEVELS:
+        key = [features[i] for i in indices]
+        samples_level = [sample for sample in samples
+                         if [sample['features'][i] for i in indices] == key]
+        if samples_level:
+            break
+    else:
+        return None
+
+    nodehours = get_quantile([sample['nodehours'] for sample in samples_level],
+                             quantile)*margin
+
+    if nodes is None:
+        if TargetHours:
+            nodes = int(math.ceil(nodehours/TargetHours)) + 1
+        else:
+            nodes = int(round(get_quantile(
+                [sample['nodes'] for sample in samples_level], 0.5)))
+        # the runs must be done within MaxHours
+        nodes = max(nodes, int(math.ceil(nodehours/MaxHours)) + 1)
+        nodes = min(max(nodes, 2), MaxNodes)
+
+    return {'nodes': nodes,
+            'hours': min(max(nodehours/(nodes-1), MinHours), MaxHours),
+            'level': strLevel, 'nsample': len(samples_level)}
+
+# =============================================================================
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Script to recommend the number of nodes and the '
+                        + 'wall time of the run dirs from the runs done '
+                        + 'with the same model, PARAM template and AMR '
+                        + 'settings in Results (see results_catalog.py), '
+                        + 'or list the runs done for each of them. It '
+                        + 'needs to be run in the SWMFSOLAR dir.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('SIMDirs', nargs='*',
+                            help='The run dirs, e.g., run005_AWSoM/run01 or '
+                            + 'run005_AWSoM (all its run dirs).')
+    ARG_PARSER.add_argument('--db',
+                            help='(default: '+results_catalog.FILENAMEDB+') '
+                            + 'The catalog.',
+                            type=str, default=results_catalog.FILENAMEDB)
+    ARG_PARSER.add_argument('--results',
+                            help='(default: Results) The dir of results.',
+                            type=str, default='Results')
+    ARG_PARSER.add_argument('-n', '--nodes',
+                            help='(default: predicted) The number of nodes '
+                            + 'per run dir.',
+                            type=int, default=None)
+    ARG_PARSER.add_argument('--TargetHours',
+                            help='(default: none) The wall time wanted per '
+                            + 'run dir, to get the number of nodes.',
+                            type=float, default=None)
+    ARGS = ARG_PARSER.parse_args()
+
+    samples = get_history(ARGS.db, ARGS.results)
+
+    if not ARGS.SIMDirs:
+        groups = {}
+        for sample in samples:
+            groups.setdefault(sample['features'], []).append(sample)
+        print('{:<8}{:<28}{:<9}{:>6}{:>7}{:>12}{:>8}  {}'.format(
+            'model', 'template', 'restart', 'runs', 'nodes', 'node-hours',
+            'hours', 'AMR'))
+        for features in sorted(groups):
+            samples_group = groups[features]
+            print('{:<8}{:<28}{:<9}{:>6}{:>7.0f}{:>12.1f}{:>8.2f}  {}'.format(
+                features[0], features[1], features[3], len(samples_group),
+                get_quantile([sample['nodes'] for sample in samples_group], 0.5),
+                get_quantile([sample['nodehours'] for sample in samples_group], 0.5),
+                get_quantile([sample['hours'] for sample in samples_group], 0.5),
+                features[2] or '-'))
+        sys.exit(0)
+
+    for SIMDir in ARGS.SIMDirs:
+        dirs = ([SIMDir] if os.path.isfile(os.path.join(SIMDir, '..', 'key_params.txt'))
+                else sorted(glob.glob(os.path.join(SIMDir, 'run[0-9]*'))))
+        for dirRun in dirs:
+            prediction = predict(samples,
+                                 get_features(get_keyparams(dirRun, ARGS.results)),
+                                 ARGS.nodes, ARGS.TargetHours)
+            if prediction is None:
+                print(dirRun+': no similar run done')
+            else:
+                print(dirRun+': '+str(prediction['nodes'])+' nodes, '
+                      +'{:.2f}'.format(prediction['hours'])+' hours (from '
+                      +str(prediction['nsample'])+' runs with the same '
+                      +prediction['level']+')')
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import results_catalog
+import runtime_model
+
+# the files written by generate: the param list of the benchmark runs and
+# the run dirs with the number of nodes and the wall time (see the --runs
+# option of sub_ft_bundle_job.py)
+FILENAMEPARAM = 'param_list_scaling.txt'
+FILENAMERUNS  = 'runs_scaling.txt'
+
+# -----------------------------------------------------------------------------
+def get_ladder(strNodes):
+    """
+    Return the sorted list of the numbers of nodes in strNodes, e.g.,
+    '5,10,20,40,80'. A run uses one node for PostProc.pl, so each number
+    must be at least 2.
+    """
+
+    nodes_I = sorted(set(int(strNode) for strNode in strNodes.split(',')
+                         if strNode.strip()))
+    if not nodes_I or nodes_I[0] < 2:
+        raise ValueError(strNodes+': the numbers of nodes must be at least 2.')
+
+    return nodes_I
+
+# -----------------------------------------------------------------------------
+def write_benchmark(MAP, models, nodes_I, nStep=100, PARAM='Default',
+                    strParams='', RunIDStart=901, strTime='01:00:00',
+                    filenameParam=FILENAMEPARAM, filenameRuns=FILENAMERUNS):
+    """
+    Write the param list filenameParam with one run for each model and each
+    number of nodes in nodes_I, which stops after nStep steps (the stop
+    param, all the #STOP commands are replaced), and the run dirs with the
+    number of nodes and the wall time strTime into filenameRuns. Return
+    the list of the run IDs.
+
+    Arguments:
+      MAP:           the map, e.g., GONG_CR2208.fits
+      models:        the models, e.g., ['AWSoM', 'AWSoMR']
+      nodes_I:       the numbers of nodes of the runs of each model
+      nStep:         the number of steps of the runs
+      PARAM:         the PARAM.in template, e.g., PARAM.in.awsom.CME
+      strParams:     other params of the runs, e.g., 'pfss=FDIPS BrFactor=1.2'
+      RunIDStart:    the run ID of the first run
+      strTime:       the wall time of the runs in the bundle jobs
+      filenameParam: the param list
+      filenameRuns:  the file of the run dirs, see sub_ft_bundle_job.py
+    """
+
+    RunIDs = []
+    lines_param = []
+    lines_runs  = []
+    RunID = RunIDStart
+    for MODEL in models:
+        for nNode in nodes_I:
+            params = ['map='+MAP, 'model='+MODEL, 'stop='+str(nStep),
+                      'realization=[1]']
+            if PARAM != 'Default':
+                params.append('param='+PARAM)
+            lines_param.append(str(RunID)+'\t'+'  '.join(params+strParams.split()))
+            lines_runs.append('run'+str(RunID).zfill(3)+'_'+MODEL+'/run01 '
+                              +str(nNode)+' '+strTime)
+            RunIDs.append(RunID)
+            RunID += 1
+
+    with open(filenameParam, 'w') as file_param:
+        file_param.write('# Strong-scaling benchmark written by '
+                         + 'scaling_benchmark.py: '+str(nStep)+' steps of '
+                         + PARAM+' on '+', '.join(str(nNode) for nNode in nodes_I)
+                         + ' nodes, see '+filenameRuns+'\n')
+        file_param.write('selected run IDs = '+str(RunIDs[0])+'-'
+                         + str(RunIDs[-1])+'\n\n')
+        file_param.write('#START\n')
+        file_param.write('ID\tparams\n')
+        for line in lines_param:
+            file_param.write(line+'\n')
+
+    with open(filenameRuns, 'w') as file_runs:
+        file_runs.write('# run dir, nodes and wall time of the benchmark in '
+                        + filenameParam+'\n')
+        for line in lines_runs:
+            file_runs.write(line+'\n')
+
+    return RunIDs
+
+# -----------------------------------------------------------------------------
+def read_runs(filenameRuns=FILENAMERUNS):
+    """
+    Return the list of (run dir, number of nodes) in filenameRuns.
+    """
+
+    runs = []
+    with open(filenameRuns, 'r') as file_runs:
+        for line in file_runs:
+            values = line.split()
+            if values and not values[0].startswith('#'):
+                runs.append((values[0], int(values[1])))
+
+    return runs
+
+# -----------------------------------------------------------------------------
+def get_timings(runs, dirResults='Results'):
+    """
+    Return the list of the timings (dicts with the model, the PARAM
+    template, the number of nodes, the number of steps, the wall time in
+    seconds and the seconds per step) of the runs (see read_runs) from the
+    last runlog in the run dir, or in Results if it is post processed
+    already. The runs not done (no runlog or no step) are skipped.
+    """
+
+    timings = []
+    for dirRun, nNode in runs:
+        SIMDIR, strRun = os.path.split(os.path.normpath(dirRun))
+        filenames = (sorted(glob.glob(os.path.join(dirRun, 'runlog*')))
+                     or sorted(glob.glob(os.path.join(dirResults, SIMDIR, strRun,
+                                                      'runlog*'))))
+        if not filenames:
+            continue
+        info = results_catalog.get_runlog_info(filenames[-1])
+        if not info['nstep'] or not info['seconds']:
+            continue
+
+        params = runtime_model.get_keyparams(dirRun, dirResults)
+        if not params:
+            params = runtime_model.get_keyparams(os.path.join(dirResults, dirRun),
+                                                 dirResults)
+        timings.append({'dir': dirRun, 'model': params.get('model', 'AWSoM'),
+                        'param': params.get('param', 'Default'),
+                        'nodes': nNode, 'nstep': info['nstep'],
+                        'seconds': info['seconds'],
+                        'step_seconds': info['seconds']/info['nstep']})
+
+    return timings
+
+# -----------------------------------------------------------------------------
+def get_scaling(timings):
+    """
+    Return a dict with (model, PARAM template) as the key and the list of
+    the timings (see get_timings) sorted by the number of nodes as the
+    value, with the speedup and the parallel efficiency relative to the
+    run with the fewest nodes. Only the nodes of SWMF.exe (all the nodes
+    but the one of PostProc.pl) are counted.
+    """
+
+    scaling = {}
+    for timing in timings:
+        scaling.setdefault((timing['model'], timing['param']), []).append(timing)
+
+    for timings_group in scaling.values():
+        timings_group.sort(key=lambda timing: timing['nodes'])
+        timing_base = timings_group[0]
+        for timing in timings_group:
+            timing['speedup'] = timing_base['step_seconds']/timing['step_seconds']
+            timing['efficiency'] = (timing['speedup']*(timing_base['nodes']-1)
+                                    / (timing['nodes']-1))
+
+    return scaling
+
+# =============================================================================
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Script for strong-scaling benchmarks: generate '
+                        + 'short runs with a fixed number of steps at a '
+                        + 'ladder of node counts for each model, submit '
+                        + 'them in bundle jobs, and analyze the runlogs '
+                        + 'into a scaling table with the parallel '
+                        + 'efficiency. It needs to be run in the SWMFSOLAR '
+                        + 'dir.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('command', choices=['generate', 'submit', 'analyze'],
+                            help='generate: write the param list and the run '
+                            + 'dirs with the nodes; submit: create the run '
+                            + 'dirs with sub_runs.py and submit them with '
+                            + 'sub_ft_bundle_job.py; analyze: print the '
+                            + 'scaling table of the runs done.')
+    ARG_PARSER.add_argument('--map',
+                            help='(default: none) generate: the map, e.g., '
+                            + 'GONG_CR2208.fits.',
+                            type=str, default='')
+    ARG_PARSER.add_argument('--model',
+                            help='(default: AWSoM) generate: the models, '
+                            + 'e.g., AWSoM,AWSoMR.',
+                            type=str, default='AWSoM')
+    ARG_PARSER.add_argument('--param',
+                            help='(default: Default) generate: the PARAM.in '
+                            + 'template, e.g., PARAM.in.awsom.CME.',
+                            type=str, default='Default')
+    ARG_PARSER.add_argument('--params',
+                            help='(default: none) generate: other params of '
+                            + "the runs, e.g., 'pfss=FDIPS BrFactor=1.2'.",
+                            type=str, default='')
+    ARG_PARSER.add_argument('-n', '--nodes',
+                            help='(default: 5,10,20,40,80) generate: the '
+                            + 'numbers of nodes.',
+                            type=str, default='5,10,20,40,80')
+    ARG_PARSER.add_argument('--nstep',
+                            help='(default: 100) generate: the number of '
+                            + 'steps of the runs.',
+                            type=int, default=100)
+    ARG_PARSER.add_argument('--id',
+                            help='(default: 901) generate: the run ID of '
+                            + 'the first run.',
+                            type=int, default=901)
+    ARG_PARSER.add_argument('-t', '--strTime',
+                            help='(default: 01:00:00) generate: the wall '
+                            + 'time of the runs.',
+                            type=str, default='01:00:00')
+    ARG_PARSER.add_argument('-f', '--filename',
+                            help='(default: '+FILENAMEPARAM+') The param '
+                            + 'list of the benchmark.',
+                            type=str, default=FILENAMEPARAM)
+    ARG_PARSER.add_argument('-r', '--runs',
+                            help='(default: '+FILENAMERUNS+') The run dirs '
+                            + 'with the nodes of the benchmark.',
+                            type=str, default=FILENAMERUNS)
+    ARG_PARSER.add_argument('-c', '--DoCompile',
+                            help='(default: 0) submit: passed to sub_runs.py.',
+                            type=int, default=0)
+    ARG_PARSER.add_argument('--sbatch',
+                            help='(default: sbatch) submit: the command to '
+                            + 'submit the bundle jobs.',
+                            type=str, default='sbatch')
+    ARG_PARSER.add_argument('--results',
+                            help='(default: Results) analyze: the dir of '
+                            + 'results.',
+                            type=str, default='Results')
+    ARG_PARSER.add_argument('--MinEfficiency',
+                            help='(default: 0.7) analyze: the min parallel '
+                            + 'efficiency of the nodes recommended.',
+                            type=float, default=0.7)
+    ARG_PARSER.add_argument('--csv',
+                            help='(default: none) analyze: also write the '
+                            + 'scaling table into a CSV file.',
+                            type=str, default='')
+    ARGS = ARG_PARSER.parse_args()
+
+    if ARGS.command == 'generate':
+        if not ARGS.map:
+            sys.exit('generate needs the map (--map).')
+        try:
+            nodes_I = get_ladder(ARGS.nodes)
+        except ValueError as error:
+            sys.exit(str(error))
+        RunIDs = write_benchmark(ARGS.map, ARGS.model.split(','), nodes_I,
+                                 ARGS.nstep, ARGS.param, ARGS.params, ARGS.id,
+                                 ARGS.strTime, ARGS.filename, ARGS.runs)
+        print('Wrote '+str(len(RunIDs))+' runs into '+ARGS.filename+' and '
+              +ARGS.runs)
+    elif ARGS.command == 'submit':
+        dirScripts = os.path.dirname(os.path.abspath(__file__))
+        runs = read_runs(ARGS.runs)
+        strIDs = ','.join(dirRun.split('_')[0][3:] for dirRun, nNode in runs)
+        # the runs differ only by the nodes, so they are not duplicates
+        if subprocess.run('python3 '+os.path.join(dirScripts, 'sub_runs.py')
+                          + ' -f '+ARGS.filename+' -c '+str(ARGS.DoCompile)
+                          + ' -r 0 -d 0', shell=True).returncode != 0:
+            sys.exit('sub_runs.py failed, the bundles are not submitted.')
+        # sub_runs.py skips a run failed to be prepared with a warning, the
+        # bundles are submitted only if all the run dirs are created
+        dirs_missing = [dirRun for dirRun, nNode in runs if not os.path.isdir(dirRun)]
+        if dirs_missing:
+            sys.exit('The run dirs are not created: '+', '.join(dirs_missing)
+                     + ', the bundles are not submitted.')
+        if subprocess.run('python3 '+os.path.join(dirScripts, 'sub_ft_bundle_job.py')
+                          + ' -i '+strIDs+' -r '+ARGS.runs+' -s scaling'
+                          + ' --sbatch "'+ARGS.sbatch+'"', shell=True).returncode != 0:
+            sys.exit('sub_ft_bundle_job.py failed to submit the bundles.')
+    else:
+        scaling = get_scaling(get_timings(read_runs(ARGS.runs), ARGS.results))
+        if not scaling:
+            sys.exit('No benchmark run in '+ARGS.runs+' is done.')
+
+        lines_csv = ['model,param,nodes,nstep,seconds,step_seconds,speedup,efficiency']
+        for (MODEL, PARAM), timings_group in sorted(scaling.items()):
+            print(MODEL+' '+PARAM)
+            print('{:>7}{:>8}{:>11}{:>11}{:>9}{:>12}  {}'.format(
+                'nodes', 'steps', 'seconds', 's/step', 'speedup', 'efficiency',
+                'efficiency curve'))
+            nodes_recommended = timings_group[0]['nodes']
+            for timing in timings_group:
+                print('{:>7}{:>8}{:>11.1f}{:>11.3f}{:>9.2f}{:>12.2f}  {}'.format(
+                    timing['nodes'], timing['nstep'], timing['seconds'],
+                    timing['step_seconds'], timing['speedup'],
+                    timing['efficiency'],
+                    '#'*int(round(min(timing['efficiency'], 1.5)*40))))
+                if timing['efficiency'] >= ARGS.MinEfficiency:
+                    nodes_recommended = timing['nodes']
+                lines_csv.append(','.join(str(value) for value in [
+                    MODEL, PARAM, timing['nodes'], timing['nstep'],
+                    timing['seconds'], timing['step_seconds'],
+                    timing['speedup'], timing['efficiency']]))
+            print('recommended: '+str(nodes_recommended)+' nodes (efficiency >= '
+                  +str(ARGS.MinEfficiency)+')\n')
+
+        if ARGS.csv:
+            with open(ARGS.csv, 'w') as file_csv:
+                file_csv.write('\n'.join(lines_csv)+'\n')
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import os
+import re
+import subprocess
+import sys
+
+# the scheduler of each machine
+SCHEDULERS = {'frontera': 'slurm', 'pfe': 'pbs', 'derecho': 'pbs'}
+
+# the command to submit a job script with each scheduler
+SUBMITS = {'slurm': 'sbatch', 'pbs': 'qsub'}
+
+# the directives of job.long set by the array job script: the job name, the
+# output/error files and the array
+DIRECTIVES_ARRAY = {
+    'slurm': r'#SBATCH\s+(-J|--job-name|-o|--output|-e|--error|-a|--array)\b',
+    'pbs':   r'#PBS\s+(-N|-J|-o|-e)\b'}
+
+# the variable of the array index of each scheduler
+INDICES = {'slurm': 'SLURM_ARRAY_TASK_ID', 'pbs': 'PBS_ARRAY_INDEX'}
+
+# -----------------------------------------------------------------------------
+def read_job_script(filenameJob, scheduler):
+    """
+    Return the header (the first line, the directives and the comments
+    before the first command, without the directives set by the array job
+    script, see DIRECTIVES_ARRAY) and the body (the other lines, without
+    changing to the submission dir, e.g., cd $PBS_O_WORKDIR) of the job
+    script filenameJob.
+    """
+
+    with open(filenameJob, 'r') as file_job:
+        lines = file_job.read().splitlines()
+
+    header = []
+    body   = []
+    for line in lines:
+        if not body and (not line.strip() or line.startswith('#')):
+            if not re.match(DIRECTIVES_ARRAY[scheduler], line):
+                header.append(line)
+        elif not re.match(r'\s*cd\s+\$\{?(PBS_O_WORKDIR|SLURM_SUBMIT_DIR)\}?\s*$',
+                          line):
+            body.append(line)
+
+    # the empty lines at the end of the header
+    while header and not header[-1].strip():
+        header.pop()
+
+    return header, body
+
+# -----------------------------------------------------------------------------
+def group_run_dirs(dirs, scheduler, filenameJob='job.long'):
+    """
+    Return the list of the groups of the run dirs (lists) with the same job
+    script filenameJob (see read_job_script), in the order of dirs. The run
+    dirs without the job script are skipped with a message.
+    """
+
+    groups = {}
+    for dirRun in dirs:
+        filenameJobRun = os.path.join(dirRun, filenameJob)
+        if not os.path.isfile(filenameJobRun):
+            print(filenameJobRun+' is not found, '+dirRun+' is skipped.')
+            continue
+        header, body = read_job_script(filenameJobRun, scheduler)
+        groups.setdefault(('\n'.join(header), '\n'.join(body)), []).append(dirRun)
+
+    return list(groups.values())
+
+# -----------------------------------------------------------------------------
+def get_array_script(header, body, scheduler, strName, filenameDirs, nRun,
+                     MaxRunning=0):
+    """
+    Return the array job script (a string) with nRun jobs for the run dirs
+    in filenameDirs (one dir per line, the array index is the line number
+    starting from 1) from the header and the body of the job script of the
+    run dirs (see read_job_script). The array job script changes to the
+    run dir before the body, with backquotes so that it works in bash and
+    csh. At most MaxRunning jobs of the array run at the same time if
+    MaxRunning > 0.
+    """
+
+    lines = header[:1]
+    dirJob = os.path.dirname(os.path.abspath(filenameDirs))
+    if scheduler == 'slurm':
+        lines += ['#SBATCH -J '+strName,
+                  '#SBATCH -o '+os.path.join(dirJob, strName+'.o%A_%a'),
+                  '#SBATCH -e '+os.path.join(dirJob, strName+'.e%A_%a'),
+                  '#SBATCH --array=1-'+str(nRun)
+                  + ('%'+str(MaxRunning) if MaxRunning > 0 else '')]
+    else:
+        lines += ['#PBS -N '+strName]
+        # an array of PBS needs at least 2 jobs
+        if nRun > 1:
+            lines += ['#PBS -J 1-'+str(nRun)]
+            if MaxRunning > 0:
+                lines += ['#PBS -W max_run_subjobs='+str(MaxRunning)]
+    lines += header[1:]
+
+    lines += ['', '# the run dir of the array index (the line in '
+              + os.path.basename(filenameDirs)+')']
+    if nRun > 1:
+        lines += ['cd `sed -n "${'+INDICES[scheduler]+'}p" '
+                  + os.path.abspath(filenameDirs)+'`']
+    else:
+        with open(filenameDirs, 'r') as file_dirs:
+            lines += ['cd '+file_dirs.readline().strip()]
+    lines += [''] + body
+
+    return '\n'.join(lines)+'\n'
+
+# -----------------------------------------------------------------------------
+def submit_job(filenameJob, strSubmit):
+    """
+    Submit the job script filenameJob with strSubmit (e.g., sbatch or a mock
+    for testing) and return the job ID (the first number in the output of
+    strSubmit, e.g., 'Submitted batch job 123' or '456[].desched1'), or None
+    if it failed.
+    """
+
+    process = subprocess.run(strSubmit+' '+filenameJob, shell=True,
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                             universal_newlines=True)
+    print(process.stdout, end='')
+
+    match = re.search(r'(\d+)', process.stdout)
+    if process.returncode != 0 or not match:
+        return None
+
+    return match.group(1)
+
+# -----------------------------------------------------------------------------
+def sub_array_jobs(dirs, MACHINE, strName='amap', strSubmit='', MaxArray=1000,
+                   MaxRunning=0, dirJobs='JobArrays', filenameJob='job.long'):
+    """
+    Submit the run dirs in job arrays instead of one job per run dir: the
+    run dirs with the same job script filenameJob (see group_run_dirs) are
+    in the same arrays of at most MaxArray jobs. For each array, the list
+    of the run dirs (NAME.dirs) and the array job script (job.NAME, see
+    get_array_script) are written in dirJobs, with NAME = strName_NNN.
+    Return the list of (NAME, job ID or None if it failed, run dirs).
+
+    Arguments:
+      dirs:        the run dirs, e.g., run005_AWSoM/run01
+      MACHINE:     the machine, see SCHEDULERS
+      strName:     the job name
+      strSubmit:   the command to submit the jobs (default: see SUBMITS)
+      MaxArray:    the max number of jobs of an array
+      MaxRunning:  the max number of jobs of an array running at the same
+                   time (0: no limit)
+      dirJobs:     the dir of the array job scripts
+      filenameJob: the job script in the run dirs
+    """
+
+    if not MACHINE:
+        raise ValueError('MACHINE is not set (see SWMF/Makefile.def), the '
+                         + 'job arrays are supported on '
+                         + ', '.join(SCHEDULERS)+'.')
+    if not MACHINE in SCHEDULERS:
+        raise ValueError('The job arrays are not supported on '+MACHINE
+                         + ', only on '+', '.join(SCHEDULERS)+'.')
+    scheduler = SCHEDULERS[MACHINE]
+    if not strSubmit:
+        strSubmit = SUBMITS[scheduler]
+
+    os.makedirs(dirJobs, exist_ok=True)
+
+    # the arrays submitted before are not overwritten
+    filenames = glob.glob(os.path.join(dirJobs, strName+'_[0-9][0-9][0-9].dirs'))
+    iName = 1 + max([int(filename[-8:-5]) for filename in filenames], default=0)
+
+    arrays = []
+    for group in group_run_dirs(dirs, scheduler, filenameJob):
+        header, body = read_job_script(os.path.join(group[0], filenameJob),
+                                       scheduler)
+        for iStart in range(0, len(group), MaxArray):
+            dirs_array = group[iStart:iStart+MaxArray]
+            name = strName+'_'+str(iName).zfill(3)
+            iName += 1
+
+            filenameDirs = os.path.join(dirJobs, name+'.dirs')
+            with open(filenameDirs, 'w') as file_dirs:
+                for dirRun in dirs_array:
+                    file_dirs.write(os.path.abspath(dirRun)+'\n')
+
+            filenameArray = os.path.join(dirJobs, 'job.'+name)
+            with open(filenameArray, 'w') as file_job:
+                file_job.write(get_array_script(header, body, scheduler, name,
+                                                filenameDirs, len(dirs_array),
+                                                MaxRunning))
+
+            print('Submitting '+filenameArray+' for '+str(len(dirs_array))
+                  +' run dirs')
+            arrays.append((name, submit_job(filenameArray, strSubmit),
+                           dirs_array))
+
+    return arrays
+
+# =============================================================================
+if __name__ == '__main__':
+
+    PROG_DESCRIPTION = ('Script to submit the run dirs in job arrays of '
+                        + 'SLURM or PBS, one array for the run dirs with '
+                        + 'the same job script instead of one job per run '
+                        + 'dir. The array index is the line of the run dir '
+                        + 'in JobArrays/NAME.dirs.')
+    ARG_PARSER = argparse.ArgumentParser(description=PROG_DESCRIPTION)
+    ARG_PARSER.add_argument('dirs', nargs='+',
+                            help='The run dirs, e.g., run005_AWSoM/run01.')
+    ARG_PARSER.add_argument('-m', '--machine',
+                            help='(default: frontera) One of '
+                            + ', '.join(SCHEDULERS)+'.',
+                            type=str, default='frontera')
+    ARG_PARSER.add_argument('-J', '--jobname',
+                            help='(default: amap) The job name, followed by '
+                            + 'the number of the array.',
+                            type=str, default='amap')
+    ARG_PARSER.add_argument('--submit',
+                            help='(default: sbatch or qsub) The command to '
+                            + 'submit the job scripts, e.g., a mock for '
+                            + 'testing.',
+                            type=str, default='')
+    ARG_PARSER.add_argument('--MaxArray',
+                            help='(default: 1000) The max number of jobs '
+                            + 'of an array.',
+                            type=int, default=1000)
+    ARG_PARSER.add_argument('--MaxRunning',
+                            help='(default: 0) The max number of jobs of an '
+                            + 'array running at the same time, 0 for no '
+                            + 'limit.',
+                            type=int, default=0)
+    ARG_PARSER.add_argument('--dir',
+                            help='(default: JobArrays) The dir of the array '
+                            + 'job scripts.',
+                            type=str, default='JobArrays')
+    ARGS = ARG_PARSER.parse_args()
+
+    try:
+        arrays = sub_array_jobs(ARGS.dirs, ARGS.machine, ARGS.jobname,
+                                ARGS.submit, ARGS.MaxArray, ARGS.MaxRunning,
+                                ARGS.dir)
+    except ValueError as error:
+        sys.exit(str(error))
+
+    if any(jobID is None for name, jobID, dirs_array in arrays):
+        sys.exit('Failed to submit '+', '.join(name for name, jobID, dirs_array
+                                                in arrays if jobID is None))
@@ -2,55 +2,263 @@
 
 import argparse
 import glob
-import numpy as np
+import math
+import os
 import subprocess
+import sys
+
+import pilot_dispatcher
+import runtime_model
+
+# the number of tasks per node
+NTASKPERNODE = 56
+
+# the partitions (name, min and max number of nodes of a job) and the max
+# wall time in hours on Frontera
+PARTITIONS = [('small', 1, 2), ('normal', 3, 512), ('large', 513, 2048)]
+MAXHOURS   = 48
+
+# -----------------------------------------------------------------------------
+def get_hours(strTime):
+    """
+    Return the hours of the wall time strTime: [days-]hours[:minutes[:seconds]].
+    """
+
+    days = 0
+    if '-' in strTime:
+        strDays, strTime = strTime.split('-', 1)
+        days = int(strDays)
+
+    return 24*days + sum(float(value)/60**i
+                         for i, value in enumerate(strTime.split(':')))
+
+# -----------------------------------------------------------------------------
+def get_str_time(hours):
+    """
+    Return the wall time hours as HH:MM:SS, rounded up to the minute.
+    """
+
+    minutes = int(math.ceil(round(hours*60, 6)))
+
+    return str(minutes//60).zfill(2)+':'+str(minutes % 60).zfill(2)+':00'
+
+# -----------------------------------------------------------------------------
+def get_dict_values(strValues, DoUseHours=False):
+    """
+    Return a dict from the string strValues, e.g., 'AWSoM=40,AWSoMR=20' (the
+    values are integers) or 'AWSoM=24:00:00,AWSoMR=8' (the values are hours
+    if DoUseHours).
+    """
+
+    dict_values = {}
+
+    for strValue in strValues.split(','):
+        if not strValue.strip():
+            continue
+        name, value = strValue.split('=')
+        dict_values[name.strip()] = (get_hours(value.strip()) if DoUseHours
+                                     else int(value))
+
+    return dict_values
+
+# -----------------------------------------------------------------------------
+def get_model(SIMDir):
+    """
+    Return the model of the run dir SIMDir (e.g., run005_AWSoMR/run01) from
+    key_params.txt in the simulation dir, or None if it is not found.
+    """
+
+    return runtime_model.get_keyparams(SIMDir).get('model')
+
+# -----------------------------------------------------------------------------
+def get_run_requests(SIMDirs, nNodes=40, strTime='48:00:00', nodes_model={},
+                     hours_model={}, filenameRuns='', samples=None,
+                     TargetHours=None, MaxNodes=512):
+    """
+    Return the list of the runs (dicts with the dir, the number of nodes and
+    the expected wall time in hours) of the run dirs SIMDirs. If the runs
+    done are given (samples), the number of nodes and the wall time not
+    given by nodes_model, hours_model or filenameRuns are predicted from
+    the runs done similar to each run (see runtime_model.predict) instead
+    of nNodes and strTime, and the prediction is saved in the run as well.
+
+    Arguments:
+      SIMDirs:      the run dirs, e.g., run005_AWSoMR/run01
+      nNodes:       the number of nodes of a run by default
+      strTime:      the wall time of a run by default
+      nodes_model:  the number of nodes for each model (see get_model)
+      hours_model:  the wall time in hours for each model
+      filenameRuns: a file with the run dir, the number of nodes and the
+                    wall time in each line (e.g., 'run005_AWSoM/run01 40
+                    24:00:00'), which overwrites the values above
+      samples:      the runs done, see runtime_model.get_history
+      TargetHours:  the wall time wanted to get the number of nodes
+                    predicted
+      MaxNodes:     the max number of nodes of a run predicted
+    """
+
+    runs_file = {}
+    if filenameRuns:
+        with open(filenameRuns, 'r') as file_runs:
+            for line in file_runs:
+                values = line.split()
+                if not values or values[0].startswith('#'):
+                    continue
+                runs_file[os.path.normpath(values[0])] = (
+                    int(values[1]), get_hours(values[2]))
+
+    hours = get_hours(strTime)
+
+    runs = []
+    for SIMDir in SIMDirs:
+        params = runtime_model.get_keyparams(SIMDir)
+        MODEL  = params.get('model')
+        run    = {'dir': SIMDir, 'nodes': nodes_model.get(MODEL, nNodes),
+                  'hours': hours_model.get(MODEL, hours)}
+        if samples is not None and not os.path.normpath(SIMDir) in runs_file:
+            prediction = runtime_model.predict(
+                samples, runtime_model.get_features(params),
+                nodes_model.get(MODEL), TargetHours, MaxNodes,
+                runtime_model.MAXHOURS)
+            if prediction is not None:
+                run['nodes'] = prediction['nodes']
+                if not MODEL in hours_model:
+                    run['hours'] = prediction['hours']
+                run['prediction'] = prediction
+        if os.path.normpath(SIMDir) in runs_file:
+            run['nodes'], run['hours'] = runs_file[os.path.normpath(SIMDir)]
+        runs.append(run)
+
+    return runs
+
+# -----------------------------------------------------------------------------
+def get_idle_hours(runs):
+    """
+    Return the idle node-hours of a bundle job of the runs: the nodes of
+    each run are idle from the end of the run to the end of the job.
+    """
+
+    hours = max(run['hours'] for run in runs)
+
+    return sum((hours - run['hours'])*run['nodes'] for run in runs)
 
 # -----------------------------------------------------------------------------
-def sub_one_bundle_job(SIMDirs, strJobName, strTime, nNodes):
+def pack_runs(runs, MaxNodes=512):
+    """
+    Return the list of the bundles (lists of runs) with at most MaxNodes
+    nodes each. The runs are packed into few bundles with the runs of
+    similar wall time together to reduce the idle node-hours (see
+    get_idle_hours): the runs are sorted by the wall time (the longest
+    first) and each run is added to the bundle it fits into with the least
+    increase of the idle node-hours (and the least nodes left if the same),
+    or to a new bundle if it does not fit into any bundle. No bundle is
+    empty.
+    """
+
+    for run in runs:
+        if run['nodes'] > MaxNodes:
+            raise ValueError(run['dir']+' needs '+str(run['nodes'])
+                             +' nodes, more than '+str(MaxNodes)+' per job.')
+
+    bundles = []
+    for run in sorted(runs, key=lambda run: (-run['hours'], -run['nodes'])):
+        iBundleBest = None
+        for iBundle, bundle in enumerate(bundles):
+            nodesLeft = MaxNodes - sum(run_bundle['nodes'] for run_bundle in bundle)
+            if run['nodes'] > nodesLeft:
+                continue
+            # the bundles are not shorter than the run
+            cost = ((bundle[0]['hours'] - run['hours'])*run['nodes'],
+                    nodesLeft - run['nodes'])
+            if iBundleBest is None or cost < costBest:
+                iBundleBest, costBest = iBundle, cost
+        if iBundleBest is None:
+            bundles.append([run])
+        else:
+            bundles[iBundleBest].append(run)
+
+    # keep the order of the run dirs in each bundle
+    order = {id(run): iRun for iRun, run in enumerate(runs)}
+    for bundle in bundles:
+        bundle.sort(key=lambda run: order[id(run)])
+
+    return bundles
+
+# -----------------------------------------------------------------------------
+def get_partition(nodesTotal):
+    """
+    Return the partition for a job with nodesTotal nodes.
+    """
+
+    for name, nodesMin, nodesMax in PARTITIONS:
+        if nodesMin <= nodesTotal <= nodesMax:
+            return name
+
+    raise ValueError(str(nodesTotal)+' nodes is more than the max of the '
+                     + 'partitions.')
+
+# -----------------------------------------------------------------------------
+def sub_one_bundle_job(runs, strJobName, strSbatch='sbatch', filenameQueue='',
+                       launcher='ibrun'):
+    """
+    Write the bundle job script job.strJobName for the runs (see
+    get_run_requests) and submit it with strSbatch. Each run uses its own
+    nodes, the wall time of the job is the longest wall time of the runs.
+    If filenameQueue is given, the job is a pilot job: the runs are not
+    launched by the job script, but by pilot_dispatcher.py, which takes the
+    runs from the queue shared by the jobs and launches them with launcher
+    as soon as the nodes are free.
+    """
+
+    if len(runs) == 0:
+        return
+
+    hours = max(run['hours'] for run in runs)
 
     ## header for the job script
     list_strHeader = ['#!/bin/bash','',
                       '#SBATCH -J '+strJobName,
                       '#SBATCH -o '+strJobName+'.o%j',
                       '#SBATCH -e '+strJobName+'.e%j',
-                      '#SBATCH --tasks-per-node 56',
-                      '#SBATCH -t '+strTime,
+                      '#SBATCH --tasks-per-node '+str(NTASKPERNODE),
+                      '#SBATCH -t '+get_str_time(hours),
                       '###SBATCH -A BCS21001',
                   ]
 
-    if len(SIMDirs) == 0:
-        return
-
     with open('job.'+strJobName, 'w') as file_out:
         for line in list_strHeader:
             file_out.write(line+'\n')
 
         # Total number of nodes
-        nodesTotal = nNodes*len(SIMDirs)
-        if nodesTotal > 512:
-            file_out.write('#SBATCH -p large\n')
-        else:
-            file_out.write('#SBATCH -p normal\n')
+        nodesTotal = sum(run['nodes'] for run in runs)
+        file_out.write('#SBATCH -p '+get_partition(nodesTotal)+'\n')
         file_out.write('#SBATCH -N '+str(nodesTotal)+'\n\n\n')
 
         # for stable connection
         file_out.write('export UCX_TLS="knem,rc"\n\n')
 
-        iRunLocal = 0
-        for iDir in SIMDirs:
-            file_out.write('sleep 5\n')
-            file_out.write('cd '+iDir+'\n')
-            offset = iRunLocal * nNodes*56
-            file_out.write('ibrun -o '+str(offset)
-                           + ' -n 1 ./PostProc.pl -r=180 -n=1 >& PostProc.log &\n')
-            file_out.write('( ibrun -o '+str(offset+56)
-                           +' -n '+str((nNodes-1)*56)+' SWMF.exe > runlog_`date +%y%m%d%H%M` ; touch PostProc.STOP ) &\n')
-            file_out.write('cd ../../\n')
-            iRunLocal += 1
+        if filenameQueue:
+            file_out.write('python3 '+os.path.abspath(pilot_dispatcher.__file__)
+                           +' run '+filenameQueue+' -N '+str(nodesTotal)
+                           +' -t '+'{:.4f}'.format(hours)
+                           +' --launcher "'+launcher+'"\n')
+        else:
+            offset = 0
+            for run in runs:
+                file_out.write('sleep 5\n')
+                file_out.write('cd '+run['dir']+'\n')
+                file_out.write('echo '+str(run['nodes'])+' > nodes.txt\n')
+                file_out.write('ibrun -o '+str(offset)
+                               + ' -n 1 ./PostProc.pl -r=180 -n=1 >& PostProc.log &\n')
+                file_out.write('( ibrun -o '+str(offset+NTASKPERNODE)
+                               +' -n '+str((run['nodes']-1)*NTASKPERNODE)
+                               +' SWMF.exe > runlog_`date +%y%m%d%H%M` ; touch PostProc.STOP ) &\n')
+                file_out.write('cd ../../\n')
+                offset += run['nodes']*NTASKPERNODE
 
-        file_out.write('\nwait\n')
+            file_out.write('\nwait\n')
 
-    subprocess.call('sbatch job.'+strJobName, shell=True)
+    subprocess.call(strSbatch+' job.'+strJobName, shell=True)
 
 # -----------------------------------------------------------------------------
 if __name__ == '__main__':
@@ -76,9 +284,60 @@ if __name__ == '__main__':
                             '(default:bundle)',
                             type=str, default='bundle')
     ARG_PARSER.add_argument('-t', '--strTime',
-                            help='The String for the wall time, '+
+                            help='The String for the wall time per run dir, '+
                             '(default:48:00:00)',
                             type=str, default='48:00:00')
+    ARG_PARSER.add_argument('--NodesModel',
+                            help='The number of nodes per run dir for each '+
+                            'model, e.g., AWSoM=40,AWSoMR=20, '+
+                            '(default:)',
+                            type=str, default='')
+    ARG_PARSER.add_argument('--TimeModel',
+                            help='The wall time per run dir for each model, '+
+                            'e.g., AWSoM=24:00:00,AWSoMR=8:00:00, '+
+                            '(default:)',
+                            type=str, default='')
+    ARG_PARSER.add_argument('-r', '--runs',
+                            help='A file with the run dir, the number of '+
+                            'nodes and the wall time in each line, e.g., '+
+                            'run005_AWSoM/run01 40 24:00:00, '+
+                            '(default:)',
+                            type=str, default='')
+    ARG_PARSER.add_argument('--sbatch',
+                            help='The command to submit the job scripts, '+
+                            '(default:sbatch)',
+                            type=str, default='sbatch')
+    ARG_PARSER.add_argument('-p', '--predict',
+                            help='Use if you want the number of nodes and '+
+                            'the wall time of each run dir predicted from '+
+                            'the runs done in Results with the same model, '+
+                            'PARAM template and AMR settings (see '+
+                            'runtime_model.py) instead of -n and -t, '+
+                            '(default:0)',
+                            type=int, default=0)
+    ARG_PARSER.add_argument('--TargetHours',
+                            help='The wall time wanted per run dir to get '+
+                            'the number of nodes predicted, '+
+                            '(default: the nodes of the runs done)',
+                            type=float, default=None)
+    ARG_PARSER.add_argument('--db',
+                            help='The catalog of the runs done, '+
+                            '(default:'+runtime_model.results_catalog.FILENAMEDB+')',
+                            type=str, default=runtime_model.results_catalog.FILENAMEDB)
+    ARG_PARSER.add_argument('--pilot',
+                            help='Use if you want pilot jobs: the run dirs '+
+                            'are written into the queue file queue.strJob '+
+                            'shared by the jobs, and each job launches the '+
+                            'next run dir in the queue as soon as enough '+
+                            'nodes are free, see pilot_dispatcher.py, '+
+                            '(default:0)',
+                            type=int, default=0)
+    ARG_PARSER.add_argument('--launcher',
+                            help='The command to launch the programs on the '+
+                            'nodes in the pilot jobs, e.g., '+
+                            '"python3 $PWD/Scripts/ibrun_local.py" for testing, '+
+                            '(default:ibrun)',
+                            type=str, default='ibrun')
     ARGS = ARG_PARSER.parse_args()
 
     list_RunIDs = []
@@ -113,22 +372,54 @@ if __name__ == '__main__':
         SIMDirs = glob.glob('run*/run*')
         SIMDirs = sorted(SIMDirs)
 
-    # see if it fits into only one job script
-    if (len(SIMDirs)*ARGS.nodes)/ARGS.MaxNodes > 1:
-        # number of runs per job script
-        nRunPerScript = np.floor(ARGS.MaxNodes/ARGS.nodes)
+    samples = runtime_model.get_history(ARGS.db) if ARGS.predict else None
 
-        # number of job scripts
-        nScript = np.floor(len(SIMDirs)/nRunPerScript) + 1
+    runs = get_run_requests(SIMDirs, ARGS.nodes, ARGS.strTime,
+                            get_dict_values(ARGS.NodesModel),
+                            get_dict_values(ARGS.TimeModel, DoUseHours=True),
+                            ARGS.runs, samples, ARGS.TargetHours,
+                            ARGS.MaxNodes)
 
-        iScript = 0
-        while iScript < nScript:
-            # the the list of IDs within the script
-            iStart = int( iScript   *nRunPerScript)
-            iEnd   = int((iScript+1)*nRunPerScript)
-            SIMDirsLocal = SIMDirs[iStart:iEnd]
+    for run in runs:
+        if 'prediction' in run:
+            print(run['dir']+': '+str(run['nodes'])+' nodes, '
+                  +get_str_time(run['hours'])+' (from '
+                  +str(run['prediction']['nsample'])+' runs with the same '
+                  +run['prediction']['level']+')')
+        elif ARGS.predict:
+            print(run['dir']+': '+str(run['nodes'])+' nodes, '
+                  +get_str_time(run['hours'])+' (no similar run done)')
 
-            sub_one_bundle_job(SIMDirsLocal, ARGS.strJob+str(iScript).zfill(2), ARGS.strTime, ARGS.nodes)
-            iScript +=  1
-    else:
-        sub_one_bundle_job(SIMDirs, ARGS.strJob, ARGS.strTime, ARGS.nodes)
+    for run in runs:
+        if run['hours'] > MAXHOURS:
+            sys.exit(run['dir']+': the wall time '+get_str_time(run['hours'])
+                     +' is more than '+str(MAXHOURS)+' hours.')
+
+    try:
+        bundles = pack_runs(runs, ARGS.MaxNodes)
+    except ValueError as error:
+        sys.exit(str(error))
+
+    filenameQueue = ''
+    if ARGS.pilot:
+        # the longest runs first, the same as in the bundles
+        filenameQueue = 'queue.'+ARGS.strJob
+        pilot_dispatcher.write_queue(
+            filenameQueue, sorted(runs, key=lambda run: (-run['hours'],
+                                                         -run['nodes'])))
+
+    for iBundle, bundle in enumerate(bundles):
+        if len(bundles) == 1:
+            strJobName = ARGS.strJob
+        else:
+            strJobName = ARGS.strJob+str(iBundle).zfill(2)
+        print('job.'+strJobName+': '+str(len(bundle))+' run dirs, '
+              +str(sum(run['nodes'] for run in bundle))+' nodes, '
+              +get_str_time(max(run['hours'] for run in bundle))+', '
+              +'{:.1f}'.format(get_idle_hours(bundle))+' idle node-hours')
+        sub_one_bundle_job(bundle, strJobName, ARGS.sbatch, filenameQueue,
+                           ARGS.launcher)
+
+    if ARGS.pilot:
+        print('The run dirs not run are left in '+filenameQueue+', see '
+              +filenameQueue+'.log for the run dirs done.')
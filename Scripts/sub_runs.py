@@ -2,16 +2,30 @@
 
 import sys
 import array
+import artifact_store
 import change_param
+import concurrent.futures
+import contextlib
 import change_awsom_param
+import check_param
+import compile_cache
+import results_index
+import sub_array_job
+import run_journal
 import subprocess
 import argparse
 import os
 import warnings
 import re
 import glob
+import functools
+import hashlib
+import itertools
+import json
 import shutil
 import shlex
+import tempfile
+import time
 
 # -----------------------------------------------------------------------------
 def set_dict_params(list_params,NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations):
@@ -42,6 +56,8 @@ def set_dict_params(list_params,NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRea
             SCHEME = int(paramTmp[1])
         elif paramTmp[0].lower() == 'param':
             PARAM  = paramTmp[1]
+        elif paramTmp[0].lower() == 'stop':
+            NewParam['stop'] = int(paramTmp[1])
         elif paramTmp[0].lower() == 'realization':
             strTmp  = paramTmp[1][1:-1]
             ListRealizationTmp = strTmp.split(',')
@@ -63,7 +79,7 @@ def set_dict_params(list_params,NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRea
             ListStrRealizations = [str(iRealztion)
                                    for iRealztion in REALIZATIONS]
             strRealizations = ",".join(ListStrRealizations)
-        elif paramTmp[0].lower() == 'realizations' or paramTmp[0].lower() == 'restartdir':
+        elif paramTmp[0].lower() in ['realizations', 'restartdir', 'fingerprint']:
             continue
         elif paramTmp[0] == 'add' or paramTmp[0] == 'rm':
             if not paramTmp[0] in NewParam.keys():
@@ -87,34 +103,932 @@ def set_dict_params(list_params,NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRea
 
 # -----------------------------------------------------------------------------
 def set_restart_params(RestartDirIn,NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations):
-    # use patten search to find, RestartDirIn does not need to be the full name
-    filenameKeyparams = glob.glob('Results/' + RestartDirIn+'*/key_params.txt')[0]
-    with open(filenameKeyparams, 'r') as file_keyparams:
-        lines_keyparams = list(file_keyparams)
-
-    for iLine, line in enumerate(lines_keyparams):
-        # remove the /n in the .txt file...
-        lines_keyparams[iLine] = line.strip()
+    # RestartDirIn does not need to be the full name, the restart chain is
+    # found from the index of Results (see results_index)
+    chain = results_index.get_restart_chain(RestartDirIn)
+    entries = results_index.get_index()
+
+    # set the params based on the key_params.txt, starting from the first
+    # run of the restart chain
+    for name in reversed(chain):
+        NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations = \
+            set_dict_params(entries[name]['keyparams'],NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations)
+
         # the string for the realizations is saved...
-        if 'realizations' in line.lower():
-            strRealizationsRestart = line.strip().split('=')[1]
-        else:
-            strRealizationsRestart = ''
-        if 'restartdir' in line.lower():
+        if entries[name]['realizations'].strip():
+            strRealizations = entries[name]['realizations']
+
+    return NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations
+    
+# -----------------------------------------------------------------------------
+def get_normalized_value(value):
+    """
+    Return the parameter value in a canonical form, so that, e.g., 1e6,
+    1.0e6, 1.0d6 and 1000000 are the same number and T and .true. are the
+    same logical.
+    """
+
+    try:
+        return repr(float(value.lower().replace('d','e')))
+    except ValueError:
+        pass
+
+    if value.lower() in ['t', '.true.', 'true']:
+        return 'T'
+    if value.lower() in ['f', '.false.', 'false']:
+        return 'F'
+
+    return value
+
+# -----------------------------------------------------------------------------
+def get_realizations(strRealizations):
+    """
+    Return the sorted list of the realizations (integers) in
+    strRealizations, e.g., '1,2,3'.
+    """
+
+    return sorted(int(strRealization)
+                  for strRealization in strRealizations.split(',')
+                  if strRealization.strip())
+
+# -----------------------------------------------------------------------------
+def get_fingerprint(param_files, PFSS, filename_map, MODEL, strRealizations,
+                    RestartDir=''):
+    """
+    Return the fingerprint (SHA-256) of the effective configuration of a run.
+
+    It is computed from the active commands of PARAM.in and the input file
+    of the PFSS solver (see ParamFile.get_effective_param) with normalized
+    values, the content of the map, PFSS, MODEL, the realizations and the
+    restart dir. Comments, inactive commands, the layout of the file and
+    #DESCRIPTION do not change the fingerprint.
+    """
+
+    hash_config = hashlib.sha256()
+
+    for filename in ['PARAM.in', PFSS+'.in']:
+        effective = param_files[filename].get_effective_param()
+        for iSession, session in enumerate(effective.sessions):
+            for comp in sorted(session.keys()):
+                for NameCommand, values in session[comp]:
+                    if NameCommand == 'DESCRIPTION':
+                        continue
+                    hash_config.update(repr(
+                        (filename, iSession, comp, NameCommand,
+                         [get_normalized_value(value) for value in values])
+                        ).encode())
+
+    realizations = get_realizations(strRealizations)
+
+    hash_config.update(repr(
+        ('map', artifact_store.get_file_hash(filename_map), 'pfss', PFSS, 'model', MODEL,
+         'realizations', realizations, 'restartdir', RestartDir)).encode())
+
+    return hash_config.hexdigest()
+
+# -----------------------------------------------------------------------------
+def get_fingerprint_index(dirResults='Results'):
+    """
+    Return a dict with the fingerprint (the fingerprint= line in
+    key_params.txt) as the key and the dir as the value for all the dirs in
+    dirResults (see results_index).
+    """
+
+    return results_index.get_fingerprints(dirResults)
+
+# -----------------------------------------------------------------------------
+def get_sweep_values(value):
+    """
+    Return the list of the values (strings) of the sweep expression value:
+    {a:b:n} for n values evenly spaced from a to b, or {a,b,c} for the
+    values a, b and c (the commas inside [] are not separators, e.g.,
+    {[5e5],[6e5]}). Return None if value is not a sweep expression.
+    """
+
+    if not (value.startswith('{') and value.endswith('}')):
+        return None
+
+    strSweep = value[1:-1]
+
+    if ':' in strSweep and not ',' in strSweep:
+        try:
+            strStart, strEnd, strN = strSweep.split(':')
+            start, end, nValue = float(strStart), float(strEnd), int(strN)
+        except ValueError:
+            raise ValueError(value+': wrong format, should be {start:end:n}.')
+        if nValue < 1:
+            raise ValueError(value+': the number of values must be positive.')
+        if nValue == 1:
+            return ['{:.10g}'.format(start)]
+        return ['{:.10g}'.format(start + (end - start)*i/(nValue - 1))
+                for i in range(nValue)]
+
+    return [strValue.strip() for strValue in re.split(r',(?![^\[]*\])', strSweep)]
+
+# -----------------------------------------------------------------------------
+def expand_params(params):
+    """
+    Yield the string for the sweep index (e.g., '003', '' if there is no
+    sweep expression) and the params of each run of params, a line in the
+    param list, with the sweep expressions (see get_sweep_values) replaced
+    by the values of the run. The runs are the cartesian product of the
+    values of all the sweep expressions, they are created one at a time.
+    """
+
+    values_I = []
+    for iParam, param in enumerate(params[1:], 1):
+        name, IsFound, value = param.partition('=')
+        values = get_sweep_values(value) if IsFound else None
+        if values is not None:
+            values_I.append((iParam, name, values))
+
+    if not values_I:
+        yield '', params
+        return
+
+    nRun = 1
+    for iParam, name, values in values_I:
+        nRun *= len(values)
+    nDigit = max(3, len(str(nRun)))
+
+    for iRun, values_run in enumerate(
+            itertools.product(*[values for iParam, name, values in values_I]), 1):
+        params_run = list(params)
+        for (iParam, name, values), value in zip(values_I, values_run):
+            params_run[iParam] = name+'='+value
+        yield str(iRun).zfill(nDigit), params_run
+
+# -----------------------------------------------------------------------------
+def get_selected_params(params_I, RunIDs):
+    """
+    Yield the string for the sweep index and the params of each run of the
+    lines params_I of the param list with the run ID in RunIDs (see
+    expand_params).
+    """
+
+    for params in params_I:
+        if params[0] in RunIDs:
+            yield from expand_params(params)
+
+# -----------------------------------------------------------------------------
+def get_run(params, ThresholdBrPoynting=-1.0, strSweep=''):
+    """
+    Return a dict with the settings of the run from params, a line in the
+    param list (the run ID followed by the params), and the restart dir if
+    any. strSweep is the sweep index of the run (see expand_params), added
+    to SIMDIR. Return None if BrFactor*PoyntingFluxPerBSi is larger than
+    ThresholdBrPoynting (if positive).
+    """
+
+    RunID = params[0]
+
+    # reset all the default values
+    MAP   = 'NoMap'
+    PFSS  = 'HARMONICS'
+    TIME  = 'MapTime'
+    MODEL = 'AWSoM'
+    PARAM = 'Default'
+    SCHEME= 2
+    DoRestart  = 0
+    RestartDir = ''
+
+    NewParam        = {}
+    strRealizations = ''
+
+    # check whether restartdir exists, if yes, set the params first.
+    for param in params[1:]:
+        if 'restartdir=' in param.lower():
+            DoRestart   = 1
             # remove /n with strip() and then RestartDir is the second element after split
-            RestartDirLocal  = line.strip().split('=')[1]
+            RestartDir  = param.strip().split('=')[1]
             NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations = \
-                set_restart_params(RestartDirLocal, NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations)
+                set_restart_params(RestartDir,NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations)
 
-    # set the params based on the key_params.txt
+    # the actual param starts from the 2nd element
     NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations = \
-        set_dict_params(lines_keyparams,NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations)
+        set_dict_params(params[1:],NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations)
 
-    if strRealizationsRestart.strip():
-        strRealizations=strRealizationsRestart
+    if ThresholdBrPoynting > 0:
+        BrFactor_local     = float(NewParam['change']['BrFactor'])
+        PoyntingFlux_local = float(NewParam['change']['PoyntingFluxPerBSi'])
+        if BrFactor_local*PoyntingFlux_local > ThresholdBrPoynting:
+            warnings.warn('For run ID: '+str(RunID).zfill(3) + '\n'
+                          +'BrFactor           ='+str(BrFactor_local)           + '\n'
+                          +'PoyntingFluxPerBSi ='+str(PoyntingFlux_local) + '\n'
+                          +'BrFactor*PoyntingFluxPerBSi ='+str(BrFactor_local*PoyntingFlux_local) + '\n'
+                          +'BrFactor*PoyntingFluxPerBSi >'+str(ThresholdBrPoynting))
+            return None
+
+    SIMDIR = ('run' + str(RunID).zfill(3) + '_' + MODEL)
+    if strSweep:
+        SIMDIR = ('run' + str(RunID).zfill(3) + '_s' + strSweep + '_' + MODEL)
+
+    if DoRestart:
+        SIMDIR = SIMDIR+'_restart_'+RestartDir.replace('/','_')
+
+    return {'RunID': RunID, 'params': params, 'MAP': MAP, 'PFSS': PFSS,
+            'TIME': TIME, 'MODEL': MODEL, 'PARAM': PARAM, 'SCHEME': SCHEME,
+            'DoRestart': DoRestart, 'RestartDir': RestartDir,
+            'NewParam': NewParam, 'strRealizations': strRealizations,
+            'SIMDIR': SIMDIR, 'SweepID': strSweep}
+
+# -----------------------------------------------------------------------------
+def link_restart_ih(SIMDIR, RestartDir):
+    """
+    Link the IH restart files of Results/RestartDir to Results/SIMDIR.
+    """
+
+    # check if the SIMDIR exists in Results
+    if os.path.isdir('Results/'+SIMDIR):
+        for dirTmp in os.listdir('Results/'+SIMDIR):
+            if os.path.isdir(os.path.join('Results/'+SIMDIR, dirTmp)):
+                linkSrc = os.path.join(os.getcwd(), 'Results/'+RestartDir, dirTmp, 'RESTART/IH')
+                linkDst = os.path.join(os.getcwd(), 'Results/'+SIMDIR,     dirTmp, 'RESTART/IH')
+                # check whether the IH restart files is linked or not, if yes, remove the link first.
+                if os.path.islink(linkDst):
+                    os.unlink(linkDst)
+                os.symlink(linkSrc, linkDst)
+                print('Created link from '+ linkSrc  + ' to ' + linkDst)
+    else:
+        print('Results/'+SIMDIR+' does not exist!!!!')
+
+# -----------------------------------------------------------------------------
+def set_run_files(run, DoUseMarker=1, DoCheckParam=1, DictFingerprint=None):
+    """
+    Create the PARAM.in, HARMONICS.in and FDIPS.in files of the run in memory
+    and save them with the name of the map and the fingerprint into the dict
+    run. Return False if the run should be skipped (the reason is saved as
+    run['skip']): the same configuration is found in DictFingerprint (if
+    not None, the fingerprint of the run is added otherwise) or there are
+    errors in the files (if DoCheckParam).
+    """
+
+    # create the PARAM.in, HARMONICS.in and FDIPS.in files in memory
+    # from the (cached) templates in Param, the map is downloaded if
+    # needed
+    param_files, filename_map = change_awsom_param.get_param_files(
+        time=run['TIME'], map=run['MAP'], pfss=run['PFSS'],
+        new_params=run['NewParam'], scheme=run['SCHEME'],
+        DoUseMarker=DoUseMarker, DoRestart=run['DoRestart'],
+        model=run['MODEL'], param=run['PARAM'])
+
+    # skip the run if the same configuration is already done
+    fingerprint = get_fingerprint(param_files, run['PFSS'], filename_map,
+                                  run['MODEL'], run['strRealizations'],
+                                  run['RestartDir'])
+    run['fingerprint'] = fingerprint
+
+    if DictFingerprint is not None:
+        if fingerprint in DictFingerprint:
+            run['skip'] = ('the same configuration is found in '
+                           +DictFingerprint[fingerprint])
+            warnings.warn('For run ID: '+str(run['RunID']).zfill(3) + '\n'
+                          +run['skip']+', skip it.')
+            return False
+        DictFingerprint[fingerprint] = run['SIMDIR']
+
+    # check the structure of the files before anything is compiled
+    # or submitted
+    if DoCheckParam:
+        if not check_param.check_param_files(param_files, run['PFSS']):
+            run['skip'] = 'errors are found in the param files'
+            warnings.warn('For run ID: '+str(run['RunID']).zfill(3) + '\n'
+                          +run['skip']+', skip it.')
+            return False
+
+    run['param_files']  = param_files
+    run['filename_map'] = filename_map
+
+    return True
+
+# -----------------------------------------------------------------------------
+def compile_models(models, DoCompile=1, DoUseCache=1, filenameJournal='',
+                   models_done=(), DoInstall=True):
+    """
+    Compile the code for each model in models (in the order of the first
+    appearance). The code is re-installed for the first model compiled if
+    DoInstall. If DoCompile is 0, only the models without
+    SWMF/bin/MODEL.exe are compiled, otherwise the first model is always
+    compiled. If DoUseCache, the executables compiled before with the same
+    options of Config.pl and the same SWMF source are used (see
+    compile_cache) instead of compiling the code, and the SWMF is only
+    configured for the model ('make configure') as the run dirs are created
+    from it. The compilation is recorded in filenameJournal (see
+    run_journal) and the models in models_done are not compiled again
+    (only configured) if SWMF/bin/MODEL.exe exists.
+    Return whether the code still needs to be re-installed, i.e., no model
+    is compiled.
+    """
+
+    for MODEL in sorted(set(models), key=models.index):
+        # Compile the code if needed. AWSoM and AWSoM-R could not be
+        # selected at the same time
+        if not MODEL in ['AWSoM','AWSoMR','AWSoM2T','AWSoMR_SOFIE']:
+            warnings.warn(MODEL+' may not be supported.')
+
+        # If the corresponding MODEL.exe does not exist, need to re-compile the code.
+        # If it exists, do not change DoCompile, which default is 1 (to re-compile
+        # the code for the first time when running the event list). However, the user
+        # may still set it to 0, in which case the code will not be re-compiled.
+        if not os.path.isfile('SWMF/bin/'+MODEL+'.exe'):
+            DoCompile = 1
+        elif MODEL in models_done:
+            print('--------------------')
+            print('model = '+MODEL+' is compiled already (see the journal)')
+            print('--------------------')
+            subprocess.run('make configure MODEL='+MODEL, shell=True, check=True)
+            continue
+
+        if DoCompile and DoUseCache and compile_cache.restore(MODEL):
+            print('--------------------')
+            print('found model = '+MODEL+' in the compile cache')
+            print('--------------------')
+            subprocess.run('make configure MODEL='+MODEL, shell=True, check=True)
+        elif DoCompile:
+            print('--------------------')
+            print('working on '+MODEL)
+            print('--------------------')
+            strCacheMake = ' USECACHE=T' if DoUseCache else ' USECACHE=F'
+            with run_journal.journal_stage(filenameJournal, 'compile', model=MODEL):
+                if DoInstall:
+                    subprocess.run('make compile DOINSTALL=T MODEL='+MODEL
+                                   +strCacheMake, shell=True, check=True)
+                else:
+                    subprocess.run('make compile DOINSTALL=F MODEL='+MODEL
+                                   +strCacheMake, shell=True, check=True)
+            DoInstall = False
+        else:
+            print('--------------------')
+            print('no need to re-compile model = '+MODEL)
+            print('--------------------')
+
+        # The code is compiled already, may not need to re-compile next time.
+        DoCompile = 0
+
+    return DoInstall
+
+# -----------------------------------------------------------------------------
+def get_journal_entry(run):
+    """
+    Return a dict with the info of the run recorded in the journal for
+    each stage (see run_journal).
+    """
+
+    return {'simdir': run['SIMDIR'], 'fingerprint': run['fingerprint'],
+            'runid': run['RunID'], 'model': run['MODEL'],
+            'nrealizations': len(get_realizations(run['strRealizations']))}
+
+# -----------------------------------------------------------------------------
+def prepare_run(run):
+    """
+    Create the run dirs of the run (see get_run and set_run_files): backup
+    the previous run dirs, write the param files and the maps into a
+    staging dir, create the run dir of each realization, write
+    key_params.txt and link the restart files. The code must be compiled
+    for the model. Runs with different SIMDIR can be prepared at the same
+    time (e.g., in different processes).
+
+    Each stage ('backup', 'rundir' and 'restart') is recorded in the journal
+    run['journal'] (if any, see run_journal) and the stages in
+    run['stages_done'] (if any) are skipped.
+    """
+
+    SIMDIR          = run['SIMDIR']
+    MODEL           = run['MODEL']
+    PFSS            = run['PFSS']
+    RestartDir      = run['RestartDir']
+    strRealizations = run['strRealizations']
+
+    strPfssMake  ='PFSS='+PFSS
+
+    strRealizationsMake = 'REALIZATIONS='+strRealizations
+
+    strSimDirMake = 'SIMDIR='+SIMDIR
+
+    filenameJournal = run.get('journal', '')
+    stages_done     = run.get('stages_done', set())
+    entry = get_journal_entry(run)
+
+    # backup previous results if needed. It must not be done again once
+    # the run dirs are created, or the previous results are removed.
+    if not 'backup' in stages_done:
+        with run_journal.journal_stage(filenameJournal, 'backup', **entry):
+            strbackup_run = 'make backup_run ' + strSimDirMake
+            subprocess.run(strbackup_run, shell=True, check=True)
+
+    if not 'rundir' in stages_done:
+        with run_journal.journal_stage(filenameJournal, 'rundir', **entry):
+            # write the PARAM.in, HARMONICS.in and FDIPS.in files and prepare
+            # each realization map in a staging dir used only by this run,
+            # so that several runs can be prepared at the same time
+            os.makedirs('.stage', exist_ok=True)
+            dirStage = tempfile.mkdtemp(prefix=SIMDIR+'_',
+                                        dir=os.path.abspath('.stage'))
+            # the staging dir with the PARAM.in, HARMONICS.in, FDIPS.in and
+            # map_*.out files is removed even if the stage fails
+            try:
+                change_awsom_param.write_param_files(run['param_files'], dirStage)
+                change_awsom_param.remap_magnetogram(run['filename_map'], dirStage)
+
+                # make run directories
+                strRun_dir = ('make rundir_realizations ' + strSimDirMake + ' '
+                              + strRealizationsMake + ' ' + strPfssMake + ' MODEL=' + MODEL
+                              + ' STAGEDIR=' + dirStage)
+                subprocess.run(strRun_dir, shell=True, check=True)
+
+                file_output = open(SIMDIR+'/key_params.txt', 'w')
+                file_output.write('model='+MODEL+'\n')
+                for param in run['params'][1:]:
+                    if not 'realization' in param and not 'model' in param:
+                        file_output.write(str(param)+'\n')
+                file_output.write('realizations='+strRealizations+'\n')
+                file_output.write('fingerprint='+run['fingerprint']+'\n')
+                file_output.close()
+            finally:
+                shutil.rmtree(dirStage, ignore_errors=True)
+
+    if run['DoRestart'] and not 'restart' in stages_done:
+        with run_journal.journal_stage(filenameJournal, 'restart', **entry):
+            link_restart(SIMDIR, RestartDir, strRealizations)
+
+# -----------------------------------------------------------------------------
+def link_restart_realization(dirRealization, RestartDirFull):
+    """
+    Link the restart files in RestartDirFull (the RESTART dir of a
+    realization in Results) to the run dir dirRealization with Restart.pl
+    and share fdips_bxyz.out/harmonics_bxyz.out of the previous run with
+    the run dir (see artifact_store.share_file). Return the output of
+    Restart.pl and whether it succeeded.
+    """
+
+    strLinkRestart = './Restart.pl -v -i ' + RestartDirFull
+    process = subprocess.run(strLinkRestart, shell=True, cwd=dirRealization,
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                             text=True)
+    if process.returncode != 0:
+        print('Restart.pl failed in '+dirRealization)
+
+    # the field files are not changed by the restart run, so they are not
+    # copied
+    for filename in ['fdips_bxyz.out', 'harmonics_bxyz.out']:
+        if os.path.exists(RestartDirFull+'/../'+filename):
+            artifact_store.share_file(RestartDirFull+'/../'+filename,
+                                      dirRealization+'/SC/')
+
+    return process.stdout, process.returncode == 0
+
+# -----------------------------------------------------------------------------
+def link_restart(SIMDIR, RestartDir, strRealizations, nJobs=4):
+    """
+    Link the restart files of the realizations in Results/RestartDir* to
+    the run dirs in SIMDIR (see link_restart_realization), in a pool of
+    nJobs threads. A RuntimeError is raised after all the realizations are
+    linked if Restart.pl failed in one of them.
+    """
+
+    dirRealization_I = []
+    RestartDirFull_I = []
+    listRealizations = strRealizations.split(',')
+    # only consider the current realization list
+    for iRealization in listRealizations:
+        StrRealizationLocal=str(int(iRealization)).zfill(2)
+        # the realiztion dir in SIMDIR
+        dirRealization = SIMDIR+'/run'+StrRealizationLocal
+        RestartDirFull = results_index.get_restart_dir(RestartDir,
+                                                       StrRealizationLocal)
+        if RestartDirFull is not None:
+            dirRealization_I.append(dirRealization)
+            RestartDirFull_I.append(RestartDirFull)
+
+    dirsFailed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=nJobs) as executor:
+        # the output is printed in the order of the realizations
+        for dirRealization, (strOutput, IsLinked) in zip(
+                dirRealization_I, executor.map(link_restart_realization,
+                                               dirRealization_I,
+                                               RestartDirFull_I)):
+            print(strOutput, end='')
+            if not IsLinked:
+                dirsFailed.append(dirRealization)
+
+    if dirsFailed:
+        raise RuntimeError('Restart.pl failed in '+', '.join(dirsFailed))
+
+# -----------------------------------------------------------------------------
+def submit_run(run):
+    """
+    Submit the jobs of the run prepared by prepare_run, one realization at
+    a time with make run. The submission is recorded in the journal
+    run['journal'] (if any): each realization submitted is recorded
+    ('submitted'), so that it is not submitted again by --resume even if
+    another realization fails, and the realizations in run['submitted']
+    (if any) are skipped. A RuntimeError is raised (the stage is failed)
+    after all the realizations are tried if one of them fails.
+    """
+
+    filenameJournal = run.get('journal', '')
+    entry = get_journal_entry(run)
+
+    with run_journal.journal_stage(filenameJournal, 'submit', **entry):
+        realizations_failed = []
+        for iRealization in get_realizations(run['strRealizations']):
+            if iRealization in run.get('submitted', ()):
+                continue
+            strRun = ('make run PFSS=' + run['PFSS'] + ' SIMDIR=' + run['SIMDIR']
+                      + ' REALIZATIONS=' + str(iRealization)
+                      + ' JOBNAME=r'+str(run['RunID']).zfill(2)+'_')
+            if subprocess.run(strRun, shell=True).returncode != 0:
+                realizations_failed.append(iRealization)
+            elif filenameJournal:
+                run_journal.write_entry(filenameJournal, stage='submit',
+                                        status='submitted',
+                                        realization=iRealization, **entry)
+        if realizations_failed:
+            raise RuntimeError('failed to submit the realizations '
+                               + ','.join(str(iRealization) for iRealization
+                                          in realizations_failed)
+                               + ' of '+run['SIMDIR'])
+
+# -----------------------------------------------------------------------------
+def submit_array_runs(runs, MaxRunning=0):
+    """
+    Submit the jobs of the runs prepared by prepare_run in job arrays (see
+    sub_array_job.sub_array_jobs) instead of one job per realization with
+    make run. The realizations in run['submitted'] (if any) are skipped.
+    The submission is recorded in the journal run['journal'] (if any) of
+    each run: each realization in an array submitted is recorded
+    ('submitted'), and the stage of a run is failed only if one of its
+    realizations is not submitted (e.g., its array failed). A RuntimeError
+    is raised after all the runs are recorded if a run failed.
+    """
+
+    # the run of each run dir, to record the arrays of each run
+    run_dir = {}
+    for run in runs:
+        for iRealization in get_realizations(run['strRealizations']):
+            if iRealization in run.get('submitted', ()):
+                continue
+            run_dir[os.path.join(run['SIMDIR'],
+                                 'run'+str(iRealization).zfill(2))] = \
+                (run, iRealization)
+
+    for run in runs:
+        if run.get('journal', ''):
+            run_journal.write_entry(run['journal'], stage='submit',
+                                    status='start', **get_journal_entry(run))
+    tStart = time.time()
+
+    # the run dirs not in an array submitted (e.g., the array failed, the
+    # job script is not found or MACHINE is not supported) are failed
+    dirs_failed = set(run_dir)
+    arrays = []
+    try:
+        arrays = sub_array_job.sub_array_jobs(list(run_dir), get_machine(),
+                                              MaxRunning=MaxRunning)
+    finally:
+        for name, jobID, dirs_array in arrays:
+            if jobID is None:
+                continue
+            for dirRun in dirs_array:
+                dirs_failed.discard(dirRun)
+                run, iRealization = run_dir[dirRun]
+                if run.get('journal', ''):
+                    run_journal.write_entry(run['journal'], stage='submit',
+                                            status='submitted',
+                                            realization=iRealization,
+                                            jobid=jobID,
+                                            **get_journal_entry(run))
+
+        simdirs_failed = {run_dir[dirRun][0]['SIMDIR'] for dirRun in dirs_failed}
+        for run in runs:
+            if run.get('journal', ''):
+                run_journal.write_entry(
+                    run['journal'], stage='submit',
+                    status='failed' if run['SIMDIR'] in simdirs_failed else 'done',
+                    seconds=round(time.time()-tStart, 3), **get_journal_entry(run))
+
+    if simdirs_failed:
+        raise RuntimeError('failed to submit the job arrays of '
+                           + ', '.join(sorted(simdirs_failed))+'.')
+
+# -----------------------------------------------------------------------------
+def get_runs(params_I, RunIDs, ARGS, StagesDone, Submitted=None):
+    """
+    Yield the runs (see get_run and set_run_files) to be prepared of the
+    lines params_I of the param list with the run ID in RunIDs, one at a
+    time. The runs skipped by set_run_files, the runs failed to be set
+    (with a warning) and the runs with all the stages found in StagesDone
+    (see run_journal.get_stages_done) are not yielded. The realizations
+    submitted already (see run_journal.get_realizations_submitted) of the
+    runs with the run dirs created are in run['submitted'].
+    """
+
+    # the fingerprints of the runs in Results, read when it is needed
+    DictFingerprint = None
+
+    for strSweep, params in get_selected_params(params_I, RunIDs):
+        # a run that cannot be rendered (e.g., a param not found in the
+        # template) is skipped, the other runs are still prepared
+        try:
+            run = get_run(params, ARGS.ThresholdBrPoynting, strSweep)
+            if run is None:
+                continue
+
+            if ARGS.DoSkipDuplicate and DictFingerprint is None:
+                DictFingerprint = get_fingerprint_index()
+
+            if not set_run_files(run, ARGS.DoUseMarker, ARGS.DoCheckParam,
+                                 DictFingerprint if ARGS.DoSkipDuplicate else None):
+                continue
+        except Exception as error:
+            warnings.warn('For run ID: '+str(params[0]).zfill(3)
+                          + (' ('+strSweep+')' if strSweep else '') + '\n'
+                          +'failed to set the files: '+str(error)
+                          +', skipped.')
+            continue
+
+        run['journal']     = ARGS.journal
+        run['stages_done'] = StagesDone.get(
+            (run['SIMDIR'], run['fingerprint']), set())
+        run['submitted']   = (Submitted or {}).get(
+            (run['SIMDIR'], run['fingerprint']), set()) \
+            if 'rundir' in run['stages_done'] else set()
+
+        # skip the run if all the stages are done
+        stages = ['backup', 'rundir']
+        if run['DoRestart']:
+            stages.append('restart')
+        if ARGS.DoSubRun:
+            stages.append('submit')
+        if run['stages_done'].issuperset(stages):
+            print('All the stages of '+run['SIMDIR']+' are done '
+                  +'(see '+ARGS.journal+'), skip it.')
+            continue
+
+        print('--------------------')
+        print('preparing '+run['SIMDIR'])
+        print('--------------------')
+
+        yield run
+
+# -----------------------------------------------------------------------------
+def submit_prepared_run(prepare, run, DoSubRun=1, runs_array=None):
+    """
+    Submit the run (if DoSubRun) after it is prepared by prepare (e.g.,
+    the result of the future of prepare_run with --jobs > 1, or prepare_run
+    itself), unless preparing it failed or it is submitted already. The run
+    is added to runs_array instead if it is not None, to be submitted in
+    job arrays later (see submit_array_runs). A run failed to be prepared
+    or submitted is reported with a warning, the other runs are still
+    prepared and submitted.
+    """
+
+    try:
+        prepare()
+    except Exception as error:
+        warnings.warn('For run ID: '+str(run['RunID']).zfill(3) + '\n'
+                      +'failed to prepare '+run['SIMDIR']+': '
+                      +str(error)+', not submitted.')
+        return
+
+    if DoSubRun and not 'submit' in run['stages_done']:
+        if runs_array is None:
+            try:
+                submit_run(run)
+            except Exception as error:
+                warnings.warn('For run ID: '+str(run['RunID']).zfill(3) + '\n'
+                              +'failed to submit '+run['SIMDIR']+': '
+                              +str(error))
+        else:
+            runs_array.append(run)
+
+# -----------------------------------------------------------------------------
+def wait_prepared_runs(future_run, nRun=0, DoSubRun=1, runs_array=None):
+    """
+    Wait for the runs being prepared in future_run (a dict with the futures
+    of prepare_run as the keys and the runs as the values) and submit them
+    (see submit_prepared_run) until at most nRun runs are left.
+    """
+
+    while len(future_run) > nRun:
+        futures_done, _ = concurrent.futures.wait(
+            future_run, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in futures_done:
+            submit_prepared_run(future.result, future_run.pop(future),
+                                DoSubRun, runs_array)
+
+# -----------------------------------------------------------------------------
+def get_machine(dirSWMF='SWMF'):
+    """
+    Return the MACHINE set in dirSWMF/Makefile.def, or '' if it is not set.
+    """
+
+    filenameDef = os.path.join(dirSWMF, 'Makefile.def')
+    MACHINE = ''
+
+    if os.path.isfile(filenameDef):
+        with open(filenameDef, 'r') as file_def:
+            for line in file_def:
+                match = re.match(r'\s*MACHINE\s*[:?]?=\s*(\S+)', line)
+                if match:
+                    MACHINE = match.group(1)
+
+    return MACHINE
+
+# -----------------------------------------------------------------------------
+def get_hours(strTime):
+    """
+    Return the hours of the wall time strTime: [days-]hours[:minutes[:seconds]].
+    """
+
+    days = 0
+    if '-' in strTime:
+        strDays, strTime = strTime.split('-', 1)
+        days = int(strDays)
+
+    return 24*days + sum(float(value)/60**i
+                         for i, value in enumerate(strTime.split(':')))
+
+# -----------------------------------------------------------------------------
+def get_job_resources(PFSS, MACHINE):
+    """
+    Return the number of nodes and the wall time (in hours) requested by the
+    job script JobScripts/job.PFSS.MACHINE (SLURM or PBS) of a realization.
+    None is returned for the values not found.
+    """
+
+    filenameJob = os.path.join('JobScripts', 'job.'+PFSS+'.'+MACHINE)
+    nNode = None
+    hours = None
+
+    if not os.path.isfile(filenameJob):
+        return nNode, hours
+
+    with open(filenameJob, 'r') as file_job:
+        for line in file_job:
+            match = (re.match(r'#SBATCH\s+(?:-N\s*|--nodes[=\s]\s*)(\d+)', line)
+                     or re.match(r'#PBS\s+-l\s+.*select=(\d+)', line))
+            if match:
+                nNode = int(match.group(1))
+            match = (re.match(r'#SBATCH\s+(?:-t\s*|--time[=\s]\s*)([\d:-]+)', line)
+                     or re.match(r'#PBS\s+-l\s+.*walltime=([\d:]+)', line))
+            if match:
+                hours = get_hours(match.group(1))
+
+    return nNode, hours
+
+# -----------------------------------------------------------------------------
+def get_plan(params_I, RunIDs, ARGS):
+    """
+    Return a dict with the plan of the selected runs: the settings, maps,
+    realizations, dirs, compilation, nodes and the estimated time of each
+    stage (the median time in the journals, see run_journal) of each run.
+    The param files are rendered in memory, and nothing is written,
+    downloaded, compiled or submitted.
+
+    Arguments:
+      params_I: the list of the params of each line in the param list
+      RunIDs:   the selected run IDs
+      ARGS:     the arguments of sub_runs.py
+    """
+
+    MACHINE = get_machine()
+
+    # nothing is written, including the index of Results
+    results_index.DoSaveCache = False
+
+    entries = []
+    for filenameJournal in sorted(set(glob.glob('*.journal') + [ARGS.journal])):
+        entries.extend(run_journal.read_journal(filenameJournal))
+    seconds_D   = run_journal.get_stage_seconds(entries)
+    StagesDone  = run_journal.get_stages_done(
+        run_journal.read_journal(ARGS.journal)) if ARGS.resume else {}
+
+    DictFingerprint = get_fingerprint_index() if ARGS.DoSkipDuplicate else None
+
+    runs_plan = []
+    models    = []
+
+    for strSweep, params in get_selected_params(params_I, RunIDs):
+        run_plan = {'runid': params[0], 'sweep': strSweep, 'skip': None,
+                    'error': None}
+        runs_plan.append(run_plan)
+
+        try:
+            run = get_run(params, ARGS.ThresholdBrPoynting, strSweep)
+        except Exception as error:
+            run_plan['error'] = str(error)
+            continue
+        if run is None:
+            run_plan['skip'] = ('BrFactor*PoyntingFluxPerBSi is larger than '
+                                + str(ARGS.ThresholdBrPoynting))
+            continue
+
+        realizations = get_realizations(run['strRealizations'])
+        nNode, hours = get_job_resources(run['PFSS'], MACHINE)
+
+        run_plan.update(
+            {'simdir': run['SIMDIR'], 'model': run['MODEL'],
+             'param': run['PARAM'], 'map': run['MAP'], 'pfss': run['PFSS'],
+             'time': run['TIME'], 'scheme': run['SCHEME'],
+             'new_params': run['NewParam'], 'restartdir': run['RestartDir'],
+             'restart_chain': [os.path.join('Results', name) for name in
+                               results_index.get_restart_chain(run['RestartDir'])]
+                              if run['RestartDir'] else [],
+             'realizations': realizations,
+             'rundirs': [run['SIMDIR']+'/run'+str(iRealization).zfill(2)
+                         for iRealization in realizations],
+             'backup': os.path.isdir(run['SIMDIR']),
+             'fingerprint': None,
+             'nodes': None if nNode is None else nNode*len(realizations),
+             'wall_hours': hours,
+             'node_hours': (None if nNode is None or hours is None
+                            else round(nNode*hours*len(realizations), 3))})
+
+        if run['MAP'] == 'NoMap':
+            # the map would be downloaded, the files are not rendered
+            run_plan['map'] = 'ADAPT map downloaded for '+run['TIME']
+        elif not os.path.isfile(run['MAP']):
+            run_plan['error'] = run['MAP']+' is not found'
+            continue
+        else:
+            try:
+                # keep stdout for the plan
+                with contextlib.redirect_stdout(sys.stderr):
+                    IsOk = set_run_files(run, ARGS.DoUseMarker,
+                                         ARGS.DoCheckParam, DictFingerprint)
+            except Exception as error:
+                run_plan['error'] = str(error)
+                continue
+            run_plan['fingerprint'] = run['fingerprint']
+            if not IsOk:
+                run_plan['skip'] = run['skip']
+                continue
+
+        stages = ['backup', 'rundir']
+        if run['DoRestart']:
+            stages.append('restart')
+        if ARGS.DoSubRun:
+            stages.append('submit')
+        stages_done = StagesDone.get((run['SIMDIR'], run_plan['fingerprint']), set())
+        stages = [stage for stage in stages if not stage in stages_done]
+        if not stages:
+            run_plan['skip'] = 'all the stages are done'
+            continue
+
+        run_plan['stages'] = {stage: run_journal.get_stage_estimate(
+            seconds_D, stage, run['MODEL'], len(realizations))
+                              for stage in stages}
+        run_plan['prepare_seconds'] = (
+            None if None in run_plan['stages'].values()
+            else round(sum(run_plan['stages'].values()), 3))
+
+        if not run['MODEL'] in models:
+            models.append(run['MODEL'])
+
+    # the compilation, as done by compile_models
+    compile_plan = []
+    DoCompile    = ARGS.DoCompile
+    for MODEL in models:
+        IsFound = os.path.isfile('SWMF/bin/'+MODEL+'.exe')
+        if not IsFound:
+            DoCompile = 1
+        elif ('compile', MODEL) in StagesDone:
+            DoCompile = 0
+        IsCached = False
+        if DoCompile and ARGS.DoUseCache:
+            fingerprint = compile_cache.get_fingerprint(
+                compile_cache.get_options(MODEL))
+            IsCached = fingerprint is not None and os.path.isfile(os.path.join(
+                compile_cache.get_dir_cache(fingerprint), 'SWMF.exe'))
+        DoCompileModel = bool(DoCompile) and not IsCached
+        compile_plan.append(
+            {'model': MODEL, 'exe_found': IsFound, 'cached': IsCached,
+             'compile': DoCompileModel,
+             'seconds': (run_journal.get_stage_estimate(seconds_D, 'compile', MODEL)
+                         if DoCompileModel else 0)})
+        DoCompile = 0
+
+    runs_todo = [run_plan for run_plan in runs_plan
+                 if not run_plan['skip'] and not run_plan['error']]
+
+    seconds_compile = [model_plan['seconds'] for model_plan in compile_plan]
+    seconds_prepare = [run_plan['prepare_seconds'] for run_plan in runs_todo]
+    node_hours      = [run_plan['node_hours'] for run_plan in runs_todo]
+
+    # the runs are prepared in ARGS.jobs processes after the compilation
+    return {'filename': ARGS.filename, 'machine': MACHINE, 'jobs': ARGS.jobs,
+            'compile': compile_plan, 'runs': runs_plan,
+            'total': {'runs': len(runs_todo),
+                      'realizations': sum(len(run_plan['realizations'])
+                                          for run_plan in runs_todo),
+                      'node_hours': (None if None in node_hours
+                                     else round(sum(node_hours), 3)),
+                      'prepare_seconds': (
+                          None if None in seconds_compile + seconds_prepare
+                          else round(sum(seconds_compile)
+                                     + sum(seconds_prepare)/max(ARGS.jobs, 1), 3))}}
 
-    return NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations
-    
 # -----------------------------------------------------------------------------
 if __name__ == '__main__':
 
@@ -147,10 +1061,73 @@ if __name__ == '__main__':
                             + 'Use if you want to set the Threshold for'
                             + 'BrFactor*PoyntingFlux',
                             type=float, default=-1.0)
+    ARG_PARSER.add_argument('-d', '--DoSkipDuplicate',
+                            help='(default: 1)'
+                            + 'Use if you want to skip the runs with the '
+                            + 'same configuration (fingerprint) as a run in '
+                            + 'Results or a run submitted before.',
+                            type=int, default=1)
+    ARG_PARSER.add_argument('-v', '--DoCheckParam',
+                            help='(default: 1)'
+                            + 'Use if you want to check the structure of '
+                            + 'the param files against the templates and '
+                            + 'skip the runs with errors.',
+                            type=int, default=1)
+    ARG_PARSER.add_argument('-u', '--DoUseCache',
+                            help='(default: 1)'
+                            + 'Use if you want to use the executables '
+                            + 'compiled before with the same options and '
+                            + 'SWMF source instead of compiling the code.',
+                            type=int, default=1)
+    ARG_PARSER.add_argument('-j', '--jobs',
+                            help='(default: 1)'
+                            + 'The number of runs prepared at the same '
+                            + 'time after the code is compiled.',
+                            type=int, default=1)
+    ARG_PARSER.add_argument('--journal',
+                            help='(default: FILENAME.journal, e.g., '
+                            + 'param_list.txt.journal) The journal of the '
+                            + 'stages done for each run.',
+                            type=str, default='')
+    ARG_PARSER.add_argument('--resume',
+                            help='(default: 0)'
+                            + 'Use if you want to skip the stages (e.g., '
+                            + 'backup, rundir, submit) found done in the '
+                            + 'journal for the runs with the same '
+                            + 'configuration.',
+                            type=int, nargs='?', const=1, default=0)
+    ARG_PARSER.add_argument('-p', '--plan',
+                            help='(default: 0)'
+                            + 'Use if you want to print the plan of the '
+                            + 'selected runs (JSON) with the estimated '
+                            + 'preparation time and node hours, without '
+                            + 'changing any file or submitting any job.',
+                            type=int, nargs='?', const=1, default=0)
+    ARG_PARSER.add_argument('--array',
+                            help='(default: 0)'
+                            + 'Use if you want to submit the realizations '
+                            + 'of all the runs in job arrays of SLURM/PBS '
+                            + 'after all the runs are prepared, instead of '
+                            + 'one job per realization.',
+                            type=int, nargs='?', const=1, default=0)
+    ARG_PARSER.add_argument('--MaxRunning',
+                            help='(default: 0) The max number of jobs of an '
+                            + 'array running at the same time with --array, '
+                            + '0 for no limit.',
+                            type=int, default=0)
     ARGS = ARG_PARSER.parse_args()
 
-    # whether to reinstall the code
-    DoInstall = True
+    if not ARGS.journal:
+        ARGS.journal = ARGS.filename+'.journal'
+
+    # the stages done and the realizations submitted in the journal, used
+    # if ARGS.resume
+    StagesDone = {}
+    Submitted  = {}
+    if ARGS.resume:
+        entries    = run_journal.read_journal(ARGS.journal)
+        StagesDone = run_journal.get_stages_done(entries)
+        Submitted  = run_journal.get_realizations_submitted(entries)
 
     with open(ARGS.filename, 'rt') as events:
         lines = list(events)
@@ -203,160 +1180,59 @@ if __name__ == '__main__':
             param_now[0] = int(param_now[0])
             params_I.append(param_now)
 
-    for iID, params in enumerate(params_I):
-        # if the run ID is found in the selected run ID.
-
-        if params[0] in RunIDs:
-            RunID = params[0]
-
-            # reset all the default values
-            MAP   = 'NoMap'
-            PFSS  = 'HARMONICS'
-            TIME  = 'MapTime'
-            MODEL = 'AWSoM'
-            PARAM = 'Default'
-            SCHEME= 2
-            DoRestart = 0
-
-            NewParam        = {}
-            strRealizations = ''
-
-            # check whether restartdir exists, if yes, set the params first.
-            for param in params[1:]:
-                if 'restartdir=' in param.lower():
-                    DoRestart   = 1
-                    # remove /n with strip() and then RestartDir is the second element after split
-                    RestartDir  = param.strip().split('=')[1]
-                    NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations = \
-                        set_restart_params(RestartDir,NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations)
-
-            # the actual param starts from the 2nd element
-            NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations = \
-                set_dict_params(params[1:],NewParam,MAP,PFSS,TIME,MODEL,PARAM,SCHEME,strRealizations)
-
-            if ARGS.ThresholdBrPoynting > 0:
-                BrFactor_local     = float(NewParam['change']['BrFactor'])
-                PoyntingFlux_local = float(NewParam['change']['PoyntingFluxPerBSi'])
-                if BrFactor_local*PoyntingFlux_local > ARGS.ThresholdBrPoynting:
-                    warnings.warn('For run ID: '+str(RunID).zfill(3) + '\n'
-                                  +'BrFactor           ='+str(BrFactor_local)           + '\n'
-                                  +'PoyntingFluxPerBSi ='+str(PoyntingFlux_local) + '\n'
-                                  +'BrFactor*PoyntingFluxPerBSi ='+str(BrFactor_local*PoyntingFlux_local) + '\n'
-                                  +'BrFactor*PoyntingFluxPerBSi >'+str(ARGS.ThresholdBrPoynting))
-                    continue
-
-            SIMDIR = ('run' + str(RunID).zfill(3) + '_' + MODEL)
-
-            if DoRestart:
-                SIMDIR = SIMDIR+'_restart_'+RestartDir.replace('/','_')
-
-            # if ARGS.DoLink, link the associated IH restart files and continue the loop.
-            if ARGS.DoLink:
-                # check if the SIMDIR exists in Results
-                if os.path.isdir('Results/'+SIMDIR):
-                    for dirTmp in os.listdir('Results/'+SIMDIR):
-                        if os.path.isdir(os.path.join('Results/'+SIMDIR, dirTmp)):
-                            linkSrc = os.path.join(os.getcwd(), 'Results/'+RestartDir, dirTmp, 'RESTART/IH')
-                            linkDst = os.path.join(os.getcwd(), 'Results/'+SIMDIR,     dirTmp, 'RESTART/IH')
-                            # check whether the IH restart files is linked or not, if yes, remove the link first.
-                            if os.path.islink(linkDst):
-                                os.unlink(linkDst)
-                            os.symlink(linkSrc, linkDst)
-                            print('Created link from '+ linkSrc  + ' to ' + linkDst)
-                else:
-                    print('Results/'+SIMDIR+' does not exist!!!!')
-                continue
-
-            strPfssMake  ='PFSS='+PFSS
-            strModelMake ='MODEL='+MODEL
-            strParamMake ='PARAM='+PARAM
+    if ARGS.plan:
+        print(json.dumps(get_plan(params_I, RunIDs, ARGS), indent=1))
+        sys.exit(0)
 
-            strRealizationsMake = 'REALIZATIONS='+strRealizations
+    # if ARGS.DoLink, link the associated IH restart files only.
+    if ARGS.DoLink:
+        for strSweep, params in get_selected_params(params_I, RunIDs):
+            run = get_run(params, ARGS.ThresholdBrPoynting, strSweep)
+            if run is not None:
+                link_restart_ih(run['SIMDIR'], run['RestartDir'])
+        sys.exit(0)
 
-            strSimDirMake = 'SIMDIR='+SIMDIR
+    # the runs to be prepared and submitted, in the order of the run IDs.
+    # The runs of the sweep expressions are created one at a time and the
+    # files of a run are rendered only when it is going to be prepared.
+    runs = get_runs(params_I, RunIDs, ARGS, StagesDone, Submitted)
 
-            # Compile the code if needed. AWSoM and AWSoM-R could not be 
-            # selected at the same time
-            if not MODEL in ['AWSoM','AWSoMR','AWSoM2T','AWSoMR_SOFIE']:
-                warnings.warn(MODEL+' may not be supported.')
+    models_done = [key[1] for key in StagesDone if key[0] == 'compile']
 
-            # If the corresponding MODEL.exe does not exist, need to re-compile the code.
-            # If it exists, do not change ARGS.DoCompile, which default is 1 (to re-compile
-            # the code for the first time when running the event list). However, the user
-            # may still set it to 0, in which case the code will not be re-compiled.
-            if not os.path.isfile('SWMF/bin/'+MODEL+'.exe'):
-                ARGS.DoCompile = 1
+    # prepare the runs (in parallel if ARGS.jobs > 1) and submit each run
+    # as soon as it is prepared, or all the runs in job arrays at the end
+    runs_array = [] if ARGS.array else None
+    models     = []
+    DoInstall  = True
+    with contextlib.ExitStack() as stack:
+        if ARGS.jobs > 1:
+            executor = stack.enter_context(
+                concurrent.futures.ProcessPoolExecutor(max_workers=ARGS.jobs))
+        future_run = {}
+        for run in runs:
+            # the model of a run is compiled before the run is prepared, as
+            # the run dirs are created from the SWMF. The SWMF is configured
+            # for one model at a time, so the runs being prepared are done
+            # first. Only the models of the runs not skipped are compiled.
+            if not run['MODEL'] in models:
+                wait_prepared_runs(future_run, 0, ARGS.DoSubRun, runs_array)
+                DoInstall = compile_models([run['MODEL']],
+                                           0 if models else ARGS.DoCompile,
+                                           ARGS.DoUseCache, ARGS.journal,
+                                           models_done, DoInstall)
+                models.append(run['MODEL'])
 
-            if ARGS.DoCompile:
-                print('--------------------')
-                print('working on '+MODEL)
-                print('--------------------')
-                if DoInstall:
-                    subprocess.call('make compile DOINSTALL=T MODEL='+MODEL, shell=True)
-                else:
-                    subprocess.call('make compile DOINSTALL=F MODEL='+MODEL, shell=True)
-                DoInstall = False
+            if ARGS.jobs > 1:
+                future_run[executor.submit(prepare_run, run)] = run
+                # at most 2*ARGS.jobs runs (with the files in memory) are
+                # waiting
+                wait_prepared_runs(future_run, 2*ARGS.jobs-1, ARGS.DoSubRun,
+                                   runs_array)
             else:
-                print('--------------------')
-                print('no need to re-compile model = '+MODEL)
-                print('--------------------')
+                submit_prepared_run(functools.partial(prepare_run, run), run,
+                                    ARGS.DoSubRun, runs_array)
 
-            # The code is compiled already, may not need to re-compile next time.
-            ARGS.DoCompile = 0
+        wait_prepared_runs(future_run, 0, ARGS.DoSubRun, runs_array)
 
-            # backup previous results if needed
-            strbackup_run = 'make backup_run ' + strSimDirMake
-            subprocess.call(strbackup_run, shell=True)
-
-            # copy the PARAM.in, HARMONICS.in and FDIPS.in files
-            strCopy_param = 'make copy_param ' + strModelMake + ' ' + strParamMake
-            subprocess.call(strCopy_param, shell=True)
-
-            # change the PARAM.in file
-            change_awsom_param.change_param_local(time=TIME, map=MAP, pfss=PFSS, 
-                                                  new_params=NewParam,scheme=SCHEME,
-                                                  DoUseMarker=ARGS.DoUseMarker,
-                                                  DoRestart=DoRestart)
-            
-            # make run directories
-            strRun_dir = ('make rundir_realizations ' + strSimDirMake + ' '
-                          + strRealizationsMake + ' ' + strPfssMake + ' MODEL=' + MODEL)
-            subprocess.call(strRun_dir, shell=True)
-
-            file_output = open(SIMDIR+'/key_params.txt', 'w')
-            file_output.write('model='+MODEL+'\n')
-            for param in params[1:]:
-                if not 'realization' in param and not 'model' in param:
-                    file_output.write(str(param)+'\n')
-            file_output.write('realizations='+strRealizations+'\n')
-            file_output.close()
-
-            if DoRestart:
-                listRealizations = strRealizations.split(',')
-                # only consider the current realization list
-                for iRealization in listRealizations:
-                    path_swmfsolar     = os.getcwd()
-                    StrRealizationLocal=str(int(iRealization)).zfill(2)
-                    # go to the realiztion dir in SIMDIR
-                    os.chdir(SIMDIR+'/run'+StrRealizationLocal)
-                    RestartDirFull = glob.glob(path_swmfsolar + '/Results/' + RestartDir
-                                               + '*/run' + StrRealizationLocal+'/RESTART')
-                    if len(RestartDirFull):
-                        strLinkRestart = './Restart.pl -v -i ' + RestartDirFull[0]
-                        subprocess.call(strLinkRestart, shell=True)
-                        if os.path.exists(RestartDirFull[0]+'/../fdips_bxyz.out'):
-                            shutil.copy2(RestartDirFull[0] +'/../fdips_bxyz.out', './SC/')
-                        if os.path.exists(RestartDirFull[0]+'/../harmonics_bxyz.out'):
-                            shutil.copy2(RestartDirFull[0] +'/../harmonics_bxyz.out', './SC/')
-                    # go back to the SWMFSOLAR dir
-                    os.chdir(path_swmfsolar)
-
-            # clean the PARAM.in, HARMONICS.in, FDIPS.in and map_*.out files 
-            # in the SWMFSOLAR folder
-            subprocess.call('make clean_rundir_tmp', shell=True)
-
-            # submit runs
-            if ARGS.DoSubRun:
-                strRun = ('make run ' + strPfssMake + ' ' + strSimDirMake + ' '
-                          + strRealizationsMake + ' JOBNAME=r'+str(RunID).zfill(2)+'_')
-                subprocess.call(strRun, shell=True)
+    if runs_array:
+        submit_array_runs(runs_array, ARGS.MaxRunning)